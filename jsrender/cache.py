@@ -0,0 +1,233 @@
+from __future__ import unicode_literals
+import datetime
+import decimal
+import weakref
+import six
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import defaulttags
+from django.template.base import TextNode, VariableNode, Variable
+from django.template.loaders.cached import Loader as CachedLoader
+from django.utils import timezone, translation
+from django.utils.functional import Promise
+from .functions import is_jsexpr, as_javascript
+from . import minify
+try:
+    from django.utils.autoreload import file_changed
+except ImportError:  # pragma: no cover
+    # older versions of Django don't reload templates without restarting
+    file_changed = None
+
+
+# the maximum number of translations cached for a single template
+max_translations = 128
+
+# templates loaded by name, per template engine
+templates = weakref.WeakKeyDictionary()
+
+# variable names referenced by the nodelist of a template
+# (or None for templates that can't be cached), per template
+template_names = weakref.WeakKeyDictionary()
+
+# translations of included templates, per template
+translations = weakref.WeakKeyDictionary()
+
+# Javascript string literals of the text, per text node
+text_literals = weakref.WeakKeyDictionary()
+
+
+def clear():
+    """Clear all cached templates and translations.
+
+    This is done automatically when Django resets its cached template loaders
+    because a template changed, or when settings change in tests.
+    Call this when resetting the cached template loaders manually.
+    """
+    templates.clear()
+    template_names.clear()
+    translations.clear()
+    text_literals.clear()
+    minify.cache.clear()
+
+
+@receiver(setting_changed, dispatch_uid='jsrender_cache_setting_changed')
+def setting_changed_receiver(**kwargs):
+    clear()
+
+
+if file_changed is not None:
+    @receiver(file_changed, dispatch_uid='jsrender_cache_file_changed')
+    def file_changed_receiver(**kwargs):
+        clear()
+
+
+def uses_cached_loader(engine):
+    "Returns True if the engine caches the templates it loads."
+    return any(isinstance(loader, CachedLoader) for loader in engine.template_loaders)
+
+
+def get_template(engine, name):
+    """Returns the template of the given name, like `engine.get_template(name)`.
+
+    Templates are cached only for engines using the cached template loader,
+    otherwise changes to the template would go unnoticed.
+    """
+    if not isinstance(name, six.string_types) or not uses_cached_loader(engine):
+        return engine.get_template(name)
+    engine_templates = templates.setdefault(engine, {})
+    try:
+        return engine_templates[name]
+    except KeyError:
+        template = engine_templates[name] = engine.get_template(name)
+        return template
+
+
+def get_text_literal(node):
+    """Returns the Javascript string literal of the text of a text node.
+
+    The text of a node doesn't change after parsing,
+    so it is only encoded once for all translations.
+    """
+    try:
+        return text_literals[node]
+    except KeyError:
+        literal = text_literals[node] = as_javascript(node.s)
+        return literal
+
+
+class Uncacheable(Exception):
+    "Raised for templates whose translations can't be cached."
+
+
+def add_expression_names(expression, names):
+    "Add the variable names referenced by a filter expression."
+    var = expression.var
+    if isinstance(var, Variable) and var.lookups is not None:
+        names.add(var.lookups[0])
+    for func, args in expression.filters:
+        for lookup, arg in args:
+            if lookup and arg.lookups is not None:
+                names.add(arg.lookups[0])
+
+
+def add_condition_names(condition, names):
+    "Add the variable names referenced by a condition of an if tag."
+    if condition is None:
+        return
+    elif isinstance(condition, defaulttags.TemplateLiteral):
+        add_expression_names(condition.value, names)
+    else:
+        add_condition_names(condition.first, names)
+        add_condition_names(condition.second, names)
+
+
+def add_nodelist_names(nodelist, names):
+    """Add the variable names referenced by a nodelist.
+
+    Only nodes for which these are known can be scanned,
+    others raise Uncacheable.
+    """
+    for node in nodelist:
+        if type(node) in (TextNode, defaulttags.CommentNode):
+            pass
+        elif type(node) is VariableNode:
+            add_expression_names(node.filter_expression, names)
+        elif type(node) is defaulttags.IfNode:
+            for condition, subnodes in node.conditions_nodelists:
+                add_condition_names(condition, names)
+                add_nodelist_names(subnodes, names)
+        elif type(node) is defaulttags.ForNode:
+            add_expression_names(node.sequence, names)
+            # the parent loop of the new forloop
+            names.add('forloop')
+            loop_names = set()
+            add_nodelist_names(node.nodelist_loop, loop_names)
+            names.update(loop_names - set(node.loopvars) - set(['forloop']))
+            add_nodelist_names(node.nodelist_empty, names)
+        else:
+            raise Uncacheable(node)
+
+
+def get_template_names(template):
+    "Returns the variable names referenced by a template, or None if unknown."
+    try:
+        return template_names[template]
+    except KeyError:
+        names = set()
+        try:
+            add_nodelist_names(template.nodelist, names)
+        except Uncacheable:
+            names = None
+        else:
+            names = tuple(sorted(names))
+        template_names[template] = names
+        return names
+
+
+static_types = (
+    six.text_type, six.binary_type, bool, float, decimal.Decimal,
+    datetime.date, datetime.time, datetime.timedelta, type(None),
+) + six.integer_types
+
+
+def value_key(value):
+    """Returns a hashable key identifying a context value for a translation.
+
+    Javascript expressions are identified by their kind only,
+    as they are passed to the helper function.
+    Static values must be immutable, otherwise raises Uncacheable.
+    """
+    if is_jsexpr(value):
+        return ('js', type(value), len(value.references()))
+    elif isinstance(value, tuple):
+        return (type(value), tuple(value_key(v) for v in value))
+    elif isinstance(value, static_types) and not isinstance(value, Promise):
+        return (type(value), value)
+    else:
+        raise Uncacheable(value)
+
+
+def translation_key(translator, context, template):
+    """Returns a key to cache the shared translation of an included template,
+    or None if the translation can't be cached.
+    """
+    names = get_template_names(template)
+    if names is None:
+        return None
+    try:
+        # names missing from the context are keyed by None
+        values = tuple(
+            (name, value_key(context[name]) if name in context else None)
+            for name in names
+        )
+    except Uncacheable:
+        return None
+    return (
+        type(translator),
+        translator.html_escape_function,
+        translator.joiner,
+        translator.indentation_text,
+        translator.debug,
+        translator.target,
+        translation.get_language(),
+        timezone.get_current_timezone_name(),
+        context.autoescape,
+        context.use_l10n,
+        context.use_tz,
+        values,
+    )
+
+
+def get_translation(template, key):
+    "Returns a cached translation of the template, or None."
+    try:
+        return translations[template][key]
+    except KeyError:
+        return None
+
+
+def set_translation(template, key, value):
+    "Cache a translation of the template."
+    template_translations = translations.setdefault(template, {})
+    if len(template_translations) < max_translations:
+        template_translations[key] = value
@@ -0,0 +1,146 @@
+from __future__ import unicode_literals
+from django.template import Context
+from django.template.base import Node, TextNode, VariableNode
+from django.template.defaulttags import CommentNode, LoadNode
+from django.utils import timezone, translation
+
+
+def count_nodes(nodelist):
+    "Returns the number of nodes in a nodelist, including all subnodes."
+    return len(nodelist.get_nodes_by_type(Node))
+
+
+def get_loop():
+    # asyncio is imported when used, as it's not available in Python 2
+    import asyncio
+    return asyncio.get_running_loop()
+
+
+def completed(func, *args):
+    "Returns a future of the result of calling the function right away."
+    future = get_loop().create_future()
+    try:
+        future.set_result(func(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def call_activated(language, tz, func, args):
+    "Call the function with the given language and time zone activated."
+    with timezone.override(tz):
+        if language is None:
+            return func(*args)
+        with translation.override(language):
+            return func(*args)
+
+
+def run_in_executor(executor, func, *args):
+    """Returns a future of the result of calling the function in the executor,
+    or the event loop's default executor if it is None.
+
+    The current language and time zone are activated in the executor,
+    as they are local to the current thread.
+    """
+    return get_loop().run_in_executor(
+        executor,
+        call_activated,
+        translation.get_language(),
+        timezone.get_current_timezone(),
+        func,
+        args,
+    )
+
+
+def gather(futures):
+    "Returns a future of the list of results of the futures."
+    import asyncio
+    return asyncio.gather(*futures)
+
+
+def then(future, callback):
+    """Returns a future of the result of the callback,
+    which is called with the result of the given future once it is done.
+
+    The callback may return a future itself, which is waited for as well.
+    """
+    import asyncio
+    result = get_loop().create_future()
+
+    def resolve(done, callback=None):
+        if result.cancelled():
+            return
+        elif done.cancelled():
+            result.cancel()
+        elif done.exception() is not None:
+            result.set_exception(done.exception())
+        elif callback is None:
+            result.set_result(done.result())
+        else:
+            try:
+                value = callback(done.result())
+            except Exception as e:
+                result.set_exception(e)
+            else:
+                if asyncio.isfuture(value):
+                    value.add_done_callback(resolve)
+                else:
+                    result.set_result(value)
+
+    future.add_done_callback(lambda done: resolve(done, callback))
+    return result
+
+
+def prepared_function(context, node):
+    "Returns the template function of a jsrender node prepared by `arender`, if any."
+    return getattr(context, 'jsrender_functions', {}).get(node)
+
+
+def is_context_preserving(node):
+    "Returns True if rendering the (top level) node leaves the context as is."
+    from .templatetags.jsrender import TemplateRenderNode
+    if isinstance(node, TemplateRenderNode):
+        return node.varname is None
+    return isinstance(node, (TextNode, VariableNode, CommentNode, LoadNode))
+
+
+def arender(template, context=None, request=None, executor=None):
+    """Returns an asyncio future of rendering the template, for async views.
+    It must be called while the event loop is running, like in an async view.
+
+    The jsrender blocks at the top level of the template are translated first,
+    concurrently, with the given context. Large ones are translated
+    in the executor, see `Translator.atranslate`. The template is then
+    rendered in the executor, using those translations.
+    Only blocks that come before any other tag that may change the context
+    (like `{% url ... as ... %}`) are translated first this way.
+    Other jsrender blocks, such as those in included templates
+    or inside other tags, are translated while rendering as usual.
+
+    The template is either a template of the Django template backend
+    (from `django.template.loader.get_template`) with a dict as context,
+    or a `django.template.Template` with a `Context`.
+    """
+    from django.template.context import make_context
+    from .templatetags.jsrender import TemplateRenderNode
+    if hasattr(template, 'template'):
+        context = make_context(
+            context, request, autoescape=template.backend.engine.autoescape)
+        template = template.template
+    elif context is None:
+        context = Context()
+    nodes = []
+    for node in template.nodelist:
+        if isinstance(node, TemplateRenderNode):
+            nodes.append(node)
+        if not is_context_preserving(node):
+            # later blocks may depend on the changed context
+            break
+    with context.bind_template(template):
+        functions = gather([node.aget_function(context, executor) for node in nodes])
+
+    def render(functions):
+        context.jsrender_functions = dict(zip(nodes, functions))
+        return run_in_executor(executor, template.render, context)
+
+    return then(functions, render)
@@ -1,15 +1,69 @@
+import hashlib
 import six
+from django.conf import settings
 from django.utils.html import mark_safe
+from .projection import project
+from .functions import lookup
+from .sourcemaps import source_map, inline_source_map
+
+
+# Patches the children of a container element to the rendering of a list
+# of items, only rendering items that are new or changed since the last
+# patch (compared by their json, and that of the other arguments),
+# and reusing the nodes of all others. Rendered nodes are remembered
+# on the container by the key of their item, which must be unique.
+patch_function_format = (
+    'function %(patch_funcname)s(_p,_l%(rest)s){'
+    'var _s=_p.__jsrender,_t={},_o=[],_a=JSON.stringify([0%(rest)s]),_i,_j,_k,_d,_e,_f,_v,_r;'
+    'if(!_s){_p.textContent="";_s={}}'
+    'for(_i=0;_i<_l.length;_i++){'
+    '_v=_l[_i];_k="k"+(%(key)s);'
+    'if(_t[_k]){throw new Error("Duplicate key "+_k.slice(1))}'
+    '_d=JSON.stringify(_v)+_a;_e=_s[_k];'
+    'if(!_e||_e.d!==_d){'
+    '_f=document.createElement("template");'
+    '_f.innerHTML=%(funcname)s(_v%(rest)s);'
+    '_e={d:_d,n:Array.prototype.slice.call(_f.content.childNodes)}'
+    '}'
+    '_t[_k]=_e;_o.push(_e)'
+    '}'
+    'for(_k in _s){if(_t[_k]!==_s[_k]){'
+    '_e=_s[_k];'
+    'for(_j=0;_j<_e.n.length;_j++){'
+    'if(_e.n[_j].parentNode===_p){_p.removeChild(_e.n[_j])}'
+    '}'
+    '}}'
+    '_r=_p.firstChild;'
+    'for(_i=0;_i<_o.length;_i++){'
+    '_e=_o[_i];'
+    'for(_j=0;_j<_e.n.length;_j++){'
+    'if(_e.n[_j]===_r){_r=_r.nextSibling}else{_p.insertBefore(_e.n[_j],_r)}'
+    '}'
+    '}'
+    '_p.__jsrender=_t'
+    '}'
+)
 
 
 class TemplateFunction(object):
-    def __init__(self, funcname, arguments, varnames, nodelist, body, context):
+    inline_source_maps = getattr(settings, 'JSRENDER_SOURCE_MAPS', False)
+
+    def __init__(
+            self, funcname, arguments, varnames, nodelist, body, context,
+            projection=None, batch_body=None, patch_key=None, positions=None,
+            sources=None):
         self.funcname = funcname
         self.arguments = arguments
         self.varnames = varnames
         self._nodelist = nodelist
         self.body = body
         self._context = context
+        self.projection = projection
+        self.batch_body = batch_body
+        self.patch_key = patch_key
+        self.positions = positions
+        # the template origins (or their source) of the positions, by source name
+        self.sources = sources
 
     def __str__(self):
         return self.script
@@ -28,17 +82,173 @@ class TemplateFunction(object):
     def signature(self):
         return ','.join(self.varnames)
 
+    @property
+    def batch_funcname(self):
+        return '%s_all' % self.funcname
+
+    @property
+    def patch_funcname(self):
+        return '%s_patch' % self.funcname
+
+    @property
+    def patch_function(self):
+        "The function to patch a container to a list of items, by their key."
+        key = '_v'
+        for bit in self.patch_key:
+            key = lookup(key, bit)
+        return patch_function_format % dict(
+            patch_funcname=self.patch_funcname,
+            funcname=self.funcname,
+            rest=''.join(',%s' % varname for varname in self.varnames[1:]),
+            key=key,
+        )
+
+    def get_parts(self):
+        """Returns the parts of the Javascript function(s),
+        as text with the positions of the translation it is (or None).
+        """
+        positions = self.positions or [None, None]
+        parts = [
+            ('function %s(%s){' % (self.funcname, self.signature), None),
+            (self.body, positions[0]),
+            ('}', None),
+        ]
+        if self.batch_body is not None:
+            parts.extend([
+                ('function %s(%s){' % (self.batch_funcname, self.signature), None),
+                (self.batch_body, positions[1]),
+                ('}', None),
+            ])
+        if self.patch_key is not None:
+            parts.append((self.patch_function, None))
+        return parts
+
     @property
     def function(self):
-        return mark_safe('function %s(%s){%s}' % (
-            self.funcname,
+        return mark_safe(''.join(text for text, positions in self.get_parts()))
+
+    @property
+    def body_hash(self):
+        """A hash of the Javascript of the function(s) apart from their names,
+        which is the same for functions that are identical but for their names.
+        """
+        body_hash = hashlib.sha256()
+        parts = [
             self.signature,
             self.body,
-        ))
+            self.batch_body or '',
+            '.'.join(self.patch_key or ()),
+        ]
+        for part in parts:
+            body_hash.update(part.encode('utf-8'))
+            body_hash.update(b'\0')
+        return body_hash.hexdigest()
+
+    @property
+    def content_hash(self):
+        """A hash of the Javascript of the function(s), which is the same
+        for identical translations, also in other processes or deploys.
+        Use it for example for ETags or the names of bundles.
+        """
+        return hashlib.sha256(self.function.encode('utf-8')).hexdigest()
+
+    def alias(self, function):
+        """Returns the Javascript to declare this function (and its batch
+        and patch functions) as the identical function given, by its names.
+        """
+        names = [(self.funcname, function.funcname)]
+        if self.batch_body is not None:
+            names.append((self.batch_funcname, function.batch_funcname))
+        if self.patch_key is not None:
+            names.append((self.patch_funcname, function.patch_funcname))
+        return mark_safe(''.join('var %s=%s;' % pair for pair in names))
+
+    @property
+    def source_map(self):
+        """A source map (as a dict) of the function to the template lines
+        it was translated from, if the positions of the translation are known.
+        """
+        if self.positions is None or not any(self.positions):
+            # not known, like for minified translations
+            return None
+        text = ''
+        positions = []
+        for part, part_positions in self.get_parts():
+            if part_positions is None:
+                positions.append((len(text), None, None, 0))
+            else:
+                positions.extend(
+                    (len(text) + position[0],) + tuple(position[1:])
+                    for position in part_positions)
+            text += part
+        return source_map(
+            text, positions, file='%s.js' % self.funcname, contents=self.sources or {})
 
     @property
     def script(self):
-        return mark_safe('<script>%s</script>' % self.function)
+        function = self.function
+        source_map = self.source_map if self.inline_source_maps else None
+        if source_map is not None:
+            function += '\n' + inline_source_map(source_map)
+        return mark_safe('<script>%s</script>' % function)
 
     def render(self):
         return self._nodelist.render(self._context)
+
+    def project(self, *values):
+        """Project argument values to the parts this function uses.
+
+        Returns a list of the projected values, in order of the arguments.
+        Values for arguments without a known projection are returned as-is.
+        """
+        if len(values) != len(self.arguments):
+            raise TypeError(
+                "%s() takes %s arguments, %s given"
+                % (self.funcname, len(self.arguments), len(values))
+            )
+        if self.projection is None:
+            return list(values)
+        return [
+            project(value, self.projection[arg])
+            for arg, value in zip(self.arguments, values)
+        ]
+
+
+class Declarations(object):
+    """Keeps track of the template functions that are declared,
+    to declare every function once, and identical functions
+    (apart from their names) as aliases of the first.
+    """
+
+    def __init__(self):
+        self.body_hashes = {}
+        self.functions = {}
+
+    def declare(self, function):
+        """Records the function as declared.
+
+        Returns the function itself if it should be declared, the function
+        it should be declared an alias of, or None if it is declared already.
+        Raises ValueError if another function of the same name is declared.
+        """
+        body_hash = function.body_hash
+        previous = self.body_hashes.get(function.funcname)
+        if previous is not None:
+            if previous != body_hash:
+                raise ValueError(
+                    "Template function %s is declared more than once, "
+                    "with different translations" % function.funcname
+                )
+            return None
+        self.body_hashes[function.funcname] = body_hash
+        return self.functions.setdefault(body_hash, function)
+
+    def get_javascript(self, function):
+        "Returns the Javascript to declare the function, or '' if declared already."
+        declared = self.declare(function)
+        if declared is None:
+            return ''
+        elif declared is function:
+            return function.function
+        else:
+            return function.alias(declared)
@@ -34,6 +34,9 @@ def zero_padded_two_digit(x):
 def array_index(array, index, cycle=False, capitalize=False):
     if isinstance(array, dict):
         array = [i[1] for i in sorted(array.items(), key=lambda x: x[0])]
+    else:
+        # a copy, to leave the array given as is
+        array = list(array)
     if cycle:
         last = array.pop()
         array.insert(0, last)
@@ -2,8 +2,10 @@ from __future__ import unicode_literals
 import six
 from django.template import defaultfilters
 from django.conf import settings
+from django.utils import html
 from django.utils.encoding import force_text
-from .functions import mark_safe, make_jsexpr, is_jsexpr
+from django.utils.safestring import SafeText
+from .functions import mark_safe, make_jsexpr, is_jsexpr, concatenate
 from . import datetimeformat
 
 
@@ -69,15 +71,30 @@ def translate_filter_date_or_time(value, arg):
     for char in format_iterator:
         if char == '\\':
             char = six.next(format_iterator)
-            parts.append(char)
+            parts.append(html.conditional_escape(char))
         else:
             output = datetimeformat.get_datetime_format_javascript_expression(char)
             if output is None:
-                parts.append(char)
+                parts.append(html.conditional_escape(char))
             else:
-                js = make_jsexpr(force_text(output), x=value)
-                parts.append(mark_safe(make_jsexpr('(%s)', js)))
-    return parts
+                parts.append(force_text(output))
+    # the value can be a date, or milliseconds since the epoch (or a date time string),
+    # it's converted to a date once and referred to as x by the expressions
+    date = make_jsexpr('new Date(%s)', value)
+    uses = sum(part.count('%(x)s') for part in parts if not isinstance(part, SafeText))
+    if uses <= 1:
+        x = date
+    else:
+        x = make_jsexpr('x')
+    parts = [
+        part if isinstance(part, SafeText) else
+        mark_safe(make_jsexpr('(%s)', make_jsexpr(part, x=x)))
+        for part in parts
+    ]
+    if uses <= 1:
+        return parts
+    return mark_safe(make_jsexpr(
+        '(function(x){return %s})(%s)', concatenate(None, parts), date))
 
 
 @register(defaultfilters.date)
@@ -1,11 +1,136 @@
 from __future__ import unicode_literals
+import calendar
 import datetime
 import decimal
+import enum
 import json
+import math
+import re
 import six
-from django.utils import html
+import uuid
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import html, timezone
+from django.utils.module_loading import import_string
 from django.utils.safestring import SafeText
 from django.utils.functional import Promise
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    from pytz import AmbiguousTimeError, NonExistentTimeError
+    transition_errors = (AmbiguousTimeError, NonExistentTimeError)
+except ImportError:  # pragma: no cover
+    # zoneinfo time zones resolve times in transitions (by fold) instead
+    transition_errors = ()
+
+
+# whether string literals contain non-ASCII characters as is,
+# instead of escaping them as \uXXXX
+utf8_literals = getattr(settings, 'JSRENDER_UTF8_LITERALS', True)
+
+# line terminators that are not allowed in (older) string literals,
+# which json doesn't escape with ensure_ascii=False
+line_terminators = re.compile('[\u2028\u2029]')
+
+# closing script tags, that would end inline scripts
+closing_script_tag = re.compile(r'</(?=script)', re.I)
+
+
+def json_default(value):
+    """Returns a value that json can encode for one it can't, or raises TypeError.
+
+    Sets are encoded as arrays, sorted for output that doesn't depend on
+    the order of iteration (which differs between processes for strings).
+    UUIDs and enums are encoded as their text and value, like orjson does.
+    """
+    if isinstance(value, (set, frozenset)):
+        try:
+            return sorted(value)
+        except TypeError:
+            # items of different types, sorted by their json instead
+            return sorted(value, key=lambda item: stdlib_encode(item, True))
+    elif isinstance(value, uuid.UUID):
+        return str(value)
+    elif isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def stdlib_encode(value, ensure_ascii, default=json_default):
+    """Encode a value to compact json with the standard library,
+    using the default function for values it can't encode, like `json_default`.
+    """
+    return json.dumps(
+        value, ensure_ascii=ensure_ascii, separators=(',', ':'), default=default)
+
+
+def is_finite(value):
+    "Returns False if the (json) value is or contains NaN or infinity."
+    if isinstance(value, float):
+        return not (math.isnan(value) or math.isinf(value))
+    elif isinstance(value, dict):
+        return all(is_finite(v) for v in value.values())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return all(is_finite(v) for v in value)
+    else:
+        return True
+
+
+# the types orjson encodes natively that the standard library doesn't,
+# which are passed to the default function instead
+orjson_options = 0 if orjson is None else (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def orjson_encode(value, ensure_ascii, default=json_default):
+    """Encode a value to compact json with orjson,
+    or with the standard library for values that orjson can't encode.
+
+    That includes NaN and infinity, which orjson encodes as null
+    instead of as NaN and Infinity like the standard library.
+    Datetimes and dataclasses aren't encoded by orjson either,
+    but by the default function, like the standard library does.
+    """
+    if not ensure_ascii:
+        try:
+            js = orjson.dumps(value, default=default, option=orjson_options).decode('utf-8')
+        except TypeError:
+            pass
+        else:
+            # the value is only checked when it could contain NaN or infinity
+            if 'null' not in js or is_finite(value):
+                return js
+    return stdlib_encode(value, ensure_ascii, default)
+
+
+def get_json_encoder(encoder=None):
+    """Returns the function to encode values to json,
+    given (the import path of) one like `stdlib_encode`.
+
+    By default, that is orjson if installed, or the standard library.
+    """
+    if encoder is None:
+        return stdlib_encode if orjson is None else orjson_encode
+    elif isinstance(encoder, six.string_types):
+        return import_string(encoder)
+    else:
+        return encoder
+
+
+# the function that encodes values to json
+json_encoder = get_json_encoder(getattr(settings, 'JSRENDER_JSON_ENCODER', None))
+
+
+@receiver(setting_changed, dispatch_uid='jsrender_functions_setting_changed')
+def setting_changed_receiver(setting, value, **kwargs):
+    global utf8_literals, json_encoder
+    if setting == 'JSRENDER_UTF8_LITERALS':
+        utf8_literals = True if value is None else value
+    elif setting == 'JSRENDER_JSON_ENCODER':
+        json_encoder = get_json_encoder(value)
 
 
 def is_lazy_text(value):
@@ -20,12 +145,37 @@ def resolve_lazy_text(value):
 
 
 def as_javascript(value):
-    "Translate a pure Python value to Javascript"
+    """Translate a pure Python value to Javascript
+
+    Non-ASCII characters in strings are output as is,
+    unless the JSRENDER_UTF8_LITERALS setting is False.
+    """
     if isinstance(value, decimal.Decimal):
         return six.text_type(value)
     if is_lazy_text(value):
         value = resolve_lazy_text(value)
-    return six.text_type(json.dumps(value))
+    js = json_encoder(value, not utf8_literals)
+    if utf8_literals:
+        js = line_terminators.sub(lambda m: '\\u%04x' % ord(m.group()), js)
+    if '</' in js:
+        js = closing_script_tag.sub('<\\/', js)
+    return six.text_type(js)
+
+
+def epoch_milliseconds(value):
+    """Returns the milliseconds since the epoch of a datetime,
+    as used by Javascript dates.
+
+    Naive datetimes are taken to be in the current time zone,
+    and to be in standard time if they're ambiguous or non-existent
+    because of a daylight saving time transition.
+    """
+    if timezone.is_naive(value):
+        try:
+            value = timezone.make_aware(value)
+        except transition_errors:
+            value = timezone.make_aware(value, is_dst=False)
+    return calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
 
 
 def express(value):
@@ -33,15 +183,14 @@ def express(value):
     if isinstance(value, JavascriptExpression):
         return value.expression
     elif isinstance(value, datetime.datetime):
-        return 'new Date({y},{m},{d},{h},{min},{s},{milli})'.format(
-            y=value.year,
-            m=value.month - 1,
-            d=value.day,
-            h=value.hour,
-            min=value.minute,
-            s=value.second,
-            milli=value.microsecond/1000,
-        )
+        if timezone.is_naive(value) and not settings.USE_TZ:
+            # the same wall clock time, in the time zone of the browser
+            return 'new Date(%d,%d,%d,%d,%d,%d,%d)' % (
+                value.year, value.month - 1, value.day,
+                value.hour, value.minute, value.second, value.microsecond // 1000)
+        return 'new Date(%d)' % epoch_milliseconds(value)
+    elif isinstance(value, datetime.date):
+        return 'new Date(%d,%d,%d)' % (value.year, value.month - 1, value.day)
     else:
         return as_javascript(value)
 
@@ -176,18 +325,54 @@ def js_is_variable(expr):
     return isalpha_or_underscore(expr[0]) and isalnum_or_underscore(expr[1:])
 
 
+def lookup(expression, key):
+    "Returns the Javascript to look up a key in the given Javascript."
+    if is_attributable(key):
+        if js_is_variable(expression):
+            return '%s.%s' % (expression, key)
+        else:
+            return '(%s).%s' % (expression, key)
+    else:
+        if js_is_variable(expression):
+            return '%s[%s]' % (expression, as_javascript(key))
+        else:
+            return '(%s)[%s]' % (expression, as_javascript(key))
+
+
+# The path component of the items of an array in argument projections.
+ITEMS = '[]'
+
+# The path component of the length of an array in argument projections,
+# which uses the array but not (necessarily) its items.
+LENGTH = '.length'
+
+
 class JavascriptExpression(object):
     """A Javascript expression
 
     Don't use this class directly, always build Javascript
     with the helper functions `make_jsexpr` and `concaternate`.
+
+    Expressions are immutable and hashable, so they can be used as
+    dictionary keys and shared, see `Translator.intern`.
     """
 
+    __slots__ = ('expression',)
+
     def __init__(self, expression):
         assert isinstance(expression, six.text_type), "Not text %r" % expression
         if expression == '':
             raise ValueError(expression)
-        self.expression = expression
+        object.__setattr__(self, 'expression', expression)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __reduce__(self):
+        return (type(self), (self.expression,))
 
     def __repr__(self):
         return '<%s %s>' % (type(self).__name__, self.expression)
@@ -198,19 +383,118 @@ class JavascriptExpression(object):
     def __ne__(self, other):
         return type(self) is not type(other) or self.expression != other.expression
 
+    def __hash__(self):
+        return hash((type(self), self.expression))
+
     def __getitem__(self, key):
         assert '.' not in key
-        if is_attributable(key):
-            if js_is_variable(self.expression):
-                return make_jsexpr('%%s.%s' % key, self)
-            else:
-                return make_jsexpr('(%%s).%s' % key, self)
-        else:
-            if js_is_variable(self.expression):
-                return make_jsexpr('%s[%s]', self, key)
-            else:
-                return make_jsexpr('(%s)[%s]', self, key)
+        return JavascriptExpression(lookup(self.reference(), key))
+
+    def reference(self):
+        "Returns the Javascript of this expression, without using its value."
+        return self.expression
+
+    def renamed(self, expression):
+        "Returns an expression for the same value, referenced by another expression."
+        return type(self)(expression)
+
+    def item(self, index):
+        "Returns an expression for an item of this (array) expression."
+        return make_jsexpr('%s[%s]', self, index)
+
+    def length(self):
+        "Returns an expression for the length of this (array) expression."
+        return make_jsexpr('%s.length', self)
+
+    def references(self):
+        "Returns the expressions (variables) this value refers to."
+        return [self]
+
+    def rebuild(self, references):
+        "Returns this value, referring to other expressions (as from references())."
+        reference, = references
+        return reference
 
 
 class SafeJavascriptExpression(JavascriptExpression):
     "A Javascript expression type that doesn't need to be escaped."
+
+    __slots__ = ()
+
+
+class ArgumentJavascriptExpression(JavascriptExpression):
+    """A Javascript expression for (part of) a template function argument.
+
+    Using the expression records its path (the lookups from the argument)
+    in the given set of paths. Lookups and array items merely traverse
+    the argument and are not recorded themselves, lengths are recorded
+    by the path of the array followed by `LENGTH`.
+    The recorded paths describe which parts of the argument are used.
+    """
+
+    __slots__ = ('_expression', '_paths', '_path')
+
+    def __init__(self, expression, paths, path=()):
+        assert isinstance(expression, six.text_type), "Not text %r" % expression
+        if expression == '':
+            raise ValueError(expression)
+        object.__setattr__(self, '_expression', expression)
+        object.__setattr__(self, '_paths', paths)
+        object.__setattr__(self, '_path', path)
+
+    @property
+    def expression(self):
+        self._paths.add(self._path)
+        return self._expression
+
+    @property
+    def path(self):
+        "The lookups from the argument to this expression."
+        return self._path
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self._expression)
+
+    def __eq__(self, other):
+        # expressions of other arguments (or paths) record elsewhere,
+        # even when their Javascript is the same, like for sibling loops
+        return (
+            type(self) is type(other) and
+            self._expression == other._expression and
+            self._paths is other._paths and
+            self._path == other._path
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), self._expression, id(self._paths), self._path))
+
+    def __reduce__(self):
+        return (type(self), (self._expression, self._paths, self._path))
+
+    def __getitem__(self, key):
+        assert '.' not in key
+        return type(self)(lookup(self._expression, key), self._paths, self._path + (key,))
+
+    def reference(self):
+        return self._expression
+
+    def record(self, path):
+        "Record a path, relative to this expression, as used."
+        self._paths.add(self._path + path)
+
+    def renamed(self, expression):
+        return type(self)(expression, self._paths, self._path)
+
+    def item(self, index):
+        return type(self)(
+            '%s[%s]' % (self._expression, express(index)),
+            self._paths,
+            self._path + (ITEMS,),
+        )
+
+    def length(self):
+        self._paths.add(self._path + (LENGTH,))
+        return JavascriptExpression('%s.length' % self._expression)
@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...sizes import find_templates, measure_template
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the size of the Javascript functions of jsrender blocks, "
+        "largest first, and fails if any of them exceeds the size budget "
+        "or can't be translated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'templates', nargs='*',
+            help="Names of the templates, by default all templates with jsrender blocks.")
+        parser.add_argument(
+            '--budget', type=int,
+            default=getattr(settings, 'JSRENDER_SIZE_BUDGET', None),
+            help="The maximum size in bytes of every function, "
+                 "by default the JSRENDER_SIZE_BUDGET setting.")
+        parser.add_argument(
+            '--lines', type=int, default=3,
+            help="The number of template lines contributing most to show per function.")
+        parser.add_argument(
+            '--using',
+            help="The name of the template engine to use.")
+        parser.add_argument(
+            '--ignore-errors', action='store_true',
+            help="Don't fail for blocks that can't be translated without context.")
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        names = options['templates'] or find_templates(options['using'])
+        blocks = []
+        for name in names:
+            blocks.extend(measure_template(name, options['using']))
+        blocks.sort(key=lambda block: (-(block.size or 0), block.template_name, block.index))
+        exceeding = 0
+        errors = 0
+        for block in blocks:
+            if block.error is not None:
+                errors += 1
+                self.stderr.write("%s #%s %s(): cannot be translated without context, %s" % (
+                    block.template_name, block.index, block.function, block.error))
+                continue
+            note = ''
+            if budget is not None and block.size > budget:
+                exceeding += 1
+                note = '  exceeds budget'
+            self.stdout.write('%8d  %s #%s %s()%s' % (
+                block.size, block.template_name, block.index, block.function, note))
+            for source in block.sources[:options['lines']]:
+                self.stdout.write('%8d    %s:%s' % (
+                    source['bytes'], source['origin'], source['line']))
+        if exceeding:
+            raise CommandError(
+                "%s jsrender function(s) exceed the size budget of %s bytes"
+                % (exceeding, budget)
+            )
+        if errors and not options['ignore_errors']:
+            # their sizes are unknown, so they can't be said to be within budget
+            raise CommandError(
+                "%s jsrender block(s) cannot be translated without context" % errors)
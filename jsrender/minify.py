@@ -0,0 +1,289 @@
+from __future__ import unicode_literals
+import re
+import six
+from . import functions
+
+
+# the maximum number of minified bodies to cache
+max_cached = 512
+
+# minified bodies, by the body
+cache = {}
+
+
+WORD, NUMBER, STRING, REGEX, PUNCTUATOR = 'word', 'number', 'string', 'regex', 'punctuator'
+
+whitespace = re.compile(r'(?:\s+|/\*.*?\*/|//[^\n]*)+', re.S)
+word = re.compile(r'[A-Za-z_$\x80-\uffff][\w$\x80-\uffff]*')
+number = re.compile(
+    r'0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+string = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`(?:[^`\\]|\\.)*`', re.S)
+regex = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+punctuators = sorted([
+    '>>>=', '===', '!==', '>>>', '<<=', '>>=', '...', '**=',
+    '==', '!=', '<=', '>=', '&&', '||', '++', '--', '+=', '-=', '*=', '/=',
+    '%=', '&=', '|=', '^=', '<<', '>>', '=>', '**',
+] + list('{}()[];,<>+-*/%&|^!~?:=.'), key=len, reverse=True)
+
+# tokens after which a slash is a division, not a regular expression
+division_preceders = set([')', ']'])
+
+# tokens after which parentheses may make a call
+call_preceders = set([')', ']', '}'])
+
+simple_number = re.compile(r'^(\d*)(?:\.(\d*))?$')
+
+
+def tokenize(js):
+    "Split Javascript into a list of (kind, text) tokens, without whitespace."
+    tokens = []
+    position = 0
+    length = len(js)
+    while position < length:
+        match = whitespace.match(js, position)
+        if match:
+            position = match.end()
+            continue
+        char = js[position]
+        previous = tokens[-1] if tokens else None
+        if char in '"\'`':
+            match = string.match(js, position)
+            kind = STRING
+        elif char.isdigit() or (char == '.' and js[position + 1:position + 2].isdigit()):
+            match = number.match(js, position)
+            kind = NUMBER
+        elif char == '/' and (
+                previous is None or
+                previous[0] == PUNCTUATOR and previous[1] not in division_preceders or
+                previous[0] == WORD and previous[1] in ('return', 'typeof', 'case')):
+            match = regex.match(js, position)
+            kind = REGEX
+        else:
+            match = word.match(js, position)
+            kind = WORD
+        if match:
+            text = match.group(0)
+        else:
+            kind = PUNCTUATOR
+            for text in punctuators:
+                if js.startswith(text, position):
+                    break
+            else:
+                text = char
+        tokens.append((kind, text))
+        position += len(text)
+    return tokens
+
+
+def is_word_char(char):
+    return char.isalnum() or char in '_$' or ord(char) > 127
+
+
+def needs_space(previous, token):
+    "Returns True if a space is needed to separate two tokens."
+    before = previous[1][-1]
+    after = token[1][0]
+    if is_word_char(before) and is_word_char(after):
+        return True
+    if previous[0] == NUMBER and after == '.' and previous[1].isdigit():
+        return True
+    if before in '+-' and after == before:
+        return True
+    if before == '/' and after in '/*':
+        return True
+    return False
+
+
+def join_tokens(tokens):
+    "Join tokens into Javascript, with as little whitespace as possible."
+    result = []
+    previous = None
+    for token in tokens:
+        if previous is not None and needs_space(previous, token):
+            result.append(' ')
+        result.append(token[1])
+        previous = token
+    return ''.join(result)
+
+
+def shorten_number(text):
+    "Returns the shortest notation of a decimal number literal."
+    match = simple_number.match(text)
+    if match is None:
+        # hexadecimal or exponential notations
+        return text
+    integer, fraction = match.group(1), (match.group(2) or '').rstrip('0')
+    if len(integer) > 1 and integer.startswith('0'):
+        # legacy octal literals
+        return text
+    if fraction:
+        return '%s.%s' % ('' if integer == '0' else integer, fraction)
+    integer = integer or '0'
+    stripped = integer.rstrip('0')
+    if stripped and len(integer) - len(stripped) > 2:
+        return '%se%s' % (stripped, len(integer) - len(stripped))
+    return integer
+
+
+def requote_string(text, unescape=True):
+    """Returns the shortest quoting of a string literal.
+
+    Unless unescape is False, unicode escapes of non-ASCII characters
+    are replaced by the characters, except for line and paragraph separators,
+    and surrogates.
+    """
+    quote = text[0]
+    if quote == '`':
+        return text
+    units = []
+    i = 1
+    end = len(text) - 1
+    while i < end:
+        char = text[i]
+        if char != '\\':
+            units.append(char)
+            i += 1
+            continue
+        escape = text[i:i + 2]
+        if escape[1:] == 'u' and re.match(r'[0-9a-fA-F]{4}', text[i + 2:i + 6]):
+            codepoint = int(text[i + 2:i + 6], 16)
+            if unescape and codepoint >= 0x80 and not (
+                    0xd800 <= codepoint <= 0xdfff or codepoint in (0x2028, 0x2029)):
+                units.append(six.unichr(codepoint))
+            else:
+                units.append(text[i:i + 6])
+            i += 6
+        elif escape in ('\\"', "\\'"):
+            units.append(escape[1])
+            i += 2
+        else:
+            units.append(escape)
+            i += 2
+    doubles = units.count('"')
+    singles = units.count("'")
+    quote = "'" if singles < doubles else '"'
+    return quote + ''.join(
+        '\\' + unit if unit == quote else unit
+        for unit in units
+    ) + quote
+
+
+def is_simple(tokens):
+    """Returns True if the tokens are a single operand that never needs parentheses,
+    a literal or a variable with lookups.
+    """
+    if len(tokens) == 1:
+        return tokens[0][0] in (WORD, NUMBER, STRING)
+    if tokens[0][0] not in (WORD, STRING):
+        return False
+    i = 1
+    while i < len(tokens):
+        if tokens[i][1] == '.' and i + 1 < len(tokens) and tokens[i + 1][0] == WORD:
+            i += 2
+        elif (tokens[i][1] == '[' and i + 2 < len(tokens) and
+                tokens[i + 1][0] in (WORD, NUMBER, STRING) and tokens[i + 2][1] == ']'):
+            i += 3
+        else:
+            return False
+    return True
+
+
+def remove_parentheses(tokens):
+    "Remove parentheses around simple operands, where they don't make calls."
+    result = []
+    opened = []
+    for token in tokens:
+        if token[1] == '(':
+            opened.append(len(result))
+        elif token[1] == ')' and opened:
+            start = opened.pop()
+            inner = result[start + 1:]
+            previous = result[start - 1] if start > 0 else None
+            if (inner and is_simple(inner) and not (
+                    previous is not None and (
+                        previous[0] != PUNCTUATOR or previous[1] in call_preceders))):
+                # leave the inner tokens, without the opening parenthesis
+                del result[start]
+                # number literals can't be followed by lookups
+                if inner[-1][0] == NUMBER:
+                    result.append(('parenthesized', inner))
+                continue
+        result.append(token)
+    # restore parentheses around numbers followed by lookups
+    tokens = []
+    for i, token in enumerate(result):
+        if token[0] == 'parenthesized':
+            if i + 1 < len(result) and result[i + 1][1] in ('.', '['):
+                tokens.pop()
+                tokens.extend([(PUNCTUATOR, '(')] + token[1] + [(PUNCTUATOR, ')')])
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def merge_statements(tokens):
+    """Merge consecutive variable declarations and remove redundant semicolons,
+    outside of parentheses.
+    """
+    result = []
+    depth = 0
+    # per block, whether the last statement was a variable declaration
+    declaring = [False]
+    statement_start = True
+    for token in tokens:
+        text = token[1]
+        if token[0] == PUNCTUATOR:
+            if text in '([':
+                depth += 1
+            elif text in ')]':
+                depth -= 1
+        if depth == 0 and token[0] == PUNCTUATOR:
+            if text == ';' and result and result[-1][1] in (';', '{'):
+                continue
+            if text == '}' and result and result[-1][1] == ';':
+                result.pop()
+            if text == '{':
+                declaring.append(False)
+            elif text == '}' and len(declaring) > 1:
+                declaring.pop()
+                declaring[-1] = False
+        if depth == 0 and token == (WORD, 'var') and statement_start:
+            if declaring[-1] and result and result[-1][1] == ';':
+                result[-1] = (PUNCTUATOR, ',')
+                statement_start = False
+                continue
+            declaring[-1] = True
+        elif statement_start:
+            declaring[-1] = False
+        statement_start = depth == 0 and text in (';', '{', '}') and token[0] == PUNCTUATOR
+        result.append(token)
+    return result
+
+
+def minify(js):
+    """Minify Javascript as generated by translation.
+
+    This removes whitespace, merges variable declarations, removes
+    parentheses around variables and literals, quotes strings
+    with the least escapes and shortens numbers.
+    Escaped non-ASCII characters are unescaped,
+    unless the JSRENDER_UTF8_LITERALS setting is False.
+    The results are cached, as the same bodies are translated often.
+    """
+    try:
+        return cache[js]
+    except KeyError:
+        pass
+    tokens = tokenize(js)
+    tokens = remove_parentheses(tokens)
+    tokens = merge_statements(tokens)
+    for i, (kind, text) in enumerate(tokens):
+        if kind == STRING:
+            tokens[i] = (kind, requote_string(text, functions.utf8_literals))
+        elif kind == NUMBER and not (i + 1 < len(tokens) and tokens[i + 1][1] == '.'):
+            tokens[i] = (kind, shorten_number(text))
+    result = join_tokens(tokens)
+    if len(cache) >= max_cached:
+        cache.clear()
+    cache[js] = result
+    return result
@@ -0,0 +1,95 @@
+from __future__ import unicode_literals
+import django
+from django.apps import apps
+from django.template import Context, loader
+from .context import Declarations
+from .sourcemaps import source_content
+from .templatetags.jsrender import TemplateRenderNode
+
+
+def get_template(template_name, using=None):
+    "Returns the (Django template language) template of the given name."
+    return loader.get_template(template_name, using=using).template
+
+
+def get_block(template, block_index):
+    """Returns a jsrender block of a template, by its index
+    among all jsrender blocks in the template (in order of appearance).
+    """
+    blocks = template.nodelist.get_nodes_by_type(TemplateRenderNode)
+    try:
+        return blocks[block_index]
+    except IndexError:
+        raise IndexError(
+            "Template %r has no jsrender block %s" % (template.name, block_index)
+        )
+
+
+def translate_job(job):
+    """Translate a single job of `translate_blocks`.
+
+    This runs in the worker processes, so everything is loaded from
+    the job itself. Returns the argument varnames, the projection,
+    the (batch) function bodies of the block, their source positions
+    and the sources of those, see `TemplateRenderNode.get_sources`.
+    """
+    if not apps.ready:
+        # spawned worker processes start without Django set up
+        django.setup()
+    using, template_name, block_index, context = job
+    template = get_template(template_name, using)
+    node = get_block(template, block_index)
+    context = Context(context)
+    with context.bind_template(template):
+        translators = node.get_translators()
+        bodies = [t.translate(context, node.nodelist) for t in translators]
+    translator = translators[0]
+    positions = [t.positions for t in translators]
+    # the sources are loaded here, as template origins can't be pickled
+    sources = dict(
+        (name, source_content(origin))
+        for name, origin in node.get_sources(translators).items()
+    )
+    return translator.arg_varnames, translator.projection, bodies, positions, sources
+
+
+def translate_blocks(jobs, max_workers=None, using=None, executor=None):
+    """Translate many jsrender blocks in parallel, for precompiling them.
+
+    The jobs are (template name, block index, context dict) tuples,
+    see `get_block` for the index. The context dicts must be picklable,
+    like the static values they usually hold, as every job is translated
+    in a process of a `ProcessPoolExecutor` with the given maximum number
+    of workers. Alternatively, pass an executor to use.
+    Templates are loaded from the template engine named `using`
+    (or any engine that has them, like `get_template` does).
+
+    Returns a list of the template functions, in the order of the jobs.
+    """
+    jobs = [(using, name, index, context) for name, index, context in jobs]
+    if executor is None:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(translate_job, jobs))
+    else:
+        results = list(executor.map(translate_job, jobs))
+    functions = []
+    for (using, name, index, context), result in zip(jobs, results):
+        node = get_block(get_template(name, using), index)
+        varnames, projection, bodies, positions, sources = result
+        functions.append(node.make_function(
+            Context(context), varnames, projection, *bodies,
+            positions=positions, sources=sources))
+    return functions
+
+
+def bundle(functions):
+    """Returns the Javascript that declares all template functions given,
+    like the ones of `translate_blocks`, for a bundle to serve as a static file.
+
+    Every function is declared once, and functions that are identical
+    to an earlier one (but for their names) are declared as its aliases.
+    Raises ValueError if functions of the same name are not identical.
+    """
+    declarations = Declarations()
+    return ''.join(declarations.get_javascript(function) for function in functions)
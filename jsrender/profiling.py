@@ -0,0 +1,129 @@
+from __future__ import unicode_literals
+from collections import defaultdict
+from timeit import default_timer
+from django.template import TemplateSyntaxError
+from .functions import is_jsexpr
+
+
+class Stats(object):
+    "Cumulative statistics of translating something."
+
+    def __init__(self):
+        self.time = 0.0
+        self.count = 0
+        self.bytes = 0
+
+    def __repr__(self):
+        return '<Stats %.6fs %sx %sB>' % (self.time, self.count, self.bytes)
+
+    def add(self, time, size, count=1):
+        self.time += time
+        self.count += count
+        self.bytes += size
+
+    def merge(self, other):
+        self.add(other.time, other.bytes, other.count)
+
+    def as_dict(self):
+        return dict(time=self.time, count=self.count, bytes=self.bytes)
+
+
+def filter_name(func):
+    "Returns the name a filter function is registered by."
+    return getattr(func, '_filter_name', func.__name__)
+
+
+def expression_size(value):
+    "Returns the size in bytes of a value, if it is a Javascript expression."
+    if not is_jsexpr(value):
+        return 0
+    try:
+        return len(value.reference().encode('utf-8'))
+    except TemplateSyntaxError:
+        # a value that can't be output itself, like forloop
+        return 0
+
+
+def node_line(node):
+    "Returns the name of the template origin and the line number of a node."
+    origin = getattr(node, 'origin', None)
+    token = getattr(node, 'token', None)
+    return (getattr(origin, 'name', None), getattr(token, 'lineno', None))
+
+
+class Profile(object):
+    """Records where translation spends its time and what it outputs.
+
+    Pass a profile to a `Translator` to record, per node type,
+    per template line and per filter, the cumulative time spent translating,
+    the number of translations and the bytes of Javascript produced.
+    The time and bytes of nodes include those of their subnodes,
+    those of filters include only the Javascript expression they result in.
+    Additionally, the bytes of Javascript of only the node itself
+    (excluding its subnodes) are recorded per template line as its sources.
+    """
+
+    def __init__(self):
+        self.nodes = defaultdict(Stats)
+        self.lines = defaultdict(Stats)
+        self.filters = defaultdict(Stats)
+        self.sources = defaultdict(Stats)
+
+    def __repr__(self):
+        return '<Profile %s nodes, %s lines, %s filters>' % (
+            len(self.nodes), len(self.lines), len(self.filters))
+
+    def record_node(self, node, time, size):
+        "Record the translation of a node."
+        self.nodes[type(node).__name__].add(time, size)
+        self.lines[node_line(node)].add(time, size)
+
+    def record_part(self, node, part):
+        "Record a part of the output of a node itself."
+        self.sources[node_line(node)].add(0.0, len(part.encode('utf-8')))
+
+    def profile_filter(self, translate_filter, value, func, args):
+        "Translate a filter using the given function, while recording it."
+        start = default_timer()
+        result = translate_filter(value, func, args)
+        self.filters[filter_name(func)].add(
+            default_timer() - start,
+            expression_size(result),
+        )
+        return result
+
+    def merge(self, other):
+        "Add the statistics of another profile to this one."
+        for name in ('nodes', 'lines', 'filters', 'sources'):
+            stats = getattr(self, name)
+            for key, value in getattr(other, name).items():
+                stats[key].merge(value)
+
+    def report(self):
+        """Returns the statistics as simple data.
+
+        This is a dict with lists of 'nodes', 'lines' and 'filters',
+        every item a dict of its time, count and bytes,
+        and the name of the node type, the origin name and line number,
+        or the name of the filter. The lists are sorted by time, most first.
+        The list of 'sources' has the bytes per origin name and line number
+        (the count is that of the parts), sorted by bytes, most first.
+        """
+        def items(stats, key, sort='time'):
+            result = []
+            for name, value in stats.items():
+                item = value.as_dict()
+                item.update(key(name))
+                result.append(item)
+            result.sort(key=lambda item: item[sort], reverse=True)
+            return result
+
+        def line(key):
+            return dict(origin=key[0], line=key[1])
+
+        return dict(
+            nodes=items(self.nodes, lambda name: dict(node=name)),
+            lines=items(self.lines, line),
+            filters=items(self.filters, lambda name: dict(filter=name)),
+            sources=items(self.sources, line, sort='bytes'),
+        )
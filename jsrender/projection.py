@@ -0,0 +1,220 @@
+from __future__ import unicode_literals
+import six
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query import QuerySet
+from . import functions
+from .functions import ITEMS, LENGTH
+
+
+def projection_tree(paths):
+    """Builds a tree of nested dicts from a set of paths.
+
+    Every path component is a key in the tree,
+    with None marking values that are used in full.
+    Numeric lookups are merged into the items of arrays,
+    since arrays are always projected completely.
+    Arrays of which only the length is used have items projected to `{}`.
+    """
+    if () in paths:
+        return None
+    tree = {}
+    for path in paths:
+        key, rest = path[0], path[1:]
+        if key == LENGTH:
+            tree.setdefault(ITEMS, set())
+            continue
+        if key.isdigit():
+            key = ITEMS
+        tree.setdefault(key, set()).add(rest)
+    return dict((key, projection_tree(rest)) for key, rest in tree.items())
+
+
+def lookup(value, key):
+    """Look up a key in a value, like Django templates do.
+
+    Raises LookupError if the value has no such key.
+    """
+    try:
+        result = value[key]
+    except (TypeError, AttributeError, KeyError, ValueError, IndexError):
+        try:
+            result = getattr(value, key)
+        except (TypeError, AttributeError):
+            try:
+                result = value[int(key)]
+            except (IndexError, ValueError, KeyError, TypeError):
+                raise LookupError(key)
+    if callable(result):
+        if getattr(result, 'do_not_call_in_templates', False):
+            pass
+        elif getattr(result, 'alters_data', False):
+            raise LookupError(key)
+        else:
+            result = result()
+    return result
+
+
+def project_tree(value, tree):
+    "Project a value to the shape of the given projection tree."
+    if tree is None:
+        return value
+    if value is None or isinstance(value, (six.string_types, bool, int, float)):
+        # nothing to project
+        return value
+    if ITEMS in tree:
+        return [project_tree(item, tree[ITEMS]) for item in value]
+    result = {}
+    for key, subtree in tree.items():
+        try:
+            item = lookup(value, key)
+        except LookupError:
+            # leave it out, it's undefined in Javascript as well
+            continue
+        result[key] = project_tree(item, subtree)
+    return result
+
+
+def project(value, paths):
+    """Project a value to only the given paths.
+
+    The paths are those of an argument's projection of a template function.
+    The result contains only (and exactly) those parts of the value,
+    as simple dicts and lists that can be encoded as json.
+    Values that are not used at all are projected to None.
+    """
+    if not paths:
+        return None
+    return project_tree(value, projection_tree(paths))
+
+
+def row_paths(function, argument=None):
+    """Returns the paths used of every row passed to a template function.
+
+    The rows are given to the template function by the argument,
+    which is optional for functions with a single argument.
+    When the function iterates over the argument, the rows are its items,
+    otherwise the argument is a single row itself.
+    """
+    if function.projection is None:
+        raise ValueError("%r has no known projection" % function)
+    if argument is None:
+        if len(function.arguments) != 1:
+            raise ValueError(
+                "%r takes multiple arguments, "
+                "pass the argument the rows are given to" % function
+            )
+        argument = function.arguments[0]
+    paths = function.projection[argument]
+    if paths and all(path[:1] in ((ITEMS,), (LENGTH,)) for path in paths):
+        paths = frozenset(path[1:] for path in paths if path != (LENGTH,))
+    return paths
+
+
+def concrete_field_names(model, prefix):
+    return [prefix + field.name for field in model._meta.concrete_fields]
+
+
+def queryset_lookups(model, tree, prefix=''):
+    """Returns the field names to load, and lookups for select_related
+    and prefetch_related, for a projection tree of model instances.
+
+    Fields of prefetched relations are loaded entirely.
+    """
+    only = []
+    select_related = []
+    prefetch_related = []
+    if tree is None:
+        only.extend(concrete_field_names(model, prefix))
+        return only, select_related, prefetch_related
+    for key, subtree in sorted(tree.items()):
+        try:
+            if key == 'pk':
+                field = model._meta.pk
+            else:
+                field = model._meta.get_field(key)
+        except FieldDoesNotExist:
+            # an attribute or method of the model, which may use any field
+            only.extend(concrete_field_names(model, prefix))
+            continue
+        name = prefix + field.name
+        if not field.is_relation or key != field.name:
+            # a field value, or the column of a foreign key (ie. 'user_id')
+            only.append(name)
+        elif field.many_to_many or field.one_to_many:
+            prefetch_related.append(name)
+            if subtree is not None:
+                # skip the manager method returning the related objects
+                subtree = subtree.get('all', subtree)
+                subtree = subtree and subtree.get(ITEMS, subtree)
+            related_only, related_select, related_prefetch = queryset_lookups(
+                field.related_model, subtree, name + '__')
+            prefetch_related.extend(related_select)
+            prefetch_related.extend(related_prefetch)
+        else:
+            if field.concrete:
+                only.append(name)
+            select_related.append(name)
+            related_only, related_select, related_prefetch = queryset_lookups(
+                field.related_model, subtree, name + '__')
+            only.extend(related_only)
+            select_related.extend(related_select)
+            prefetch_related.extend(related_prefetch)
+    return only, select_related, prefetch_related
+
+
+def project_queryset(queryset, function, argument=None):
+    """Restrict a queryset to fetch only what a template function uses of its rows.
+
+    This loads only the fields used, using `only()`, and follows
+    the relations used with `select_related()` and `prefetch_related()`.
+    See `row_paths` for the optional argument.
+    """
+    tree = projection_tree(row_paths(function, argument))
+    if tree is None:
+        return queryset
+    only, select_related, prefetch_related = queryset_lookups(queryset.model, tree)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only:
+        queryset = queryset.only(*only)
+    return queryset
+
+
+def iter_projected(rows, function, argument=None):
+    """Yields the rows projected to what a template function uses of them.
+
+    Querysets are restricted using `project_queryset` first.
+    See `row_paths` for the optional argument.
+    """
+    if isinstance(rows, QuerySet):
+        rows = project_queryset(rows, function, argument)
+        # iterating in chunks ignores prefetching (before Django 4.1),
+        # so it's only done when known not to prefetch anything
+        if not getattr(rows, '_prefetch_related_lookups', True):
+            rows = rows.iterator()
+    paths = row_paths(function, argument)
+    for row in rows:
+        yield project(row, paths)
+
+
+def json_encoder(encoder=DjangoJSONEncoder):
+    """Returns a function encoding values to compact (UTF-8) json,
+    with the json encoder of `functions` (orjson if installed), using the
+    `default` method of the given `JSONEncoder` class for other values.
+    """
+    default = encoder().default
+
+    def encode(value):
+        return functions.json_encoder(value, False, default=default)
+
+    return encode
+
+
+def iter_projected_json(rows, function, argument=None, encoder=DjangoJSONEncoder):
+    "Yields every projected row as compact json, see `iter_projected` and `json_encoder`."
+    encode = json_encoder(encoder)
+    for row in iter_projected(rows, function, argument):
+        yield encode(row)
@@ -0,0 +1,98 @@
+from __future__ import unicode_literals
+import datetime
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .functions import epoch_milliseconds
+from .projection import iter_projected_json, json_encoder
+
+
+class JavascriptJSONEncoder(DjangoJSONEncoder):
+    """Encodes datetimes as milliseconds since the epoch,
+    which template functions format without parsing them.
+
+    Dates, and naive datetimes when USE_TZ is False, are encoded as
+    date time strings without an offset instead, which Javascript
+    takes to be in the time zone of the browser (unlike date strings).
+
+    Other values are encoded like `DjangoJSONEncoder` does.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            if timezone.is_naive(o) and not settings.USE_TZ:
+                return o.strftime('%Y-%m-%dT%H:%M:%S.') + '%03d' % (o.microsecond // 1000)
+            return epoch_milliseconds(o)
+        elif isinstance(o, datetime.date):
+            return o.strftime('%Y-%m-%dT00:00:00')
+        return super(JavascriptJSONEncoder, self).default(o)
+
+
+def iter_json(rows, encoder=DjangoJSONEncoder):
+    "Yields every row as compact json, see `projection.json_encoder`."
+    encode = json_encoder(encoder)
+    for row in rows:
+        yield encode(row)
+
+
+def iter_chunks(documents, chunk_size, start, separator, end):
+    """Joins json documents into chunks of (at most) chunk_size documents.
+
+    The output starts and ends with the given texts,
+    and has the separator in between all documents.
+    """
+    chunk = [start]
+    count = 0
+    for document in documents:
+        if count:
+            chunk.append(separator)
+        chunk.append(document)
+        count += 1
+        if count % chunk_size == 0:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(end)
+    yield ''.join(chunk)
+
+
+def iter_lines(documents, chunk_size):
+    "Joins json documents into chunks of newline terminated documents."
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        chunk.append('\n')
+        if len(chunk) >= 2 * chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+class StreamingRowsResponse(StreamingHttpResponse):
+    """A streaming response of rows encoded as json.
+
+    When given a template function, the rows are projected to what
+    the function uses of them (see `projection.iter_projected`).
+    The rows are streamed as newline delimited json by default,
+    so the client can render them as they arrive,
+    or as a single json array if `array` is true.
+    Rows are encoded lazily, only chunk_size rows are held at once,
+    with the json encoder of `functions` (orjson if installed) and
+    the `default` method of the encoder class for other values.
+    """
+
+    def __init__(
+            self, rows, function=None, argument=None, array=False,
+            chunk_size=100, encoder=DjangoJSONEncoder, **kwargs):
+        if function is None:
+            documents = iter_json(rows, encoder=encoder)
+        else:
+            documents = iter_projected_json(rows, function, argument, encoder=encoder)
+        if array:
+            kwargs.setdefault('content_type', 'application/json')
+            content = iter_chunks(documents, chunk_size, '[', ',', ']')
+        else:
+            kwargs.setdefault('content_type', 'application/x-ndjson')
+            content = iter_lines(documents, chunk_size)
+        super(StreamingRowsResponse, self).__init__(content, **kwargs)
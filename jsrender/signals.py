@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent after translating a jsrender block with the JSRENDER_PROFILE setting,
+# with the rendering node, the template function and the `profiling.Profile`.
+translation_profiled = Signal()
@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+import io
+import os
+import re
+from django.template import Context, engines
+from django.template.backends.django import DjangoTemplates
+from .precompile import get_template
+from .templatetags.jsrender import TemplateRenderNode
+
+
+jsrender_tag = re.compile(r'\{%\s*jsrender\s')
+
+
+class BlockSize(object):
+    "The size of the Javascript function of a jsrender block."
+
+    def __init__(self, template_name, index, function, size=None, sources=(), error=None):
+        self.template_name = template_name
+        self.index = index
+        self.function = function
+        self.size = size
+        self.sources = sources
+        self.error = error
+
+    def __repr__(self):
+        return '<BlockSize %s #%s %s() %s>' % (
+            self.template_name, self.index, self.function, self.size)
+
+
+def loader_templates(loaders):
+    "Yields the names and sources of all templates the loaders can find."
+    for loader in loaders:
+        if hasattr(loader, 'loaders'):
+            # the cached loader
+            for template in loader_templates(loader.loaders):
+                yield template
+        elif hasattr(loader, 'templates_dict'):
+            # the locmem loader
+            for name, source in loader.templates_dict.items():
+                yield name, source
+        elif hasattr(loader, 'get_dirs'):
+            for directory in loader.get_dirs():
+                directory = str(directory)
+                for root, dirs, files in os.walk(directory):
+                    for filename in files:
+                        path = os.path.join(root, filename)
+                        try:
+                            with io.open(path, encoding=loader.engine.file_charset) as f:
+                                source = f.read()
+                        except (IOError, UnicodeDecodeError):
+                            continue
+                        name = os.path.relpath(path, directory).replace(os.sep, '/')
+                        yield name, source
+
+
+def find_templates(using=None):
+    """Returns the sorted names of all templates with jsrender blocks
+    found by the loaders of the template engines (or the one named `using`).
+    """
+    names = set()
+    for backend in engines.all():
+        if using is not None and backend.name != using:
+            continue
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name, source in loader_templates(backend.engine.template_loaders):
+            if jsrender_tag.search(source):
+                names.add(name)
+    return sorted(names)
+
+
+def measure_block(template, index, node, context):
+    "Returns the size of a jsrender block, translated without debugging markup."
+    translators = node.get_translators(profile=True, debug=False)
+    try:
+        with context.bind_template(template):
+            bodies = [t.translate(context, node.nodelist) for t in translators]
+    except Exception as e:
+        return BlockSize(template.name, index, node.function, error=e)
+    translator = translators[0]
+    function = node.make_function(
+        context, translator.arg_varnames, translator.projection, *bodies)
+    return BlockSize(
+        template.name, index, node.function,
+        size=len(function.function.encode('utf-8')),
+        sources=node.get_profile(translators).report()['sources'],
+    )
+
+
+def measure_template(template_name, using=None, context=None):
+    """Returns the sizes of all jsrender blocks in a template, in order.
+
+    Blocks are translated with the given context dict,
+    the sources are the bytes of Javascript per template line.
+    """
+    template = get_template(template_name, using)
+    return [
+        measure_block(template, index, node, Context(context or {}))
+        for index, node in enumerate(
+            template.nodelist.get_nodes_by_type(TemplateRenderNode))
+    ]
@@ -0,0 +1,105 @@
+from __future__ import unicode_literals
+import base64
+import bisect
+import json
+import six
+from django.template import TemplateDoesNotExist
+
+
+base64_digits = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+
+def encode_vlq(value):
+    "Encode an integer as a base64 variable length quantity, as used by source maps."
+    value = ((-value) << 1) | 1 if value < 0 else value << 1
+    result = ''
+    while True:
+        digit = value & 31
+        value >>= 5
+        if value:
+            digit |= 32
+        result += base64_digits[digit]
+        if not value:
+            return result
+
+
+def source_name(origin):
+    """Returns the name of a template origin in source maps.
+
+    That is its template name, like 'app/row.html', rather than
+    its file name, which would reveal the file system of the server.
+    """
+    if origin is None:
+        return None
+    return getattr(origin, 'template_name', None) or origin.name
+
+
+def source_content(source):
+    "Returns the source of a template origin (or the source as is), or None if unknown."
+    if source is None or isinstance(source, six.string_types):
+        return source
+    loader = getattr(source, 'loader', None)
+    if loader is None:
+        # like templates from strings
+        return None
+    try:
+        return loader.get_contents(source)
+    except TemplateDoesNotExist:
+        return None
+
+
+def source_map(text, positions, file=None, contents=None):
+    """Build a source map (version 3) of the generated text, as a dict.
+
+    The positions are (offset, source name, line, column) tuples
+    mapping the generated text from the (character) offset onwards to the source,
+    with one-based line numbers and zero-based columns.
+    Positions with None as source name mark unmapped text.
+    The contents of the sources are included when given, as a dict of
+    the template origins (or their source) by source name, see `source_content`.
+    """
+    newlines = [i for i, c in enumerate(text) if c == '\n']
+    lines = [[] for _ in range(len(newlines) + 1)]
+    sources = []
+    source_indexes = {}
+    for offset, source, line, column in sorted(positions, key=lambda p: p[0]):
+        generated_line = bisect.bisect_left(newlines, offset)
+        line_start = newlines[generated_line - 1] + 1 if generated_line else 0
+        # columns count UTF-16 code units, like Javascript strings
+        generated_column = len(text[line_start:offset].encode('utf-16-le')) // 2
+        if source is None or line is None:
+            lines[generated_line].append((generated_column,))
+            continue
+        if source not in source_indexes:
+            source_indexes[source] = len(sources)
+            sources.append(source)
+        lines[generated_line].append(
+            (generated_column, source_indexes[source], line - 1, column or 0))
+    # all fields but the generated column are relative to the previous segment,
+    # the generated column only within the same line
+    previous = [0, 0, 0]
+    mappings = []
+    for segments in lines:
+        previous_column = 0
+        encoded = []
+        for segment in segments:
+            bits = [encode_vlq(segment[0] - previous_column)]
+            previous_column = segment[0]
+            for i, value in enumerate(segment[1:]):
+                bits.append(encode_vlq(value - previous[i]))
+                previous[i] = value
+            encoded.append(''.join(bits))
+        mappings.append(','.join(encoded))
+    result = dict(version=3, sources=sources, names=[], mappings=';'.join(mappings))
+    if contents is not None:
+        result['sourcesContent'] = [source_content(contents.get(name)) for name in sources]
+    if file is not None:
+        result['file'] = file
+    return result
+
+
+def inline_source_map(source_map):
+    "Returns a comment to add to Javascript to refer to the (inline) source map."
+    data = base64.b64encode(json.dumps(source_map, sort_keys=True).encode('utf-8'))
+    return '//# sourceMappingURL=data:application/json;charset=utf-8;base64,%s' % (
+        data.decode('ascii'))
@@ -7,8 +7,11 @@ from django.template.loader_tags import IncludeNode
 from django.templatetags import i18n
 from django.conf import settings
 from django.utils.encoding import force_text
-from .functions import mark_safe, express, make_jsexpr, is_jsexpr, JavascriptExpression
+from .functions import (
+    mark_safe, express, make_jsexpr, is_jsexpr, is_escaped, JavascriptExpression,
+)
 from . import datetimeformat
+from . import cache
 if hasattr(defaulttags, 'LoremNode'):
     LoremNode = defaulttags.LoremNode
 else:
@@ -39,15 +42,16 @@ def push_render_state(context, template):
 
 @register(TextNode)
 def translate_node_text(translator, context, node):
-    text = node.render(context)
-    yield translator.write(mark_safe(text))
+    # the text is static, so its literal is cached on the node
+    if node.s != '':
+        translator.emit(translator.write_literal(cache.get_text_literal(node)))
 
 
 @register(VariableNode)
 def translate_node_variable(translator, context, node):
     value = translator.resolve_expression(node.filter_expression, context)
     if value != '':
-        yield translator.write(value)
+        translator.emit(translator.write(value))
 
 
 @register(defaulttags.IfNode)
@@ -82,32 +86,32 @@ def translate_tag_if(translator, context, node):
         # If there's only one branch and it's the one
         # of the 'else' tag (condition == None),
         # then just write that one and we're done.
-        for part in translator.translate_nodelist(context, branches[0][1]):
-            yield part
+        translator.emit_nodelist(context, branches[0][1])
         return
     for n, (condition, nodelist) in enumerate(branches):
         if n == 0:
-            yield 'if(%s){' % express(condition)
+            translator.emit('if(%s){' % express(condition))
         elif condition is not None:
-            yield 'else if(%s){' % express(condition)
+            translator.emit('else if(%s){' % express(condition))
         else:
-            yield 'else{'
+            translator.emit('else{')
         with translator.indented():
-            for part in translator.translate_nodelist(context, nodelist):
-                yield part
-        yield '}'
+            translator.emit_nodelist(context, nodelist)
+        translator.emit('}')
 
 
 class ForloopJavascriptExpression(JavascriptExpression):
     "The 'forloop' context value that is introduced by the 'for' tag."
 
-    def __init__(self, varname, sequence, parent=None):
+    __slots__ = ('_varname', '_length', '_parent')
+
+    def __init__(self, varname, length, parent=None):
         assert isinstance(varname, JavascriptExpression)
-        assert isinstance(sequence, JavascriptExpression)
+        assert isinstance(length, JavascriptExpression)
         assert parent is None or isinstance(parent, ForloopJavascriptExpression)
-        self._varname = varname
-        self._sequence = sequence
-        self._parent = parent
+        object.__setattr__(self, '_varname', varname)
+        object.__setattr__(self, '_length', length)
+        object.__setattr__(self, '_parent', parent)
 
     @property
     def expression(self):
@@ -118,25 +122,81 @@ class ForloopJavascriptExpression(JavascriptExpression):
     def __repr__(self):
         return '<ForloopValue>'
 
+    def __eq__(self, other):
+        return type(self) is type(other) and self.references() == other.references()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self), tuple(self.references())))
+
+    def __reduce__(self):
+        return (type(self), (self._varname, self._length, self._parent))
+
+    def references(self):
+        references = [self._varname, self._length]
+        if self._parent is not None:
+            references.extend(self._parent.references())
+        return references
+
+    def rebuild(self, references):
+        varname, length = references[:2]
+        if self._parent is None:
+            parent = None
+        else:
+            parent = self._parent.rebuild(references[2:])
+        return type(self)(varname, length, parent)
+
     def __getitem__(self, key):
         if key == 'counter':
             return make_jsexpr('%s+1', self._varname)
         elif key == 'counter0':
             return self._varname
         elif key == 'revcounter':
-            return make_jsexpr('%s.length-%s', self._sequence, self._varname)
+            return make_jsexpr('%s-%s', self._length, self._varname)
         elif key == 'revcounter0':
-            return make_jsexpr('%s.length-%s-1', self._sequence, self._varname)
+            return make_jsexpr('%s-%s-1', self._length, self._varname)
         elif key == 'first':
             return make_jsexpr('%s===0', self._varname)
         elif key == 'last':
-            return make_jsexpr('%s===%s.length-1', self._varname, self._sequence)
+            return make_jsexpr('%s===%s-1', self._varname, self._length)
         elif key == 'parentloop' and self._parent is not None:
             return self._parent
         else:
             raise KeyError(key)
 
 
+def loop_value(value):
+    """Returns a Javascript expression of a value of an iteration of a static loop,
+    like a loop variable or the 'forloop' value, or None if there is none.
+
+    These are text, integers (but not booleans, which are output otherwise)
+    and the 'forloop' values of static loops within static or Javascript loops.
+    """
+    if isinstance(value, six.string_types):
+        if is_escaped(value):
+            return mark_safe(make_jsexpr(express(value)))
+        return make_jsexpr(express(value))
+    elif isinstance(value, six.integer_types) and not isinstance(value, bool):
+        return make_jsexpr(express(value))
+    elif isinstance(value, ForloopJavascriptExpression):
+        return value
+    elif isinstance(value, dict) and 'counter0' in value and 'revcounter' in value:
+        parent = value.get('parentloop')
+        if parent is not None:
+            parent = loop_value(parent)
+            if parent is None:
+                return None
+        return ForloopJavascriptExpression(
+            make_jsexpr(express(value['counter0'])),
+            make_jsexpr(express(value['counter0'] + value['revcounter'])),
+            parent,
+        )
+    else:
+        return None
+
+
 @register(defaulttags.ForNode)
 def translate_tag_for(translator, context, node):
     sequence = node.sequence
@@ -152,7 +212,8 @@ def translate_tag_for(translator, context, node):
         if sequence_length > 0:
             if node.is_reversed:
                 sequence_expr = reversed(sequence_expr)
-            with context.push():
+            with context.push(), translator.varname_scope(), \
+                    translator.static_loop(node.loopvars + ['forloop']):
                 forloop = dict(parentloop=context.get('forloop', None))
                 context['forloop'] = forloop
                 for index, item in enumerate(sequence_expr):
@@ -178,75 +239,86 @@ def translate_tag_for(translator, context, node):
                     forloop['first'] = (index == 0)
                     forloop['last'] = (index == sequence_length - 1)
                     # write the loop body
-                    for part in translator.translate_nodelist(
-                            context, node.nodelist_loop):
-                        yield part
+                    translator.emit_nodelist(context, node.nodelist_loop)
         elif node.nodelist_empty:
-            for part in translator.translate_nodelist(context, node.nodelist_empty):
-                yield part
-    else:
+            translator.emit_nodelist(context, node.nodelist_empty)
+    elif len(sequence.filters) > 0:
         # if the sequnce_expr is complex (ie: has filters),
         # store it in a variable and work with that
-        if len(sequence.filters) > 0:
+        with translator.block():
             newvar = translator.get_varname()
-            yield translator.assign(newvar, sequence_expr)
-            sequence_expr = make_jsexpr(newvar)
-        # create the 'if' condition for empty loops if needed
-        if node.nodelist_empty:
-            yield 'if(%s.length==0){' % express(sequence_expr)
-            with translator.indented():
-                for part in translator.translate_nodelist(context, node.nodelist_empty):
-                    yield part
-            yield '}else{'
-            translator.indent()
+            translator.emit(translator.assign(
+                newvar, sequence_expr, block_scoped=True, constant=True))
+            emit_javascript_loop(translator, context, node, translator.variable(newvar))
+    else:
+        emit_javascript_loop(translator, context, node, sequence_expr)
+
+
+def emit_javascript_loop(translator, context, node, sequence_expr):
+    # create the 'if' condition for empty loops if needed
+    if node.nodelist_empty:
+        translator.emit('if(%s==0){' % express(sequence_expr.length()))
+        with translator.indented():
+            translator.emit_nodelist(context, node.nodelist_empty)
+        translator.emit('}else{')
+        translator.indent()
+    # the names used by the loop can be used again after it
+    with translator.varname_scope():
         # create the 'for' statement
         loop_varname = translator.get_varname()
-        loop_var = make_jsexpr(loop_varname)
+        loop_var = translator.variable(loop_varname)
         if node.is_reversed:
-            for_format = 'for(var %(n)s=%(seq)s.length-1;%(n)s>=0;%(n)s--){'
+            for_format = 'for(%(d)s %(n)s=%(len)s-1;%(n)s>=0;%(n)s--){'
         else:
-            for_format = 'for(var %(n)s=0;%(n)s<%(seq)s.length;%(n)s++){'
-        yield for_format % dict(n=loop_varname, seq=express(sequence_expr))
+            for_format = 'for(%(d)s %(n)s=0;%(n)s<%(len)s;%(n)s++){'
+        translator.emit(for_format % dict(
+            d=translator.declaration(block_scoped=True),
+            n=loop_varname,
+            len=express(sequence_expr.length()),
+        ))
         with translator.indented():
             context.push()
             # assign the loopvars
+            # (the items are assigned by reference, so that only
+            # using the loopvars counts as using the sequence items)
             loop_varnames = [translator.get_varname() for _ in node.loopvars]
+            item = sequence_expr.item(loop_var)
             if len(loop_varnames) == 1:
-                js = make_jsexpr('%s[%s]', sequence_expr, loop_var)
-                yield translator.assign(loop_varnames[0], js)
-                context[node.loopvars[0]] = make_jsexpr(loop_varnames[0])
+                translator.emit(translator.assign(
+                    loop_varnames[0], make_jsexpr(item.reference()),
+                    block_scoped=True, constant=True))
+                context[node.loopvars[0]] = translator.intern(item.renamed(loop_varnames[0]))
             else:
                 for n, vn in enumerate(loop_varnames):
-                    yield translator.assign(
-                        vn,
-                        make_jsexpr('%s[%s][%s]', sequence_expr, loop_var, n),
-                    )
-                    context[node.loopvars[n]] = make_jsexpr(vn)
+                    value = item.item(n)
+                    translator.emit(translator.assign(
+                        vn, make_jsexpr(value.reference()),
+                        block_scoped=True, constant=True))
+                    context[node.loopvars[n]] = translator.intern(value.renamed(vn))
             # add the 'forloop' variable
             prev_forloop = context.get('forloop', None)
-            context['forloop'] = ForloopJavascriptExpression(loop_var, sequence_expr, prev_forloop)
+            context['forloop'] = ForloopJavascriptExpression(
+                loop_var, sequence_expr.length(), prev_forloop)
             # write the loop body
-            for part in translator.translate_nodelist(context, node.nodelist_loop):
-                yield part
+            translator.emit_nodelist(context, node.nodelist_loop)
             context.pop()
         # end loop
-        yield '}'
-        # finish the 'if' condition for empty loops if needed
-        if node.nodelist_empty:
-            translator.dedent()
-            yield '}'
+        translator.emit('}')
+    # finish the 'if' condition for empty loops if needed
+    if node.nodelist_empty:
+        translator.dedent()
+        translator.emit('}')
 
 
 @register(defaulttags.NowNode)
 def translate_tag_now(translator, context, node):
     if getattr(node, 'asvar', None) is not None:
         tempvar = translator.get_varname()
-        yield 'var %s = "";' % tempvar
+        translator.emit('var %s = "";' % tempvar)
         newnode = defaulttags.NowNode(node.format_string)
         with translator.redirect_writing(tempvar):
-            for part in translate_tag_now(translator, context, newnode):
-                yield part
-        context[node.asvar] = make_jsexpr(tempvar)
+            translate_tag_now(translator, context, newnode)
+        context[node.asvar] = translator.variable(tempvar)
         return
     assert not is_jsexpr(node.format_string)
     if is_jsexpr(node.format_string):
@@ -254,25 +326,27 @@ def translate_tag_now(translator, context, node):
             "Cannot translate now tags "
             "with variable format strings to Javascript"
         )
-    varname = translator.get_varname()
-    yield translator.assign(varname, make_jsexpr('new Date()'))
-    format_string = node.format_string
-    if format_string.endswith('_FORMAT'):
-        format_string = six.text_type(getattr(settings, format_string))
-    format_string = six.text_type(format_string)
-    format_iterator = iter(format_string)
-    for char in format_iterator:
-        if char == '\\':
-            yield translator.write(six.next(format_iterator))
-        else:
-            output = datetimeformat.get_datetime_format_javascript_expression(char)
-            if output is None:
-                yield translator.write(char)
+    with translator.temporary_varname() as varname, translator.block():
+        translator.emit(translator.assign(
+            varname, make_jsexpr('new Date()'), block_scoped=True, constant=True))
+        date = translator.variable(varname)
+        format_string = node.format_string
+        if format_string.endswith('_FORMAT'):
+            format_string = six.text_type(getattr(settings, format_string))
+        format_string = six.text_type(format_string)
+        format_iterator = iter(format_string)
+        for char in format_iterator:
+            if char == '\\':
+                translator.emit(translator.write(six.next(format_iterator)))
             else:
-                yield translator.write(mark_safe(make_jsexpr(
-                    force_text(output),
-                    x=make_jsexpr(varname)
-                )))
+                output = datetimeformat.get_datetime_format_javascript_expression(char)
+                if output is None:
+                    translator.emit(translator.write(char))
+                else:
+                    translator.emit(translator.write(mark_safe(make_jsexpr(
+                        force_text(output),
+                        x=date
+                    ))))
 
 
 @register(IncludeNode)
@@ -285,7 +359,7 @@ def translate_tag_include(translator, context, node):
         )
     if not callable(getattr(template, 'render', None)):
         # not a regular template, try loading it
-        template = context.template.engine.get_template(template)
+        template = cache.get_template(context.template.engine, template)
     elif hasattr(template, 'template'):
         # this branch is includes to mirror the implementation
         # of django's IncludeNode.render(...)
@@ -299,19 +373,23 @@ def translate_tag_include(translator, context, node):
         context = context.new()
     with context.push(values):
         with push_render_state(context, template):
-            for part in translator.translate_nodelist(context, nodelist):
-                yield part
+            if translator.share_includes:
+                translator.emit_shared(context, nodelist, template)
+            else:
+                translator.emit_nodelist(context, nodelist)
 
 
 @register(defaulttags.FilterNode)
 def translate_tag_filter(translator, context, node):
-    tempvar = translator.get_varname()
-    yield translator.assign(tempvar, '')
-    with translator.redirect_writing(tempvar):
-        for part in translator.translate_nodelist(context, node.nodelist):
-            yield part
-    with context.push(var=make_jsexpr(tempvar)):
-        yield translator.write(translator.resolve_expression(node.filter_expr, context))
+    # (the nodes may store variables in the context that are used after this tag,
+    # so only the temporary variable is used again afterwards)
+    with translator.temporary_varname() as tempvar, translator.block():
+        translator.emit(translator.assign(tempvar, '', block_scoped=True))
+        with translator.redirect_writing(tempvar):
+            translator.emit_nodelist(context, node.nodelist)
+        with context.push(var=translator.variable(tempvar)):
+            translator.emit(translator.write(
+                translator.resolve_expression(node.filter_expr, context)))
 
 
 @register(LoremNode)
@@ -322,7 +400,7 @@ def translate_tag_lorem(translator, context, node):
             "Cannot translate lorem tags "
             "with variable counts to Javascript"
         )
-    yield translator.write(node.render(context))
+    translator.emit(translator.write(node.render(context)))
 
 
 @register(defaulttags.CommentNode)
@@ -337,7 +415,7 @@ def translate_tag_lorem(translator, context, node):
 def translate_static_tag(translator, context, node):
     text = node.render(context)
     if text != '':
-        yield translator.write(text)
+        translator.emit(translator.write(text))
 
 
 @register(defaulttags.LoadNode)
@@ -1,24 +1,155 @@
 from django import template
+from django.conf import settings
+from django.utils.html import mark_safe
 from ..translate import Translator
-from ..context import TemplateFunction
+from ..context import TemplateFunction, Declarations
 from ..functions import js_is_variable
+from ..concurrency import then, gather, prepared_function
+from ..profiling import Profile
+from ..signals import translation_profiled
+
+
+# the key of the declarations of the functions rendered while rendering a template,
+# in its render context
+declarations_key = 'jsrender_declarations'
 
 
 class TemplateRenderNode(template.Node):
-    def __init__(self, function, arguments, nodelist, varname=None):
+    profile_translation = getattr(settings, 'JSRENDER_PROFILE', False)
+    deduplicate = getattr(settings, 'JSRENDER_DEDUPLICATE', True)
+
+    def __init__(
+            self, function, arguments, nodelist, varname=None,
+            batch=False, patch_key=None):
         self.function = function
         self.arguments = arguments
         self.nodelist = nodelist
         self.varname = varname
+        self.batch = batch
+        self.patch_key = patch_key
 
-    def render(self, context):
-        translator = Translator(self.arguments)
-        body = translator.translate(context, self.nodelist)
-        func = TemplateFunction(
-            self.function, self.arguments, translator.arg_varnames,
+    def get_translators(self, profile=None, **kwargs):
+        """Returns the translators of the function body and the batch function body.
+
+        These record a profile when profiling, by default when the
+        JSRENDER_PROFILE setting is set. Other keyword arguments
+        are passed to the translators.
+        """
+        if profile is None:
+            profile = self.profile_translation
+        translators = [Translator(
+            self.arguments, profile=Profile() if profile else None, **kwargs)]
+        if self.batch:
+            translators.append(Translator(
+                self.arguments, batch=True, profile=Profile() if profile else None,
+                **kwargs))
+        return translators
+
+    def get_profile(self, translators):
+        "Returns the profile of all translators, or None if not profiling."
+        if translators[0].profile is None:
+            return None
+        profile = Profile()
+        for translator in translators:
+            profile.merge(translator.profile)
+        return profile
+
+    def get_sources(self, translators):
+        "Returns the template origins of the positions of all translators, by source name."
+        sources = {}
+        for translator in translators:
+            sources.update(translator.origins)
+        return sources
+
+    def send_profile(self, function, translators):
+        "Send the profile of the translators, if profiling."
+        profile = self.get_profile(translators)
+        if profile is not None:
+            translation_profiled.send(
+                sender=type(self), node=self, function=function, profile=profile)
+
+    def make_function(
+            self, context, varnames, projection, body, batch_body=None, positions=None,
+            sources=None):
+        """Build the template function from its translation.
+
+        The key of the patch function is used of the first argument,
+        whether or not the translation uses it.
+        """
+        if self.patch_key is not None:
+            projection = dict(projection)
+            argument = self.arguments[0]
+            projection[argument] = projection[argument] | frozenset([tuple(self.patch_key)])
+        return TemplateFunction(
+            self.function, self.arguments, varnames,
             self.nodelist, body, context,
+            projection=projection,
+            batch_body=batch_body,
+            patch_key=self.patch_key,
+            positions=positions,
+            sources=sources,
         )
+
+    def get_function(self, context):
+        "Translate into the template function."
+        translators = self.get_translators()
+        bodies = [t.translate(context, self.nodelist) for t in translators]
+        translator = translators[0]
+        function = self.make_function(
+            context, translator.arg_varnames, translator.projection, *bodies,
+            positions=[t.positions for t in translators],
+            sources=self.get_sources(translators))
+        self.send_profile(function, translators)
+        return function
+
+    def aget_function(self, context, executor=None):
+        """Returns an asyncio future of the template function,
+        translating large templates in the executor, see `Translator.atranslate`.
+        """
+        translators = self.get_translators()
+        bodies = [t.atranslate(context, self.nodelist, executor) for t in translators]
+        translator = translators[0]
+
+        def make_function(bodies):
+            function = self.make_function(
+                context, translator.arg_varnames, translator.projection, *bodies,
+                positions=[t.positions for t in translators],
+                sources=self.get_sources(translators))
+            self.send_profile(function, translators)
+            return function
+
+        return then(gather(bodies), make_function)
+
+    def render_once(self, context, function):
+        """Render the function, unless it was rendered before while rendering
+        the template (including included templates). A function that is
+        identical to one rendered before (but for its name) is rendered as an alias.
+
+        Raises TemplateSyntaxError if another function
+        of the same name was rendered before.
+        """
+        # the bottom of the render context is kept
+        # for the whole rendering, unlike the template scopes above it
+        declarations = context.render_context.dicts[0].setdefault(
+            declarations_key, Declarations())
+        try:
+            declared = declarations.declare(function)
+        except ValueError as e:
+            raise template.TemplateSyntaxError(e)
+        if declared is None:
+            return ''
+        elif declared is function:
+            return function.script
+        else:
+            return mark_safe('<script>%s</script>' % function.alias(declared))
+
+    def render(self, context):
+        func = prepared_function(context, self)
+        if func is None:
+            func = self.get_function(context)
         if self.varname is None:
+            if self.deduplicate:
+                return self.render_once(context, func)
             return func.script
         else:
             context[self.varname] = func
@@ -79,6 +210,29 @@ def template_render(parser, token):
             "valid javascript arguments"
             % tag_name
         )
+    # extract batch option
+    batch = len(rest) > 0 and rest[0] == 'batch'
+    if batch:
+        rest = rest[1:]
+        if not args:
+            raise template.TemplateSyntaxError(
+                "%s tag's batch option requires the function "
+                "to have arguments"
+                % tag_name
+            )
+    # extract keyed option
+    if len(rest) >= 2 and rest[0] == 'keyed':
+        patch_key = rest[1].split('.')
+        rest = rest[2:]
+        if len(patch_key) < 2 or not args or patch_key[0] != args[0]:
+            raise template.TemplateSyntaxError(
+                "%s tag's keyed option requires a lookup "
+                "on the function's first argument"
+                % tag_name
+            )
+        patch_key = patch_key[1:]
+    else:
+        patch_key = None
     # extract varname
     if len(rest) == 0:
         varname = None
@@ -99,7 +253,7 @@ def template_render(parser, token):
     nodelist = parser.parse(('endjsrender',))
     parser.delete_first_token()
     # done
-    return TemplateRenderNode(funcname, args, nodelist, varname)
+    return TemplateRenderNode(funcname, args, nodelist, varname, batch, patch_key)
 
 
 def template_execute(parser, token):
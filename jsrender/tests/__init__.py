@@ -10,6 +10,8 @@ from .utils import (
     JavascriptTranslationTestCase,
 )
 from .functions import (
+    AsJavascriptTests,
+    ExpressTests,
     EscapeTests,
     MarkSafeTests,
     ConcaternationTests,
@@ -18,6 +20,33 @@ from .functions import (
 )
 from .translate import VariableResolutionTests, QuickTranslateTests, TranslateTests
 from .filters import FilterTests
-from .tags import TagTests
-from .templatetag import TemplateTagTests
+from .tags import TagTests, SharedIncludeTests
+from .templatetag import TemplateTagTests, PatchFunctionTests
+from .projection import ProjectionTests, ProjectTests, ProjectQuerysetTests
+from .responses import StreamingRowsResponseTests
+from .cache import (
+    TemplateCacheTests,
+    TextLiteralCacheTests,
+    TemplateNamesTests,
+    IncludeCacheTests,
+)
+from .concurrency import AsyncTranslateTests
+from .precompile import PrecompileTests
+from .profiling import ProfileTests
+from .sizes import SizesTests
+from .sourcemaps import SourceMapTests
 from .utiltests import UtilTests
+from .minify import (
+    MinifyTests,
+    MinifyTranslatorTests,
+    MinifiedTranslateTests,
+    MinifiedFilterTests,
+    MinifiedTagTests,
+)
+from .targets import (
+    TargetTests,
+    ES2015TranslateTests,
+    ES2015FilterTests,
+    ES2015TagTests,
+    ES2015SharedIncludeTests,
+)
@@ -0,0 +1,158 @@
+from __future__ import unicode_literals
+import datetime
+from django.template import Engine, Context
+from django.template.base import NodeList, TextNode
+from django.test.utils import override_settings
+from django.utils import timezone
+from .. import cache
+from ..translate import Translator
+from .utils import TranslationTestCase, JsrenderTestCase, template_from_string
+
+
+class CountingTranslator(Translator):
+    helper_translations = 0
+
+    def translate_helper(self, *args, **kwargs):
+        CountingTranslator.helper_translations += 1
+        return super(CountingTranslator, self).translate_helper(*args, **kwargs)
+
+
+class TemplateCacheTests(JsrenderTestCase):
+    templates = {'a.html': 'a'}
+
+    def test_cached_loader(self):
+        engine = Engine(loaders=[
+            ('django.template.loaders.cached.Loader', [
+                ('django.template.loaders.locmem.Loader', self.templates),
+            ]),
+        ])
+        template = cache.get_template(engine, 'a.html')
+        self.assertIs(cache.get_template(engine, 'a.html'), template)
+        cache.clear()
+        self.assertNotIn(engine, cache.templates)
+
+    def test_uncached_loader(self):
+        engine = Engine(loaders=[
+            ('django.template.loaders.locmem.Loader', self.templates),
+        ])
+        template = cache.get_template(engine, 'a.html')
+        self.assertIsNot(cache.get_template(engine, 'a.html'), template)
+
+    def test_setting_changed(self):
+        template = template_from_string('a')
+        cache.set_translation(template, 'key', 'value')
+        with override_settings(JSRENDER_CACHE_INCLUDES=True):
+            self.assertEqual(cache.get_translation(template, 'key'), None)
+
+
+class TextLiteralCacheTests(JsrenderTestCase):
+    def test_text_literal(self):
+        node = TextNode('a "b"\n')
+        self.assertEqual(cache.get_text_literal(node), '"a \\"b\\"\\n"')
+        self.assertIn(node, cache.text_literals)
+        cache.text_literals[node] = '"c"'
+        translator = Translator([], debug=False)
+        js = translator.translate(Context(), NodeList([node]))
+        self.assertEqual(js, 'var a="";a+="c";return a;')
+        cache.clear()
+        self.assertNotIn(node, cache.text_literals)
+
+
+class TemplateNamesTests(JsrenderTestCase):
+    def assertNames(self, tpl, names):
+        self.assertEqual(cache.get_template_names(template_from_string(tpl)), names)
+
+    def test_variables(self):
+        self.assertNames('a{{ b.c }}{{ d|default:e.f }}{{ "g" }}', ('b', 'd', 'e'))
+
+    def test_if(self):
+        self.assertNames(
+            '{% if a and not b.c %}{{ d }}{% elif e == 1 %}{% else %}{{ f }}{% endif %}',
+            ('a', 'b', 'd', 'e', 'f'))
+
+    def test_for(self):
+        self.assertNames(
+            '{% for x, y in items %}{{ x }}{{ forloop.counter }}{{ z }}'
+            '{% empty %}{{ x }}{% endfor %}',
+            ('forloop', 'items', 'x', 'z'))
+
+    def test_uncacheable(self):
+        self.assertNames('{% now "Y" %}', None)
+        self.assertNames('{% if a %}{% include b %}{% endif %}', None)
+
+
+class IncludeCacheTests(TranslationTestCase):
+    def setUp(self):
+        cache.clear()
+        CountingTranslator.helper_translations = 0
+
+    def get_translator(self, arguments):
+        return CountingTranslator(
+            arguments,
+            html_escape_function=self.html_escape_function,
+            debug=False,
+            share_includes=True,
+        )
+
+    def translate(self, tpl, context, arguments):
+        translator = self.get_translator(arguments)
+        template = template_from_string(tpl)
+        context = Context(context)
+        with context.bind_template(template):
+            js = translator.translate(context, template.nodelist)
+        return translator, js
+
+    def test_cached(self):
+        tpl = template_from_string('<{{ item.name }}{{ extra }}>')
+        _, first = self.translate('{% include tpl with extra="!" %}', dict(tpl=tpl), ['item'])
+        count = CountingTranslator.helper_translations
+        _, second = self.translate('{% include tpl with extra="!" %}', dict(tpl=tpl), ['item'])
+        self.assertEqual(CountingTranslator.helper_translations, count)
+        self.assertEqual(first, second)
+
+    def test_translated_once(self):
+        # also with unused expressions in the context
+        tpl = template_from_string('<{{ item.name }}>')
+        self.translate('{% include tpl with extra=other %}', dict(tpl=tpl), ['item', 'other'])
+        self.assertEqual(CountingTranslator.helper_translations, 1)
+
+    def test_static_values(self):
+        tpl = template_from_string('{{ extra }}')
+        _, first = self.translate('{% include tpl with extra="!" %}', dict(tpl=tpl), ['item'])
+        _, second = self.translate('{% include tpl with extra="?" %}', dict(tpl=tpl), ['item'])
+        self.assertIn('"!"', first)
+        self.assertIn('"?"', second)
+
+    @override_settings(USE_TZ=True)
+    def test_time_zones(self):
+        # naive datetimes are in the current time zone
+        tpl = template_from_string('{% if item.when == when %}!{% endif %}')
+        context = dict(tpl=tpl, when=datetime.datetime(2020, 1, 1, 12))
+        translations = []
+        for tz in ['Europe/Amsterdam', 'America/New_York']:
+            with timezone.override(tz):
+                _, js = self.translate('{% include tpl %}', context, ['item'])
+                translations.append(js)
+        self.assertIn('new Date(1577876400000)', translations[0])
+        self.assertIn('new Date(1577898000000)', translations[1])
+
+    def test_argument_shapes(self):
+        tpl = template_from_string('{{ extra }}')
+        _, first = self.translate('{% include tpl with extra=1 %}', dict(tpl=tpl), ['item'])
+        _, second = self.translate('{% include tpl with extra=item %}', dict(tpl=tpl), ['item'])
+        self.assertNotEqual(first, second)
+
+    def test_projection(self):
+        tpl = template_from_string('{{ row.name }}')
+        for _ in range(2):
+            translator, _ = self.translate(
+                '{% include tpl with row=item.user %}', dict(tpl=tpl), ['item'])
+            self.assertEqual(translator.projection, dict(item=frozenset([('user', 'name')])))
+
+    def test_uncacheable_value(self):
+        tpl = template_from_string('{{ extra.name }}')
+        self.translate('{% include tpl %}', dict(tpl=tpl, extra=dict(name='a')), [])
+        count = CountingTranslator.helper_translations
+        _, js = self.translate('{% include tpl %}', dict(tpl=tpl, extra=dict(name='b')), [])
+        self.assertGreater(CountingTranslator.helper_translations, count)
+        self.assertIn('"b"', js)
@@ -0,0 +1,99 @@
+from __future__ import unicode_literals
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from django.template import Context
+from django.utils import translation
+try:
+    import asyncio
+except ImportError:  # pragma: no cover
+    asyncio = None
+from ..concurrency import count_nodes, arender
+from .utils import TranslationTestCase, template_from_string, nodelist_from_string
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class AsyncTranslateTests(TranslationTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def call_in_loop(self, func, *args, **kwargs):
+        "Returns the result of calling the function while the event loop is running."
+        result = []
+        self.loop.call_soon(lambda: result.append(func(*args, **kwargs)))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        return result[0]
+
+    def run_future(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_count_nodes(self):
+        self.assertEqual(count_nodes(nodelist_from_string('a{{ b }}')), 2)
+        self.assertEqual(
+            count_nodes(nodelist_from_string('{% if a %}{% for b in c %}d{% endfor %}{% endif %}')),
+            3)
+
+    def test_small(self):
+        nodelist = nodelist_from_string('a{{ b }}')
+        translator = self.get_translator(['b'])
+        future = self.call_in_loop(translator.atranslate, Context(), nodelist, self.executor)
+        self.assertTrue(future.done())
+        self.assertEqual(
+            self.run_future(future),
+            self.get_translator(['b']).translate(Context(), nodelist))
+
+    def test_large(self):
+        nodelist = nodelist_from_string('a{{ b }}{{ c }}')
+        translator = self.get_translator(['b'])
+        translator.async_threshold = 0
+        context = Context(dict(c='d'))
+        future = self.call_in_loop(translator.atranslate, context, nodelist, self.executor)
+        self.assertEqual(
+            self.run_future(future),
+            self.get_translator(['b']).translate(context, nodelist))
+        self.assertEqual(translator.projection, dict(b=frozenset([()])))
+
+    def test_error(self):
+        nodelist = nodelist_from_string('{% load jsrender %}')
+        translator = self.get_translator([])
+        translator.async_threshold = 0
+        future = self.call_in_loop(translator.atranslate, Context(), nodelist, self.executor)
+        with self.assertRaises(Exception):
+            self.run_future(future)
+
+    def test_language(self):
+        nodelist = nodelist_from_string('{{ x }}{{ day }}')
+        translator = self.get_translator(['x'])
+        translator.async_threshold = 0
+        context = Context(dict(day=translation.ugettext_lazy('Monday')))
+        with translation.override('nl'):
+            future = self.call_in_loop(
+                translator.atranslate, context, nodelist, self.executor)
+            self.assertIn('maandag', self.run_future(future))
+
+    def test_arender(self):
+        template = template_from_string(
+            '{% load jsrender %}'
+            '{% jsrender "a(x)" %}{{ x }}{{ y }}{% endjsrender %}'
+            '{% jsrender "b(x)" as b %}{{ x }}{% endjsrender %}'
+            '{% if z %}{% jsrender "c(x)" %}{{ x }}{% endjsrender %}{% endif %}'
+            '{{ b }}')
+        context = dict(y='y', z=True)
+        future = self.call_in_loop(
+            arender, template, Context(context), executor=self.executor)
+        self.assertEqual(self.run_future(future), template.render(Context(context)))
+
+    def test_arender_after_setting_variables(self):
+        template = template_from_string(
+            '{% load jsrender %}'
+            '{% jsrender "a(x)" %}{{ x }}{% endjsrender %}'
+            '{% firstof "late" as v %}'
+            '{% jsrender "b(x)" %}{{ x }}{{ v }}{% endjsrender %}')
+        future = self.call_in_loop(arender, template, Context(), executor=self.executor)
+        self.assertEqual(self.run_future(future), template.render(Context()))
@@ -1,12 +1,24 @@
 from __future__ import unicode_literals
+import datetime
+import json
 import math
+import os
+from django.template import Context
 from django.utils.timezone import now
 from ..datetimeformat import datetime_format_javascript_expressions
+from ..functions import epoch_milliseconds, as_javascript
+from ..responses import JavascriptJSONEncoder
 from .utils import (
-    JavascriptTranslationTestCase,
+    JavascriptTranslationTestCase, nodelist_from_string,
     falsy_values, truthy_expressable_values, falsy_expressable_values,
 )
 
+try:
+    from unittest import mock
+except ImportError:
+    # python < 3.3
+    import mock  # pip install mock
+
 
 class FilterTests(JavascriptTranslationTestCase):
     def test_add(self):
@@ -87,6 +99,31 @@ class FilterTests(JavascriptTranslationTestCase):
                     dict(someday=date),
                 )
 
+    def test_date_from_epoch_milliseconds(self):
+        # Django doesn't format these, so the result is checked directly
+        date = now().replace(microsecond=0)
+        translator = self.get_translator(['someday'])
+        nodelist = nodelist_from_string('{{ someday|date:"Y-m-d H:i:s" }}')
+        translated = translator.translate(Context(), nodelist)
+        for value in [epoch_milliseconds(date), date.isoformat()]:
+            with self.subTest(value=value):
+                script = '(function(%s){%s})(%s)' % (
+                    translator.arg_varnames[0], translated, as_javascript(value))
+                self.assertEqual(
+                    self.execute_javascript(script),
+                    date.strftime('%Y-%m-%d %H:%M:%S'))
+
+    def test_date_from_encoded_date(self):
+        # encoded dates are local midnight, also west of UTC
+        translator = self.get_translator(['someday'])
+        nodelist = nodelist_from_string('{{ someday|date:"Y-m-d" }}')
+        translated = translator.translate(Context(), nodelist)
+        value = json.dumps(datetime.date(2020, 1, 2), cls=JavascriptJSONEncoder)
+        script = '(function(%s){%s})(%s)' % (translator.arg_varnames[0], translated, value)
+        for tz in ['UTC', 'America/Chicago', 'Asia/Tokyo']:
+            with self.subTest(tz=tz), mock.patch.dict(os.environ, TZ=tz):
+                self.assertEqual(self.execute_javascript(script), '2020-01-02')
+
     def test_date_formatchar_P(self):
         date = now().replace(hour=0, minute=0)
         self.assertTranslation(
@@ -1,12 +1,19 @@
 from __future__ import unicode_literals
 import unittest
+import pickle
 import six
+import datetime
 import decimal
+import enum
+import uuid
+from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.safestring import SafeText
 from django.utils.translation import gettext_lazy
 from ..functions import (
     as_javascript, escape, mark_safe, concatenate, is_attributable,
-    JavascriptExpression, SafeJavascriptExpression
+    JavascriptExpression, SafeJavascriptExpression, ArgumentJavascriptExpression,
+    stdlib_encode, orjson_encode, get_json_encoder, orjson, express, epoch_milliseconds,
 )
 from .utils import JsrenderTestCase
 
@@ -37,6 +44,121 @@ class AsJavascriptTests(unittest.TestCase):
             as_javascript(gettext_lazy('ham')),
             '"ham"')
 
+    def test_non_ascii_string(self):
+        self.assertEqual(
+            as_javascript('gr\xfc\xdfe \u65e5\u672c'),
+            '"gr\xfc\xdfe \u65e5\u672c"')
+        with override_settings(JSRENDER_UTF8_LITERALS=False):
+            self.assertEqual(
+                as_javascript('gr\xfc\xdfe \u65e5\u672c'),
+                '"gr\\u00fc\\u00dfe \\u65e5\\u672c"')
+
+    def test_line_terminators(self):
+        self.assertEqual(
+            as_javascript('a\u2028b\u2029c\nd'),
+            '"a\\u2028b\\u2029c\\nd"')
+        with override_settings(JSRENDER_UTF8_LITERALS=False):
+            self.assertEqual(
+                as_javascript('a\u2028b\u2029c\nd'),
+                '"a\\u2028b\\u2029c\\nd"')
+
+    def test_closing_script_tag(self):
+        self.assertEqual(
+            as_javascript(['</script>', '</SCRIPT >', '</li>']),
+            '["<\\/script>","<\\/SCRIPT >","</li>"]')
+
+    def test_json_encoders(self):
+        value = [1, 'gr\xfc\xdfe', dict(a=None, b=[True, 1.5])]
+        encoders = [stdlib_encode, orjson_encode] if orjson else [stdlib_encode]
+        for encoder in encoders:
+            with self.subTest(encoder=encoder):
+                self.assertEqual(
+                    encoder(value, False),
+                    '[1,"gr\xfc\xdfe",{"a":null,"b":[true,1.5]}]')
+                self.assertEqual(
+                    encoder(value, True),
+                    '[1,"gr\\u00fc\\u00dfe",{"a":null,"b":[true,1.5]}]')
+
+    def test_json_encoders_non_finite(self):
+        value = [None, float('nan'), dict(a=float('inf')), -float('inf')]
+        encoders = [stdlib_encode, orjson_encode] if orjson else [stdlib_encode]
+        for encoder in encoders:
+            with self.subTest(encoder=encoder):
+                self.assertEqual(
+                    encoder(value, False),
+                    '[null,NaN,{"a":Infinity},-Infinity]')
+                self.assertEqual(encoder([None, 1.5], False), '[null,1.5]')
+
+    def test_json_encoders_other_types(self):
+        class Color(enum.Enum):
+            red = 'r'
+
+        encoders = [stdlib_encode, orjson_encode] if orjson else [stdlib_encode]
+        for encoder in encoders:
+            with self.subTest(encoder=encoder):
+                value = [uuid.UUID(int=1), Color.red]
+                self.assertEqual(
+                    encoder(value, False),
+                    '["00000000-0000-0000-0000-000000000001","r"]')
+                # not encoded by either, like by orjson
+                for value in [datetime.datetime(2020, 1, 1), datetime.date(2020, 1, 1)]:
+                    with self.assertRaises(TypeError):
+                        encoder([value], False)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_orjson_encoder_fallback(self):
+        # orjson can't encode non-text keys
+        self.assertEqual(orjson_encode({1: 2}, False), '{"1":2}')
+
+    def test_json_encoder_setting(self):
+        self.assertIs(get_json_encoder(), orjson_encode if orjson else stdlib_encode)
+        self.assertIs(get_json_encoder(stdlib_encode), stdlib_encode)
+        self.assertIs(get_json_encoder('jsrender.functions.stdlib_encode'), stdlib_encode)
+        with override_settings(JSRENDER_JSON_ENCODER=lambda value, ensure_ascii: 'json'):
+            self.assertEqual(as_javascript([1]), 'json')
+        self.assertEqual(as_javascript([1]), '[1]')
+
+
+class ExpressTests(JsrenderTestCase):
+    def test_datetime(self):
+        value = datetime.datetime(2020, 1, 2, 3, 4, 5, 6000, tzinfo=timezone.utc)
+        self.assertEqual(epoch_milliseconds(value), 1577934245006)
+        self.assertEqual(express(value), 'new Date(1577934245006)')
+
+    @override_settings(USE_TZ=True)
+    def test_naive_datetime(self):
+        value = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        with timezone.override(timezone.utc):
+            self.assertEqual(express(value), 'new Date(1577934245000)')
+        with timezone.override(timezone.get_fixed_timezone(60)):
+            self.assertEqual(express(value), 'new Date(1577930645000)')
+
+    @override_settings(USE_TZ=True)
+    def test_naive_datetime_in_transition(self):
+        # taken to be in standard time (CET), when non-existent and ambiguous
+        with timezone.override('Europe/Amsterdam'):
+            self.assertEqual(
+                express(datetime.datetime(2026, 3, 29, 2, 30)),
+                express(datetime.datetime(2026, 3, 29, 1, 30, tzinfo=timezone.utc)))
+            self.assertEqual(
+                express(datetime.datetime(2026, 10, 25, 2, 30)),
+                express(datetime.datetime(2026, 10, 25, 1, 30, tzinfo=timezone.utc)))
+
+    @override_settings(USE_TZ=False)
+    def test_naive_datetime_without_time_zones(self):
+        # the wall clock time, like Django renders it
+        value = datetime.datetime(2020, 1, 2, 3, 4, 5, 6789)
+        self.assertEqual(express(value), 'new Date(2020,0,2,3,4,5,6)')
+
+    def test_date(self):
+        self.assertEqual(express(datetime.date(2020, 1, 2)), 'new Date(2020,0,2)')
+
+    def test_set(self):
+        # sorted, unlike their order of iteration
+        self.assertEqual(express(set([8, 1])), '[1,8]')
+        self.assertEqual(express(frozenset(['b', 'c', 'a'])), '["a","b","c"]')
+        self.assertEqual(express(dict(x=set(['b', 1]))), '{"x":["b",1]}')
+
 
 class EscapeTests(JsrenderTestCase):
     def test_string(self):
@@ -279,6 +401,42 @@ class JavascriptExpressionTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             JavascriptExpression('')
 
+    def test_hashing(self):
+        self.assertEqual(hash(JavascriptExpression('a')), hash(JavascriptExpression('a')))
+        expressions = {JavascriptExpression('a'): 1, SafeJavascriptExpression('a'): 2}
+        self.assertEqual(expressions[JavascriptExpression('a')], 1)
+        self.assertEqual(expressions[SafeJavascriptExpression('a')], 2)
+        self.assertNotIn(JavascriptExpression('b'), expressions)
+
+    def test_immutable(self):
+        jsexpr = JavascriptExpression('a')
+        with self.assertRaises(AttributeError):
+            jsexpr.expression = 'b'
+        with self.assertRaises(AttributeError):
+            del jsexpr.expression
+        with self.assertRaises(AttributeError):
+            jsexpr.other = 'b'
+        self.assertEqual(jsexpr.expression, 'a')
+
+    def test_pickling(self):
+        for jsexpr in [JavascriptExpression('a'), SafeJavascriptExpression('a')]:
+            with self.subTest(jsexpr=jsexpr):
+                self.assertEqual(pickle.loads(pickle.dumps(jsexpr)), jsexpr)
+
+    def test_argument_expression(self):
+        paths = set()
+        jsexpr = ArgumentJavascriptExpression('a', paths)
+        same = ArgumentJavascriptExpression('a.b', paths, ('b',))
+        self.assertEqual(jsexpr['b'], same)
+        self.assertEqual(hash(jsexpr['b']), hash(same))
+        # the same Javascript of another argument is another expression
+        self.assertNotEqual(jsexpr['b'], ArgumentJavascriptExpression('a.b', set(), ('b',)))
+        self.assertEqual(paths, set())
+        with self.assertRaises(AttributeError):
+            jsexpr.other = 'b'
+        self.assertEqual(jsexpr['b'].expression, 'a.b')
+        self.assertEqual(paths, set([('b',)]))
+
     def test_getitem(self):
         jsexpr = JavascriptExpression('a')
         self.assertIsInstance(jsexpr['b'], JavascriptExpression)
@@ -0,0 +1,118 @@
+from __future__ import unicode_literals
+from django.template import Context
+from ..minify import minify, tokenize, shorten_number, requote_string
+from ..translate import Translator
+from .utils import JsrenderTestCase, nodelist_from_string
+from . import translate, filters, tags
+
+
+class MinifyingTranslator(Translator):
+    minify = True
+
+
+class MinifyTests(JsrenderTestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize('a+="x\\"y";\n  b >>>= 1.5e3 //c\n/*d*/'), [
+            ('word', 'a'),
+            ('punctuator', '+='),
+            ('string', '"x\\"y"'),
+            ('punctuator', ';'),
+            ('word', 'b'),
+            ('punctuator', '>>>='),
+            ('number', '1.5e3'),
+        ])
+
+    def test_tokenize_regex(self):
+        self.assertEqual(tokenize('a=/[/]x/g.test(b)/2'), [
+            ('word', 'a'),
+            ('punctuator', '='),
+            ('regex', '/[/]x/g'),
+            ('punctuator', '.'),
+            ('word', 'test'),
+            ('punctuator', '('),
+            ('word', 'b'),
+            ('punctuator', ')'),
+            ('punctuator', '/'),
+            ('number', '2'),
+        ])
+
+    def test_whitespace(self):
+        self.assertEqual(minify('var a = b;\n  return typeof a;'), 'var a=b;return typeof a;')
+        self.assertEqual(minify('a = b + +c - -d;'), 'a=b+ +c- -d;')
+        self.assertEqual(minify('a = 1 .toString();'), 'a=1 .toString();')
+
+    def test_semicolons(self):
+        self.assertEqual(minify('if(a){b;};;c;'), 'if(a){b};c;')
+        self.assertEqual(minify('for(;;){}'), 'for(;;){}')
+        self.assertEqual(minify('if(a);else{b;}'), 'if(a);else{b}')
+
+    def test_var(self):
+        self.assertEqual(minify('var a=1;var b=2;c();var d;'), 'var a=1,b=2;c();var d;')
+        self.assertEqual(
+            minify('var a=1;for(var b=0;b<a;b++){var c=b;var d=c;}var e;'),
+            'var a=1;for(var b=0;b<a;b++){var c=b,d=c}var e;')
+        self.assertEqual(minify('if(a)var b=1;var c=2;'), 'if(a)var b=1;var c=2;')
+
+    def test_parentheses(self):
+        self.assertEqual(minify('a+=(b.c[0]);'), 'a+=b.c[0];')
+        self.assertEqual(minify('a=!((b));'), 'a=!b;')
+        self.assertEqual(minify('a=("x")+(1);'), 'a="x"+1;')
+        self.assertEqual(minify('a=(1).toFixed(2);'), 'a=(1).toFixed(2);')
+        # calls and grouping
+        self.assertEqual(minify('a=f(b)(c);'), 'a=f(b)(c);')
+        self.assertEqual(minify('a=typeof(b);'), 'a=typeof(b);')
+        self.assertEqual(minify('a=(b+c)*d;'), 'a=(b+c)*d;')
+        self.assertEqual(minify('a=function(){}(b);'), 'a=function(){}(b);')
+
+    def test_numbers(self):
+        self.assertEqual(shorten_number('0.50'), '.5')
+        self.assertEqual(shorten_number('1.0'), '1')
+        self.assertEqual(shorten_number('12.340'), '12.34')
+        self.assertEqual(shorten_number('1000'), '1e3')
+        self.assertEqual(shorten_number('100'), '100')
+        self.assertEqual(shorten_number('0'), '0')
+        self.assertEqual(shorten_number('0.0'), '0')
+        self.assertEqual(shorten_number('0x10'), '0x10')
+        self.assertEqual(shorten_number('07'), '07')
+        self.assertEqual(shorten_number('1e10'), '1e10')
+        self.assertEqual(minify('a=1.0.toFixed(1)+2.50;'), 'a=1.0.toFixed(1)+2.5;')
+
+    def test_strings(self):
+        self.assertEqual(requote_string('"a\\"b"'), '\'a"b\'')
+        self.assertEqual(requote_string('"a\\"b\'c\'"'), '"a\\"b\'c\'"')
+        self.assertEqual(requote_string("'a'"), '"a"')
+        self.assertEqual(requote_string("'a\\'b'"), '"a\'b"')
+        self.assertEqual(requote_string('"\\u00e9\\n\\\\"'), '"é\\n\\\\"')
+        # not unescaped
+        self.assertEqual(requote_string('"\\u003c\\u2028\\ud83d"'), '"\\u003c\\u2028\\ud83d"')
+        self.assertEqual(requote_string('"\\u00e9"', unescape=False), '"\\u00e9"')
+
+    def test_cache(self):
+        js = 'var a = 1;'
+        self.assertIs(minify(js), minify(js))
+
+
+class MinifyTranslatorTests(JsrenderTestCase):
+    def translate_template(self, template, **kwargs):
+        translator = Translator(['a'], debug=True, **kwargs)
+        return translator, translator.translate(Context(), nodelist_from_string(template))
+
+    def test_translate(self):
+        translator, body = self.translate_template('{{ a.b }}', minify=True)
+        self.assertEqual(body, 'var a="";a+=html_escape(b.b);return a;')
+        self.assertIsNone(translator.positions)
+        translator, body = self.translate_template('{{ a.b }}')
+        self.assertIn('\n', body)
+        self.assertIsNotNone(translator.positions)
+
+
+class MinifiedTranslateTests(translate.TranslateTests):
+    translator_class = MinifyingTranslator
+
+
+class MinifiedFilterTests(filters.FilterTests):
+    translator_class = MinifyingTranslator
+
+
+class MinifiedTagTests(tags.TagTests):
+    translator_class = MinifyingTranslator
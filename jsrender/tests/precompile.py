@@ -0,0 +1,127 @@
+from __future__ import unicode_literals
+import os
+import pickle
+import multiprocessing
+import subprocess
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from django.template import Context
+from django.test.utils import override_settings
+from ..precompile import get_template, get_block, translate_job, translate_blocks, bundle
+from .utils import JsrenderTestCase
+
+
+templates = {
+    'a.html': (
+        '{% load jsrender %}'
+        '{% jsrender "a(x)" %}{{ x.name }}{{ title }}{% endjsrender %}'
+        '{% if show %}{% jsrender "b(y)" batch %}<{{ y }}>{% endjsrender %}{% endif %}'
+    ),
+    'c.html': '{% load jsrender %}{% jsrender "c()" %}c{% endjsrender %}',
+    'd.html': (
+        '{% load jsrender %}{% jsrender "d()" %}c{% endjsrender %}'
+        '{% jsrender "c()" %}d{% endjsrender %}'
+    ),
+}
+
+
+class PrecompileTests(JsrenderTestCase):
+    jobs = [
+        ('a.html', 1, {}),
+        ('c.html', 0, {}),
+        ('a.html', 0, dict(title='t')),
+    ]
+
+    def setUp(self):
+        self.settings = override_settings(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {
+                'loaders': [('django.template.loaders.locmem.Loader', templates)],
+            },
+        }])
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def get_expected(self):
+        functions = []
+        for name, index, context in self.jobs:
+            template = get_template(name)
+            context = Context(context)
+            with context.bind_template(template):
+                functions.append(get_block(template, index).get_function(context))
+        return functions
+
+    def assertFunctions(self, functions):
+        expected = self.get_expected()
+        self.assertEqual([f.funcname for f in functions], ['b', 'c', 'a'])
+        self.assertEqual([f.script for f in functions], [f.script for f in expected])
+        self.assertEqual(
+            [f.projection for f in functions],
+            [f.projection for f in expected])
+
+    def test_get_block(self):
+        template = get_template('a.html')
+        self.assertEqual(get_block(template, 1).function, 'b')
+        with self.assertRaises(IndexError):
+            get_block(template, 2)
+
+    def test_translate_job(self):
+        result = translate_job((None, 'a.html', 0, dict(title='t')))
+        self.assertEqual(pickle.loads(pickle.dumps(result)), result)
+        self.assertEqual(result[1], dict(x=frozenset([('name',)])))
+
+    def test_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            self.assertFunctions(translate_blocks(self.jobs, executor=executor))
+
+    def test_bundle(self):
+        with ThreadPoolExecutor(2) as executor:
+            functions = translate_blocks(
+                self.jobs + [('d.html', 0, {}), ('c.html', 0, {})], executor=executor)
+        b, c, a, d, c_again = functions
+        self.assertEqual(
+            bundle(functions),
+            b.function + c.function + a.function + 'var d=c;')
+        with ThreadPoolExecutor(2) as executor:
+            functions += translate_blocks([('d.html', 1, {})], executor=executor)
+        with self.assertRaisesRegex(ValueError, 'Template function c'):
+            bundle(functions)
+
+    def test_deterministic(self):
+        # strings are hashed differently in every process, by default
+        script = (
+            'import django; django.setup();'
+            'from django.template import Context, Template;'
+            'from jsrender.precompile import get_block;'
+            'template = Template(%r);'
+            'context = Context(dict(xs=set(%r)));'
+            'print(get_block(template, 0).get_function(context).content_hash)'
+        ) % (
+            '{% load jsrender %}'
+            '{% jsrender "c(x)" %}{% if x in xs %}c{% endif %}{% endjsrender %}',
+            ['a', 'b', 'c', 'd', 'e'],
+        )
+        # the directory of the jsrender package (and the test settings)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        path = os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'test_settings')
+        hashes = set()
+        for seed in ['1', '2', '3']:
+            env = dict(
+                os.environ, PYTHONHASHSEED=seed, PYTHONPATH=path,
+                DJANGO_SETTINGS_MODULE=settings_module)
+            hashes.add(subprocess.check_output(
+                [sys.executable, '-c', script], env=env, cwd=root))
+        self.assertEqual(len(hashes), 1)
+
+    @unittest.skipIf(
+        'fork' not in multiprocessing.get_all_start_methods(),
+        "processes can't be forked with the test settings")
+    def test_processes(self):
+        # forked processes share the overridden template settings
+        executor = ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('fork'))
+        with executor:
+            self.assertFunctions(translate_blocks(self.jobs, executor=executor))
@@ -0,0 +1,119 @@
+from __future__ import unicode_literals
+from django.template import Context
+from ..profiling import Profile
+from ..signals import translation_profiled
+from ..templatetags.jsrender import TemplateRenderNode
+from .utils import TranslationTestCase, template_from_string
+
+
+def profile_origin(profile):
+    origin, = set(origin for origin, line in profile.lines)
+    return origin
+
+
+class ProfileTests(TranslationTestCase):
+    def get_profile(self, tpl, arguments, context=None, **kwargs):
+        template = template_from_string(tpl)
+        profile = Profile()
+        translator = self.translator_class(
+            arguments,
+            html_escape_function=self.html_escape_function,
+            debug=False,
+            profile=profile,
+            **kwargs
+        )
+        context = Context(context or {})
+        with context.bind_template(template):
+            js = translator.translate(context, template.nodelist)
+        return profile, js
+
+    def test_nodes(self):
+        profile, js = self.get_profile(
+            '{% for x in items %}<li>{{ x|length }}</li>{% endfor %}',
+            ['items'])
+        self.assertEqual(
+            dict((name, stats.count) for name, stats in profile.nodes.items()),
+            dict(TextNode=2, ForNode=1, VariableNode=1))
+        # the for loop is all there is
+        self.assertEqual(
+            profile.nodes['ForNode'].bytes,
+            len(js) - len('var a="";return a;'))
+        self.assertGreater(profile.nodes['ForNode'].bytes, profile.nodes['VariableNode'].bytes)
+        self.assertGreaterEqual(profile.nodes['ForNode'].time, profile.nodes['VariableNode'].time)
+
+    def test_shared_includes(self):
+        # every node of the included template is translated (and counted) once
+        profile, _ = self.get_profile(
+            '{% include tpl with extra=other %}',
+            ['item', 'other'],
+            dict(tpl=template_from_string('<{{ item.name }}>')),
+            share_includes=True,
+        )
+        self.assertEqual(
+            dict((name, stats.count) for name, stats in profile.nodes.items()),
+            dict(IncludeNode=1, TextNode=2, VariableNode=1))
+        self.assertEqual(
+            profile.nodes['VariableNode'].bytes,
+            len('a+=escape(item_0.name);'))
+
+    def test_lines(self):
+        profile, _ = self.get_profile('a\n{{ b }}\n{{ c }}', ['b', 'c'])
+        self.assertEqual(
+            sorted((line, stats.count) for (origin, line), stats in profile.lines.items()),
+            [(1, 1), (2, 2), (3, 1)])
+
+    def test_sources(self):
+        profile, js = self.get_profile(
+            'a\n{% for x in items %}\n<li>{{ x }}</li>\n{% endfor %}',
+            ['items'])
+        self.assertEqual(
+            sum(stats.bytes for stats in profile.sources.values()),
+            len(js) - len('var a="";return a;'))
+        self.assertEqual(
+            profile.sources[(profile_origin(profile), 3)].bytes,
+            len('a+=escape(d);a+="</li>\\n";'))
+
+    def test_filters(self):
+        profile, _ = self.get_profile(
+            '{{ x|length }}{{ y|length }}{{ z|default:"-" }}',
+            ['x', 'z'],
+            dict(y='abc'))
+        self.assertEqual(profile.filters['length'].count, 2)
+        self.assertEqual(profile.filters['default'].count, 1)
+        self.assertEqual(profile.filters['length'].bytes, len('b.length'))
+
+    def test_report(self):
+        profile, _ = self.get_profile('{% if x %}{{ x|length }}{% endif %}', ['x'])
+        report = profile.report()
+        self.assertEqual(
+            [item['node'] for item in report['nodes']][0], 'IfNode')
+        self.assertEqual(
+            set(report['nodes'][0].keys()),
+            set(['node', 'time', 'count', 'bytes']))
+        self.assertEqual(report['lines'][0]['line'], 1)
+        self.assertEqual(report['filters'][0]['filter'], 'length')
+
+    def test_merge(self):
+        profile, _ = self.get_profile('{{ x }}', ['x'])
+        other, _ = self.get_profile('{{ x }}{{ x }}', ['x'])
+        profile.merge(other)
+        self.assertEqual(profile.nodes['VariableNode'].count, 3)
+
+    def test_signal(self):
+        received = []
+
+        def receiver(sender, node, function, profile, **kwargs):
+            received.append((function.funcname, profile))
+
+        template = template_from_string(
+            '{% load jsrender %}{% jsrender "f(x)" batch %}{{ x }}{% endjsrender %}')
+        translation_profiled.connect(receiver)
+        TemplateRenderNode.profile_translation = True
+        try:
+            template.render(Context())
+        finally:
+            TemplateRenderNode.profile_translation = False
+            translation_profiled.disconnect(receiver)
+        (funcname, profile), = received
+        self.assertEqual(funcname, 'f')
+        self.assertEqual(profile.nodes['VariableNode'].count, 2)
@@ -0,0 +1,275 @@
+from __future__ import unicode_literals
+import json
+from django.db.models import QuerySet
+from django.template import Context
+from testapp.models import Group, Member
+from ..context import TemplateFunction
+from ..functions import ITEMS, LENGTH
+from ..projection import (
+    projection_tree, project, row_paths, project_queryset, iter_projected, iter_projected_json,
+)
+from .utils import TranslationTestCase, JsrenderTestCase, nodelist_from_string
+
+try:
+    from unittest import mock
+except ImportError:
+    # python < 3.3
+    import mock  # pip install mock
+
+
+class User(object):
+    def __init__(self, name, email):
+        self.name = name
+        self.email = email
+
+    def display_name(self):
+        return self.name.title()
+
+
+def make_function(**projection):
+    return TemplateFunction(
+        'f', list(projection.keys()), [], None, '', None,
+        projection=dict((k, frozenset(v)) for k, v in projection.items()),
+    )
+
+
+class ProjectionTests(TranslationTestCase):
+    def get_projection(self, tpl, arguments, context=None):
+        nodelist = nodelist_from_string(tpl)
+        t = self.get_translator(arguments)
+        t.translate(Context(context or {}), nodelist)
+        return t.projection
+
+    def test_unused(self):
+        projection = self.get_projection('hello', ['user'])
+        self.assertEqual(projection, dict(user=frozenset()))
+
+    def test_full(self):
+        projection = self.get_projection('{{ user }}', ['user'])
+        self.assertEqual(projection, dict(user=frozenset([()])))
+
+    def test_lookups(self):
+        projection = self.get_projection(
+            '{{ user.name }} {{ user.address.city }}',
+            ['user'])
+        self.assertEqual(projection, dict(user=frozenset([
+            ('name',),
+            ('address', 'city'),
+        ])))
+
+    def test_condition(self):
+        projection = self.get_projection(
+            '{% if user.is_staff %}{{ user.name }}{% endif %}',
+            ['user'])
+        self.assertEqual(projection, dict(user=frozenset([
+            ('is_staff',),
+            ('name',),
+        ])))
+
+    def test_filter(self):
+        projection = self.get_projection('{{ user.name|default:"x" }}', ['user'])
+        self.assertEqual(projection, dict(user=frozenset([('name',)])))
+
+    def test_loop(self):
+        projection = self.get_projection(
+            '{% for item in items %}{{ item.name }}{{ forloop.revcounter }}{% endfor %}',
+            ['items'])
+        self.assertEqual(projection, dict(items=frozenset([(LENGTH,), (ITEMS, 'name')])))
+
+    def test_loop_empty(self):
+        projection = self.get_projection(
+            '{% for item in items %}{{ item.name }}{% empty %}none{% endfor %}',
+            ['items'])
+        self.assertEqual(projection, dict(items=frozenset([(LENGTH,), (ITEMS, 'name')])))
+
+    def test_loop_without_item(self):
+        projection = self.get_projection(
+            '{% for item in items %}x{% if forloop.last %}.{% endif %}{% endfor %}',
+            ['items'])
+        self.assertEqual(projection, dict(items=frozenset([(LENGTH,)])))
+        self.assertEqual(
+            project([User('abc', 'a@b.c'), 'def'], projection['items']),
+            [{}, 'def'])
+
+    def test_nested_loops(self):
+        projection = self.get_projection(
+            '{% for row in rows %}{% for cell in row.cells %}'
+            '{{ cell.value }}{% endfor %}{% endfor %}',
+            ['rows'])
+        self.assertEqual(projection, dict(rows=frozenset([
+            (LENGTH,),
+            (ITEMS, 'cells', LENGTH),
+            (ITEMS, 'cells', ITEMS, 'value'),
+        ])))
+
+    def test_nested_loop_without_item(self):
+        projection = self.get_projection(
+            '{% for row in rows %}{{ row.name }}{% for cell in row.cells %}'
+            'x{% endfor %}{% endfor %}',
+            ['rows'])
+        self.assertEqual(projection, dict(rows=frozenset([
+            (LENGTH,),
+            (ITEMS, 'name'),
+            (ITEMS, 'cells', LENGTH),
+        ])))
+        rows = [dict(name='a', cells=[dict(value=1), dict(value=2)], other=3)]
+        self.assertEqual(
+            project(rows, projection['rows']),
+            [dict(name='a', cells=[{}, {}])])
+
+    def test_sibling_loops(self):
+        # the loop variables have the same Javascript name
+        projection = self.get_projection(
+            '{% for x in xs %}{{ x.a }}{% endfor %}{% for y in ys %}{{ y.b }}{% endfor %}',
+            ['xs', 'ys'])
+        self.assertEqual(projection, dict(
+            xs=frozenset([(LENGTH,), (ITEMS, 'a')]),
+            ys=frozenset([(LENGTH,), (ITEMS, 'b')]),
+        ))
+
+    def test_loop_unpacking(self):
+        projection = self.get_projection(
+            '{% for key, value in pairs %}{{ value.name }}{% endfor %}',
+            ['pairs'])
+        self.assertEqual(projection, dict(pairs=frozenset([
+            (LENGTH,),
+            (ITEMS, ITEMS, 'name'),
+        ])))
+
+    def test_multiple_arguments(self):
+        projection = self.get_projection(
+            '{{ user.name }}{{ site }}',
+            ['user', 'site'])
+        self.assertEqual(projection, dict(
+            user=frozenset([('name',)]),
+            site=frozenset([()]),
+        ))
+
+
+class ProjectTests(JsrenderTestCase):
+    def test_projection_tree(self):
+        self.assertEqual(projection_tree([()]), None)
+        self.assertEqual(projection_tree([('a',), ('a', 'b')]), dict(a=None))
+        self.assertEqual(
+            projection_tree([('a', 'b'), ('a', 'c'), ('d',)]),
+            dict(a=dict(b=None, c=None), d=None))
+        self.assertEqual(
+            projection_tree([('0', 'a'), (ITEMS, 'b')]),
+            {ITEMS: dict(a=None, b=None)})
+
+    def test_project_dict(self):
+        value = dict(name='abc', email='abc@example.com', address=dict(city='x', street='y'))
+        self.assertEqual(
+            project(value, [('name',), ('address', 'city')]),
+            dict(name='abc', address=dict(city='x')))
+
+    def test_project_full(self):
+        value = dict(name='abc')
+        self.assertIs(project(value, [()]), value)
+
+    def test_project_object(self):
+        value = User('abc', 'abc@example.com')
+        self.assertEqual(
+            project(value, [('name',), ('display_name',)]),
+            dict(name='abc', display_name='Abc'))
+
+    def test_project_missing(self):
+        value = dict(name='abc')
+        self.assertEqual(project(value, [('name',), ('missing',)]), dict(name='abc'))
+
+    def test_project_items(self):
+        value = [User('abc', 'a@b.c'), User('def', 'd@e.f')]
+        self.assertEqual(
+            project(value, [(ITEMS, 'name')]),
+            [dict(name='abc'), dict(name='def')])
+
+    def test_project_unused(self):
+        self.assertEqual(project(dict(name='abc'), []), None)
+
+    def test_project_primitive(self):
+        self.assertEqual(project('abc', [('length',)]), 'abc')
+        self.assertEqual(project(None, [('name',)]), None)
+
+
+class ProjectQuerysetTests(JsrenderTestCase):
+    def test_row_paths(self):
+        func = make_function(item=[('name',)])
+        self.assertEqual(row_paths(func), frozenset([('name',)]))
+        func = make_function(items=[(ITEMS, 'name')])
+        self.assertEqual(row_paths(func), frozenset([('name',)]))
+        func = make_function(items=[(LENGTH,), (ITEMS, 'name')])
+        self.assertEqual(row_paths(func), frozenset([('name',)]))
+        func = make_function(items=[(ITEMS, 'name')], extra=[()])
+        self.assertEqual(row_paths(func, 'items'), frozenset([('name',)]))
+        with self.assertRaises(ValueError):
+            row_paths(func)
+
+    def test_fields(self):
+        func = make_function(item=[('name',), ('pk',)])
+        qs = project_queryset(Member.objects.all(), func)
+        self.assertEqual(qs.query.deferred_loading, (frozenset(['name', 'id']), False))
+        self.assertEqual(qs.query.select_related, False)
+
+    def test_full(self):
+        func = make_function(item=[()])
+        qs = Member.objects.all()
+        self.assertIs(project_queryset(qs, func), qs)
+
+    def test_attribute(self):
+        func = make_function(item=[('display_name',)])
+        qs = project_queryset(Member.objects.all(), func)
+        self.assertEqual(
+            qs.query.deferred_loading,
+            (frozenset(['id', 'name', 'email', 'group']), False))
+
+    def test_foreign_key(self):
+        func = make_function(items=[(ITEMS, 'name'), (ITEMS, 'group', 'name')])
+        qs = project_queryset(Member.objects.all(), func)
+        self.assertEqual(
+            qs.query.deferred_loading,
+            (frozenset(['name', 'group', 'group__name']), False))
+        self.assertEqual(qs.query.select_related, dict(group={}))
+
+    def test_foreign_key_column(self):
+        func = make_function(item=[('group_id',)])
+        qs = project_queryset(Member.objects.all(), func)
+        self.assertEqual(qs.query.deferred_loading, (frozenset(['group']), False))
+        self.assertEqual(qs.query.select_related, False)
+
+    def test_many_to_many(self):
+        func = make_function(item=[('name',), ('tags', 'all', ITEMS, 'label')])
+        qs = project_queryset(Member.objects.all(), func)
+        self.assertEqual(qs.query.deferred_loading, (frozenset(['name']), False))
+        self.assertEqual(qs._prefetch_related_lookups, ('tags',))
+
+    def test_iterating_querysets(self):
+        func = make_function(item=[('name',)])
+        without_lookups = Member.objects.all()
+        del without_lookups._prefetch_related_lookups
+        tests = [
+            (Member.objects.all(), True),
+            (Member.objects.prefetch_related('tags'), False),
+            # unknown, as the private attribute is missing
+            (without_lookups, False),
+        ]
+        for qs, chunked in tests:
+            with self.subTest(qs=qs), \
+                    mock.patch.object(QuerySet, 'iterator', return_value=iter([])) as iterator, \
+                    mock.patch.object(QuerySet, '__iter__', return_value=iter([])), \
+                    mock.patch('jsrender.projection.project_queryset', return_value=qs):
+                self.assertEqual(list(iter_projected(qs, func)), [])
+                self.assertEqual(iterator.called, chunked)
+
+    def test_iter_projected_json(self):
+        func = make_function(item=[('name',), ('group', 'name')])
+        group = Group(name='staff')
+        rows = [
+            Member(name='abc', email='abc@example.com', group=group),
+            Member(name='def', email='def@example.com', group=group),
+        ]
+        self.assertEqual(
+            [json.loads(row) for row in iter_projected_json(rows, func)],
+            [
+                dict(name='abc', group=dict(name='staff')),
+                dict(name='def', group=dict(name='staff')),
+            ])
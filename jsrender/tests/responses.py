@@ -0,0 +1,105 @@
+from __future__ import unicode_literals
+import datetime
+import decimal
+import json
+import uuid
+from django.template import Context
+from django.test.utils import override_settings
+from django.utils import timezone
+from .. import functions
+from ..responses import StreamingRowsResponse, JavascriptJSONEncoder
+from .utils import JsrenderTestCase, template_from_string
+
+try:
+    from unittest import mock
+except ImportError:
+    # python < 3.3
+    import mock  # pip install mock
+
+
+class StreamingRowsResponseTests(JsrenderTestCase):
+    rows = [
+        dict(id=1, name='abc', email='abc@example.com'),
+        dict(id=2, name='def', email='def@example.com'),
+        dict(id=3, name='ghi', email='ghi@example.com'),
+    ]
+
+    def get_function(self):
+        tpl = """
+        {% load jsrender %}
+        {% jsrender "row(item)" as row %}{{ item.name }}{% endjsrender %}
+        """
+        ctx = {}
+        template_from_string(tpl).render(Context(ctx))
+        return ctx['row']
+
+    def get_content(self, response):
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_lines(self):
+        response = StreamingRowsResponse(self.rows, chunk_size=2)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        content = b''.join(chunks).decode('utf-8')
+        self.assertEqual(content.count('\n'), 3)
+        self.assertEqual(list(map(json.loads, content.splitlines())), self.rows)
+
+    def test_lines_empty(self):
+        response = StreamingRowsResponse([])
+        self.assertEqual(self.get_content(response), '')
+
+    def test_array(self):
+        response = StreamingRowsResponse(self.rows, array=True, chunk_size=2)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(self.get_content(response)), self.rows)
+
+    def test_array_empty(self):
+        response = StreamingRowsResponse([], array=True)
+        self.assertEqual(self.get_content(response), '[]')
+
+    def test_projected(self):
+        response = StreamingRowsResponse(self.rows, self.get_function(), array=True)
+        self.assertEqual(
+            self.get_content(response),
+            '[{"name":"abc"},{"name":"def"},{"name":"ghi"}]')
+
+    def test_json_encoder(self):
+        rows = [dict(
+            id=uuid.UUID(int=1), amount=decimal.Decimal('1.50'),
+            day=datetime.date(2020, 1, 2), name='caf\xe9',
+        )]
+        response = StreamingRowsResponse(rows)
+        self.assertEqual(
+            self.get_content(response),
+            '{"id":"00000000-0000-0000-0000-000000000001","amount":"1.50",'
+            '"day":"2020-01-02","name":"caf\xe9"}\n')
+
+    def test_json_encoder_hook(self):
+        encoder = mock.Mock(wraps=functions.json_encoder)
+        with mock.patch.object(functions, 'json_encoder', encoder):
+            response = StreamingRowsResponse(self.rows, array=True)
+            self.assertEqual(json.loads(self.get_content(response)), self.rows)
+        self.assertEqual(encoder.call_count, len(self.rows))
+
+    def test_content_type(self):
+        response = StreamingRowsResponse(self.rows, content_type='text/plain')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+
+    def test_javascript_encoder(self):
+        rows = [dict(
+            created=datetime.datetime(2020, 1, 2, 3, 4, 5, 6000, tzinfo=timezone.utc),
+            day=datetime.date(2020, 1, 2),
+        )]
+        response = StreamingRowsResponse(rows, encoder=JavascriptJSONEncoder)
+        self.assertEqual(
+            self.get_content(response),
+            '{"created":1577934245006,"day":"2020-01-02T00:00:00"}\n')
+
+    @override_settings(USE_TZ=False)
+    def test_javascript_encoder_naive(self):
+        rows = [dict(created=datetime.datetime(2020, 1, 2, 3, 4, 5, 6789))]
+        response = StreamingRowsResponse(rows, encoder=JavascriptJSONEncoder)
+        self.assertEqual(
+            self.get_content(response),
+            '{"created":"2020-01-02T03:04:05.006"}\n')
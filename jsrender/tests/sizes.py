@@ -0,0 +1,85 @@
+from __future__ import unicode_literals
+from django.core.management import call_command, CommandError
+from django.test.utils import override_settings
+from six import StringIO
+from ..sizes import find_templates, measure_template
+from .utils import JsrenderTestCase
+
+
+templates = {
+    'a.html': (
+        '{% load jsrender %}\n'
+        '{% jsrender "a(x)" %}\n'
+        '{{ x }}\n'
+        '{% for y in x %}<li class="long item">{{ y }}</li>{% endfor %}\n'
+        '{% endjsrender %}\n'
+        '{% jsrender "b()" %}b{% endjsrender %}'
+    ),
+    'c.html': '{% load jsrender %}{% jsrender "c()" %}{{ missing.value|date }}{% endjsrender %}',
+    'd.html': 'no blocks',
+}
+
+
+class SizesTests(JsrenderTestCase):
+    def setUp(self):
+        self.settings = override_settings(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {
+                'loaders': [('django.template.loaders.locmem.Loader', templates)],
+            },
+        }])
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+
+    def call(self, *args, **kwargs):
+        out = StringIO()
+        err = StringIO()
+        call_command('jsrender_sizes', *args, stdout=out, stderr=err, **kwargs)
+        return out.getvalue(), err.getvalue()
+
+    def test_find_templates(self):
+        self.assertEqual(find_templates(), ['a.html', 'c.html'])
+
+    def test_measure_template(self):
+        a, b = measure_template('a.html')
+        self.assertEqual((a.function, a.index, b.function, b.index), ('a', 0, 'b', 1))
+        self.assertEqual(b.size, len('function b(){var a="";a+="b";return a;}'))
+        self.assertEqual(
+            [(source['origin'], source['line']) for source in a.sources][:2],
+            [('a.html', 4), ('a.html', 3)])
+        self.assertEqual(
+            sum(source['bytes'] for source in a.sources),
+            a.size - len('function a(b){var a="";return a;}'))
+
+    def test_measure_error(self):
+        c, = measure_template('c.html', context=dict(missing=dict(value=1)))
+        self.assertIsNone(c.error)
+        c, = measure_template('c.html')
+        self.assertIsNotNone(c.error)
+
+    def test_command(self):
+        out, err = self.call('a.html', lines=1)
+        lines = out.splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('a.html #0 a()', lines[0])
+        self.assertIn('a.html:4', lines[1])
+        self.assertIn('a.html #1 b()', lines[2])
+        self.assertIn('a.html:6', lines[3])
+        self.assertEqual(err, '')
+
+    def test_command_errors(self):
+        with self.assertRaisesRegex(CommandError, '1 jsrender block'):
+            self.call()
+        out, err = self.call(ignore_errors=True)
+        self.assertIn('c.html #0 c()', err)
+
+    def test_budget(self):
+        a, b = measure_template('a.html')
+        self.call('a.html', budget=a.size)
+        with self.assertRaisesRegex(CommandError, '1 jsrender function'):
+            self.call('a.html', budget=a.size - 1)
+        with override_settings(JSRENDER_SIZE_BUDGET=b.size - 1):
+            with self.assertRaisesRegex(CommandError, '2 jsrender function'):
+                self.call('a.html')
@@ -0,0 +1,170 @@
+from __future__ import unicode_literals
+import base64
+import json
+import os
+import tempfile
+from django.template import Context, Engine
+from django.template.base import Origin
+from ..context import TemplateFunction
+from ..translate import Translator
+from ..sourcemaps import base64_digits, encode_vlq, source_map, inline_source_map
+from .utils import JsrenderTestCase, template_from_string
+
+try:
+    from unittest import mock
+except ImportError:
+    # python < 3.3
+    import mock  # pip install mock
+
+
+def decode_vlqs(segment):
+    values = []
+    value = shift = 0
+    for char in segment:
+        digit = base64_digits.index(char)
+        value += (digit & 31) << shift
+        shift += 5
+        if not digit & 32:
+            values.append(-(value >> 1) if value & 1 else value >> 1)
+            value = shift = 0
+    return values
+
+
+def decode_mappings(result):
+    "Returns the absolute (line, column, source, line, column) of every segment."
+    decoded = []
+    previous = [0, 0, 0]
+    for line, segments in enumerate(result['mappings'].split(';')):
+        column = 0
+        for segment in filter(None, segments.split(',')):
+            values = decode_vlqs(segment)
+            column += values[0]
+            if len(values) == 1:
+                decoded.append((line, column, None, None, None))
+                continue
+            previous = [p + v for p, v in zip(previous, values[1:])]
+            decoded.append((line, column, result['sources'][previous[0]]) + tuple(previous[1:]))
+    return decoded
+
+
+class SourceMapTests(JsrenderTestCase):
+    def test_encode_vlq(self):
+        self.assertEqual(encode_vlq(0), 'A')
+        self.assertEqual(encode_vlq(1), 'C')
+        self.assertEqual(encode_vlq(-1), 'D')
+        self.assertEqual(encode_vlq(16), 'gB')
+        self.assertEqual(encode_vlq(-123), '3H')
+        for value in (0, 5, -17, 1000, -123456):
+            self.assertEqual(decode_vlqs(encode_vlq(value)), [value])
+
+    def test_source_map(self):
+        result = source_map(
+            'ab\ncd e',
+            [(0, None, None, 0), (1, 'x', 3, 0), (4, 'y', 1, 2), (7, 'x', 4, 0)],
+            file='f.js')
+        self.assertEqual(result['file'], 'f.js')
+        self.assertEqual(result['sources'], ['x', 'y'])
+        self.assertEqual(decode_mappings(result), [
+            (0, 0, None, None, None),
+            (0, 1, 'x', 2, 0),
+            (1, 1, 'y', 0, 2),
+            (1, 4, 'x', 3, 0),
+        ])
+
+    def test_inline_source_map(self):
+        comment = inline_source_map(dict(version=3))
+        prefix = '//# sourceMappingURL=data:application/json;charset=utf-8;base64,'
+        self.assertTrue(comment.startswith(prefix))
+        self.assertEqual(
+            json.loads(base64.b64decode(comment[len(prefix):]).decode('utf-8')),
+            dict(version=3))
+
+    def get_function(self, tpl, signature='f()', options='', context=None):
+        template = template_from_string(
+            '{%% load jsrender %%}{%% jsrender "%s" %s as f %%}%s{%% endjsrender %%}'
+            % (signature, options, tpl),
+            origin=Origin('t.html'))
+        context = Context(context or {})
+        template.render(context)
+        return context['f']
+
+    def assertMapped(self, function, text, line, same_line=False, source='t.html'):
+        """Check that the generated text is mapped to the template line,
+        by a segment on the same generated line if same_line is True.
+        """
+        js = function.function
+        offset = js.index(text)
+        generated_line = js.count('\n', 0, offset)
+        generated_column = offset - (js.rfind('\n', 0, offset) + 1)
+        mapped = None
+        for segment in decode_mappings(function.source_map):
+            if segment[:2] <= (generated_line, generated_column):
+                mapped = segment
+        self.assertEqual(mapped[2:4], (source, line - 1), (text, mapped))
+        if same_line:
+            self.assertEqual(mapped[0], generated_line, (text, mapped))
+
+    def test_function(self):
+        function = self.get_function(
+            'a\n{{ x.name }}\n{% if x.y %}\nb{% endif %}c', 'f(x)')
+        self.assertEqual(function.source_map['file'], 'f.js')
+        self.assertMapped(function, '"a\\n"', 1)
+        self.assertMapped(function, '(b.name)', 2)
+        self.assertMapped(function, 'if(', 3)
+        self.assertMapped(function, '"\\nb"', 3)
+        self.assertMapped(function, '"c"', 4)
+
+    def test_shared_include(self):
+        included = template_from_string('<{{ x.a }}>\n{{ x.b }}', origin=Origin('i.html'))
+        with mock.patch.object(Translator, 'share_includes', True):
+            function = self.get_function(
+                'a\n{% include tpl %}', 'f(x)', context=dict(tpl=included))
+        # the helper function is mapped to the include tag,
+        # its body to the lines of the included template
+        self.assertMapped(function, '(x_0){', 2, same_line=True)
+        self.assertMapped(function, 'html_escape(x_0.a)', 1, source='i.html')
+        self.assertMapped(function, 'html_escape(x_0.b)', 2, source='i.html')
+        self.assertMapped(function, '"a\\n"', 1)
+
+    def test_sources(self):
+        source = '{% load jsrender %}{% jsrender "f(x)" as f %}a\n{{ x }}{% endjsrender %}'
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'app'))
+            with open(os.path.join(directory, 'app', 'row.html'), 'w') as f:
+                f.write(source)
+            engine = Engine(dirs=[directory], libraries={
+                'jsrender': 'jsrender.templatetags.jsrender',
+            })
+            context = Context()
+            engine.get_template('app/row.html').render(context)
+            result = context['f'].source_map
+        # named by their template names, not by their files
+        self.assertEqual(result['sources'], ['app/row.html'])
+        self.assertEqual(result['sourcesContent'], [source])
+        # which aren't known for templates from strings
+        self.assertEqual(self.get_function('a').source_map['sourcesContent'], [None])
+
+    def test_constant(self):
+        choices = ['choice %s' % i for i in range(100)]
+        function = self.get_function(
+            'a\n{% if x in choices %}b{% endif %}\n{% if x not in choices %}c{% endif %}',
+            'f(x)', context=dict(choices=choices))
+        # declared once, and mapped to where it's first used
+        self.assertEqual(function.function.count('["choice 0"'), 1)
+        self.assertMapped(function, '["choice 0"', 2, same_line=True)
+
+    def test_batch(self):
+        function = self.get_function('a\n{{ x }}', 'f(x)', 'batch')
+        js = function.function
+        self.assertMapped(function, 'escape', 2)
+        self.assertEqual(js.count('html_escape('), 2)
+
+    def test_script(self):
+        function = self.get_function('a')
+        self.assertNotIn('sourceMappingURL', function.script)
+        function.inline_source_maps = True
+        self.assertIn(inline_source_map(function.source_map), function.script)
+
+    def test_unknown(self):
+        function = TemplateFunction('f', [], [], None, 'return "";', None)
+        self.assertEqual(function.source_map, None)
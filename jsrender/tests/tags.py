@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 import unittest
 import itertools
 import django
+from django.template import Context
 from ..datetimeformat import datetime_format_javascript_expressions
 from .utils import (
     truthy_values, falsy_values,
@@ -238,6 +239,36 @@ class TagTests(JavascriptTranslationTestCase):
                         dict(array=array),
                     )
 
+    def test_if_with_in_large_constants(self):
+        choices = ['choice %s' % i for i in range(100)]
+        for obj in ['choice 5', 'other']:
+            with self.subTest(obj=obj):
+                self.assertTranslation(
+                    '{% if obj in choices %}T{% endif %}{% if obj not in choices %}F{% endif %}',
+                    dict(obj=obj),
+                    dict(choices=choices),
+                )
+
+    def test_if_with_in_set(self):
+        choices = set(['choice %s' % i for i in range(10)])
+        for obj in ['choice 5', 'other']:
+            with self.subTest(obj=obj):
+                self.assertTranslation(
+                    '{% if obj in choices %}T{% else %}F{% endif %}',
+                    dict(obj=obj),
+                    dict(choices=choices),
+                )
+
+    def test_if_with_in_large_constants_after_loop(self):
+        # the constant isn't declared with the name of the loop counter
+        choices = ['choice %s' % i for i in range(100)]
+        self.assertTranslation(
+            '{% for x in xs %}{{ x }}{% endfor %}'
+            '{% if obj in choices %}T{% endif %}{% if obj not in choices %}F{% endif %}',
+            dict(obj='choice 5', xs=['a', 'b']),
+            dict(choices=choices),
+        )
+
     def test_if_with_filter(self):
         self.assertTranslation(
             '{% if spam|add:"1" %}T{% else %}F{% endif %}',
@@ -640,6 +671,16 @@ class TagTests(JavascriptTranslationTestCase):
             "4"
         )
 
+    def test_filter_with_asvar(self):
+        # the variable is used after the filter tag,
+        # while its temporary variable is used again
+        self.assertTranslation(
+            '{% filter length %}{% now "Y" as year %}{% endfilter %}'
+            '{% filter length %}{% now "Y" %}{% endfilter %}{{ year }}',
+            {},
+            {},
+        )
+
     def test_templatetag(self):
         args = [
             'openblock',
@@ -688,3 +729,114 @@ class TagTests(JavascriptTranslationTestCase):
             dict(num=1),
             {},
         )
+
+
+class SharedIncludeTests(JavascriptTranslationTestCase):
+    def get_translator(self, arguments):
+        return self.translator_class(
+            arguments,
+            html_escape_function=self.html_escape_function,
+            debug=True,
+            share_includes=True,
+        )
+
+    def test_include(self):
+        self.assertTranslation(
+            'a{% include tpl with extra="c" %}d',
+            dict(tpl=template_from_string('{{ var }}{{ extra }}'), var='b'),
+            {},
+            "abcd"
+        )
+        self.assertTranslation(
+            'a{% include tpl with extra="c" %}d',
+            dict(tpl=template_from_string('{{ var }}{{ extra }}')),
+            dict(var='<b>'),
+            "a&lt;b&gt;cd"
+        )
+
+    def test_include_with_argument(self):
+        self.assertTranslation(
+            '{% include tpl with extra=var.name %}',
+            dict(tpl=template_from_string('<{{ extra }}>')),
+            dict(var=dict(name='b')),
+            "<b>"
+        )
+
+    def test_include_in_loop(self):
+        self.assertTranslation(
+            '{% for x in items %}{% include tpl %}{% endfor %}{% include tpl with x=last %}',
+            dict(tpl=template_from_string('<i>{{ x }}</i>')),
+            dict(items=['a', 'b'], last='c'),
+            "<i>a</i><i>b</i><i>c</i>"
+        )
+
+    def test_include_after_loop(self):
+        # the helper function doesn't reuse the name of the loop counter
+        self.assertTranslation(
+            '{% for x in items %}{{ x }}{% endfor %}{% include tpl %}',
+            dict(tpl=template_from_string('<{{ y }}>')),
+            dict(items=['a', 'b'], y='c'),
+            "ab<c>"
+        )
+
+    def test_include_forloop(self):
+        self.assertTranslation(
+            '{% for x in items %}{% for y in x %}{% include tpl %}{% endfor %}{% endfor %}',
+            dict(tpl=template_from_string(
+                '{{ forloop.parentloop.counter }}{{ forloop.counter }}{{ y }}'
+                '{% if forloop.last %};{% endif %}')),
+            dict(items=[['a', 'b'], ['c']]),
+            "11a12b;21c;"
+        )
+
+    def test_include_in_static_loop(self):
+        self.assertTranslation(
+            '{% for y in items %}{% for x in static %}{% include tpl %}{% endfor %}{% endfor %}',
+            dict(
+                static=[1, 2],
+                tpl=template_from_string('{{ forloop.parentloop.counter }}{{ x }}{{ y }}')),
+            dict(items=['a', 'b']),
+            "11a12a21b22b"
+        )
+
+    def test_include_in_static_loop_once(self):
+        # every iteration calls the same helper function, with its values
+        tpl = template_from_string(
+            '{{ x }}{{ forloop.counter }}{{ forloop.parentloop.counter }}'
+            '{% if forloop.last %};{% endif %}')
+        source = '{% for y in items %}{% for x in static %}{% include tpl %}{% endfor %}{% endfor %}'
+        context = dict(static=['a', 1], tpl=tpl)
+        translator = self.get_translator(['items'])
+        template = template_from_string(source)
+        translate_context = Context(context)
+        with translate_context.bind_template(template):
+            js = translator.translate(translate_context, template.nodelist)
+        self.assertEqual(js.count('function'), 1)
+        self.assertTranslation(source, context, dict(items=["a", "b"]), "a11121;a12122;")
+
+    def test_include_in_static_loop_static_values(self):
+        # the included template uses its values statically
+        self.assertTranslation(
+            '{% for x in static %}{% include tpl %}{% endfor %}',
+            dict(static=['a', 'b'], tpl=template_from_string('{{ x|upper }}{{ y }}')),
+            dict(y='c'),
+            "AcBc"
+        )
+
+    def test_include_nested(self):
+        self.assertTranslation(
+            '{% include outer %}',
+            dict(
+                outer=template_from_string('[{% include inner %}]'),
+                inner=template_from_string('{{ x }}')),
+            dict(x='y'),
+            "[y]"
+        )
+
+    def test_include_isolated(self):
+        self.assertTranslation(
+            '{% include tpl with y=x only %}',
+            dict(tpl=template_from_string('{{ y }}')),
+            dict(x='z'),
+            "z"
+        )
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+from django.template import Context
+from ..translate import Translator
+from .utils import JsrenderTestCase, nodelist_from_string
+from . import translate, filters, tags
+
+
+class ES2015Translator(Translator):
+    target = 'es2015'
+
+
+class TargetTests(JsrenderTestCase):
+    def translate_template(self, template, **kwargs):
+        translator = Translator(['xs'], debug=False, **kwargs)
+        return translator.translate(Context(), nodelist_from_string(template))
+
+    def test_unknown_target(self):
+        with self.assertRaisesRegex(ValueError, "Unknown Javascript target 'es3'"):
+            Translator([], target='es3')
+
+    def test_declarations(self):
+        self.assertEqual(Translator([]).declaration(), 'var')
+        self.assertEqual(Translator([]).declaration(block_scoped=True), 'var')
+        translator = Translator([], target='es2015')
+        self.assertEqual(translator.declaration(), 'var')
+        self.assertEqual(translator.declaration(block_scoped=True), 'let')
+        self.assertEqual(translator.declaration(block_scoped=True, constant=True), 'const')
+
+    def test_loop(self):
+        template = '{% for x in xs %}{{ x }}{% endfor %}'
+        self.assertEqual(
+            self.translate_template(template),
+            'var a="";for(var c=0;c<b.length;c++){var d=b[c];a+=html_escape(d);}return a;')
+        self.assertEqual(
+            self.translate_template(template, target='es2015'),
+            'let a="";for(let c=0;c<b.length;c++){const d=b[c];a+=html_escape(d);}return a;')
+
+    def test_blocks(self):
+        template = (
+            '{% filter length %}{% now "Y" as year %}{% endfilter %}'
+            '{% filter length %}{{ year }}{% endfilter %}'
+        )
+        self.assertEqual(
+            self.translate_template(template),
+            'var a="";'
+            'var c="";var d = "";var e=new Date();d+=e.getFullYear();a+=c.length;'
+            'var c="";c+=html_escape(d);a+=c.length;'
+            'return a;')
+        # the variable stored in the context is declared outside of the blocks
+        self.assertEqual(
+            self.translate_template(template, target='es2015'),
+            'let a="";'
+            '{let c="";var d = "";{const e=new Date();d+=e.getFullYear();}a+=c.length;}'
+            '{let c="";c+=html_escape(d);a+=c.length;}'
+            'return a;')
+
+
+class ES2015TranslateTests(translate.TranslateTests):
+    translator_class = ES2015Translator
+
+
+class ES2015FilterTests(filters.FilterTests):
+    translator_class = ES2015Translator
+
+
+class ES2015TagTests(tags.TagTests):
+    translator_class = ES2015Translator
+
+
+class ES2015SharedIncludeTests(tags.SharedIncludeTests):
+    translator_class = ES2015Translator
@@ -1,7 +1,56 @@
+import json
 from django.test import SimpleTestCase
-from django.template import Context, VariableDoesNotExist, TemplateSyntaxError
+from django.template import Context, Engine, VariableDoesNotExist, TemplateSyntaxError
 from ..templatetags.jsrender import TemplateRenderNode, TemplateFunction
-from .utils import TranslationMixin, template_from_string, nodelist_from_string
+from .utils import (
+    TranslationMixin, JavascriptTranslationTestCase,
+    template_from_string, nodelist_from_string,
+)
+
+
+# A minimal DOM implementation, just enough for patch functions,
+# which counts the nodes created to check which items were rendered.
+fake_dom = """
+var created = 0;
+function FakeNode(html) {
+    this.html = html;
+    this.parentNode = null;
+    created++;
+}
+Object.defineProperty(FakeNode.prototype, 'nextSibling', {get: function() {
+    var c = this.parentNode.children;
+    return c[c.indexOf(this) + 1] || null;
+}});
+function FakeElement() {
+    this.children = [];
+}
+Object.defineProperty(FakeElement.prototype, 'firstChild', {get: function() {
+    return this.children[0] || null;
+}});
+Object.defineProperty(FakeElement.prototype, 'textContent', {set: function(text) {
+    this.children = [];
+}});
+FakeElement.prototype.insertBefore = function(node, ref) {
+    if (node.parentNode) node.parentNode.removeChild(node);
+    var i = ref ? this.children.indexOf(ref) : this.children.length;
+    this.children.splice(i, 0, node);
+    node.parentNode = this;
+};
+FakeElement.prototype.removeChild = function(node) {
+    this.children.splice(this.children.indexOf(node), 1);
+    node.parentNode = null;
+};
+var document = {createElement: function() {
+    var template = {content: {childNodes: []}};
+    Object.defineProperty(template, 'innerHTML', {set: function(html) {
+        template.content.childNodes = [new FakeNode(html)];
+    }});
+    return template;
+}};
+function state(container) {
+    return container.children.map(function(n) { return n.html; }).join('|') + '#' + created;
+}
+"""
 
 
 class TemplateTagTests(TranslationMixin, SimpleTestCase):
@@ -38,6 +87,69 @@ class TemplateTagTests(TranslationMixin, SimpleTestCase):
             '</script>'
         )
 
+    def test_define_tag_once(self):
+        tpl = """
+        {% load jsrender %}
+        {% for i in items %}{% jsrender "thename()" %}hello{% endjsrender %}{% endfor %}
+        """
+        t = template_from_string(tpl)
+        res = t.render(Context(dict(items=[1, 2, 3])))
+        self.assertEqual(res.count('<script>'), 1)
+        # every rendering declares the function
+        res = t.render(Context(dict(items=[1, 2, 3])))
+        self.assertEqual(res.count('<script>'), 1)
+
+    def test_define_tag_once_with_includes(self):
+        engine = Engine(
+            libraries={'jsrender': 'jsrender.templatetags.jsrender'},
+            loaders=[('django.template.loaders.locmem.Loader', {
+                'a.html': '{% include "b.html" %}{% include "b.html" %}',
+                'b.html': '{% load jsrender %}{% jsrender "thename()" %}b{% endjsrender %}',
+            })],
+        )
+        res = engine.get_template('a.html').render(Context())
+        self.assertEqual(res.count('<script>'), 1)
+
+    def test_define_tag_aliases(self):
+        tpl = """
+        {% load jsrender %}
+        {% jsrender "first(x)" batch %}<{{ x }}>{% endjsrender %}
+        {% jsrender "second(y)" batch %}<{{ y }}>{% endjsrender %}
+        """
+        t = template_from_string(tpl)
+        res = t.render(Context())
+        self.assertEqual(res.count('function '), 2)
+        self.assertIn(
+            '<script>var second=first;var second_all=first_all;</script>', res)
+
+    def test_content_hash(self):
+        tpl = """
+        {% load jsrender %}
+        {% jsrender "first(x)" %}{% if x in choices %}T{% endif %}{% endjsrender %}
+        """
+        t = template_from_string(tpl)
+        node, = t.nodelist.get_nodes_by_type(TemplateRenderNode)
+        first = node.get_function(Context(dict(choices=set(['a', 'b', 'c']))))
+        second = node.get_function(Context(dict(choices=set(['c', 'b', 'a']))))
+        self.assertEqual(len(first.content_hash), 64)
+        self.assertEqual(first.content_hash, second.content_hash)
+        third = node.get_function(Context(dict(choices=set(['a', 'b']))))
+        self.assertNotEqual(first.content_hash, third.content_hash)
+
+    def test_define_tag_once_conflicting(self):
+        tpl = """
+        {% load jsrender %}
+        {% for i in items %}{% jsrender "thename()" %}{{ i }}{% endjsrender %}{% endfor %}
+        """
+        t = template_from_string(tpl)
+        with self.assertRaisesRegex(TemplateSyntaxError, 'thename'):
+            t.render(Context(dict(items=[1, 2])))
+        # unless not deduplicating
+        node, = t.nodelist.get_nodes_by_type(TemplateRenderNode)
+        node.deduplicate = False
+        res = t.render(Context(dict(items=[1, 2])))
+        self.assertEqual(res.count('<script>'), 2)
+
     def test_define_tag_with_arguments(self):
         tpl = """
         {% load jsrender %}
@@ -98,6 +210,10 @@ class TemplateTagTests(TranslationMixin, SimpleTestCase):
         self.assertEqual(repr(func), '<TemplateFunction thename(arg, bal)>')
         self.assertMultiLineEqual(str(func), func.script)
         self.assertMultiLineEqual(res.strip(), func.script.strip())
+        self.assertEqual(func.projection, dict(
+            arg=frozenset([()]),
+            bal=frozenset(),
+        ))
 
         self.assertJsEqual(
             res.strip(),
@@ -107,6 +223,108 @@ class TemplateTagTests(TranslationMixin, SimpleTestCase):
             '</script>'
         )
 
+    def test_define_tag_project(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item, extra)" as row %}{{ item.user.name }}{% endjsrender %}
+        """
+        ctx = {}
+        t = template_from_string(tpl)
+        t.render(Context(ctx))
+
+        func = ctx['row']
+        item = dict(id=1, user=dict(name='abc', email='abc@example.com'))
+        self.assertEqual(
+            func.project(item, 'x'),
+            [dict(user=dict(name='abc')), None])
+        with self.assertRaises(TypeError):
+            func.project(item)
+
+    def test_define_tag_batch(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item)" batch as row %}hello {{ item }}{% endjsrender %}
+        """
+        ctx = {}
+        t = template_from_string(tpl)
+        defnode = t.nodelist[3]
+        self.assertIsInstance(defnode, TemplateRenderNode)
+        self.assertTrue(defnode.batch)
+        self.assertEqual(defnode.varname, 'row')
+        t.render(Context(ctx))
+
+        func = ctx['row']
+        self.assertEqual(func.batch_funcname, 'row_all')
+        self.assertJsEqual(
+            func.function,
+            'function row(b)'
+            '{var a="";a+="hello ";a+=html_escape(b);return a;}'
+            'function row_all(b)'
+            '{var a="";for(var c=0;c<b.length;c++){  var d=b[c];'
+            '  a+="hello ";  a+=html_escape(d);}return a;}'
+        )
+
+    def test_define_tag_batch_without_arguments(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "thename()" batch %}hello{% endjsrender %}
+        """
+        with self.assertRaisesRegex(
+            TemplateSyntaxError,
+            "jsrender tag's batch option requires the function "
+            "to have arguments"
+        ):
+            nodelist_from_string(tpl)
+
+    def test_define_tag_keyed(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item, extra)" keyed item.user.id as row %}{{ item }}{% endjsrender %}
+        """
+        ctx = {}
+        t = template_from_string(tpl)
+        defnode = t.nodelist[3]
+        self.assertIsInstance(defnode, TemplateRenderNode)
+        self.assertEqual(defnode.patch_key, ['user', 'id'])
+        self.assertEqual(defnode.varname, 'row')
+        t.render(Context(ctx))
+
+        func = ctx['row']
+        self.assertEqual(func.patch_funcname, 'row_patch')
+        self.assertTrue(func.patch_function.startswith('function row_patch(_p,_l,c){'))
+        self.assertIn('_k="k"+((_v.user).id);', func.patch_function)
+        self.assertIn('_f.innerHTML=row(_v,c);', func.patch_function)
+        self.assertTrue(func.function.endswith(func.patch_function))
+
+    def test_define_tag_keyed_invalid_key(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item)" keyed other.id %}hello{% endjsrender %}
+        """
+        with self.assertRaisesRegex(
+            TemplateSyntaxError,
+            "jsrender tag's keyed option requires a lookup "
+            "on the function's first argument"
+        ):
+            nodelist_from_string(tpl)
+
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item)" keyed item %}hello{% endjsrender %}
+        """
+        with self.assertRaisesRegex(
+            TemplateSyntaxError,
+            "jsrender tag's keyed option requires a lookup "
+            "on the function's first argument"
+        ):
+            nodelist_from_string(tpl)
+
     def test_define_tag_missing_quotes_around_signature(self):
         tpl = """
         {% load jsrender %}
@@ -301,3 +519,92 @@ class TemplateTagTests(TranslationMixin, SimpleTestCase):
 
         with self.assertRaisesRegex(VariableDoesNotExist, "greeting"):
             t.render(c)
+
+
+class PatchFunctionTests(JavascriptTranslationTestCase):
+    html_escape_function = 'html_escape'
+
+    def get_patch_function(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item, sep)" keyed item.id as row %}{{ item.name }}{{ sep }}{% endjsrender %}
+        """
+        ctx = {}
+        template_from_string(tpl).render(Context(ctx))
+        return ctx['row']
+
+    def test_patch(self):
+        func = self.get_patch_function()
+        script = """(function() {
+            %s
+            %s
+            var c = new FakeElement(), result = [];
+            c.textContent = 'initial';
+            row_patch(c, [{id: 1, name: 'a'}, {id: 2, name: 'b'}], '!');
+            result.push(state(c));
+            // unchanged
+            row_patch(c, [{id: 1, name: 'a'}, {id: 2, name: 'b'}], '!');
+            result.push(state(c));
+            // changed, added and reordered
+            row_patch(c, [{id: 3, name: 'c'}, {id: 2, name: 'B'}, {id: 1, name: 'a'}], '!');
+            result.push(state(c));
+            // removed
+            row_patch(c, [{id: 1, name: 'a'}], '!');
+            result.push(state(c));
+            return result.join(' ');
+        })()""" % (fake_dom, func.function)
+        result = self.execute_javascript(script)
+        self.assertEqual(result, 'a!|b!#2 a!|b!#2 c!|B!|a!#4 a!#4')
+
+    def test_patch_other_arguments(self):
+        script = """(function() {
+            %s
+            %s
+            var c = new FakeElement(), result = [];
+            row_patch(c, [{id: 1, name: 'a'}, {id: 2, name: 'b'}], '!');
+            result.push(state(c));
+            // changed other argument
+            row_patch(c, [{id: 1, name: 'a'}, {id: 2, name: 'b'}], '?');
+            result.push(state(c));
+            return result.join(' ');
+        })()""" % (fake_dom, self.get_patch_function().function)
+        result = self.execute_javascript(script)
+        self.assertEqual(result, 'a!|b!#2 a?|b?#4')
+
+    def test_patch_duplicate_keys(self):
+        script = """(function() {
+            %s
+            %s
+            var c = new FakeElement();
+            try {
+                row_patch(c, [{id: 1, name: 'a'}, {id: 1, name: 'b'}], '!');
+            } catch (e) {
+                return e.message;
+            }
+        })()""" % (fake_dom, self.get_patch_function().function)
+        result = self.execute_javascript(script)
+        self.assertEqual(result, 'Duplicate key 1')
+
+    def test_patch_unrendered_key(self):
+        tpl = """
+        {% load jsrender %}
+
+        {% jsrender "row(item)" keyed item.id as row %}{{ item.name }}{% endjsrender %}
+        """
+        ctx = {}
+        template_from_string(tpl).render(Context(ctx))
+        func = ctx['row']
+        self.assertEqual(func.projection, dict(item=frozenset([('id',), ('name',)])))
+        items = [func.project(item)[0] for item in [
+            dict(id=1, name='a', other=0), dict(id=2, name='b', other=0)]]
+        self.assertEqual(items, [dict(id=1, name='a'), dict(id=2, name='b')])
+        script = """(function() {
+            %s
+            %s
+            var c = new FakeElement();
+            row_patch(c, %s);
+            return state(c);
+        })()""" % (fake_dom, func.function, json.dumps(items))
+        result = self.execute_javascript(script)
+        self.assertEqual(result, 'a|b#2')
@@ -7,10 +7,12 @@ from django.template import (
     defaulttags, Context, Node,
     Variable, VariableDoesNotExist, TemplateSyntaxError,
 )
+from django.template.base import Origin
 from django.utils.timezone import now
 from django.utils.translation import gettext_lazy
-from ..functions import JavascriptExpression
+from ..functions import JavascriptExpression, express
 from ..datetimeformat import datetime_format_javascript_expressions
+from ..profiling import Profile
 from .utils import (
     TranslationTestCase, JavascriptTranslationTestCase,
     template_from_string, nodelist_from_string
@@ -74,29 +76,89 @@ class QuickTranslateTests(TranslationTestCase):
 
     def test_making_varnames(self):
         t = self.get_translator([])
-        t.html_escape_function = 'escape'
         varnames = set()
         invalids = t.get_invalid_varnames()
         self.assertIn(t.html_escape_function, invalids)
-        with self.assertRaisesRegex(ValueError, "Out of variable names"):
-            while True:
-                varname = t.get_varname()
-                self.assertNotIn(varname, varnames)
-                self.assertNotIn(varname, invalids)
-                varnames.add(varname)
+        self.assertIn('do', invalids)
+        previous = ''
+        for _ in range(10000):
+            varname = t.get_varname()
+            self.assertNotIn(varname, varnames)
+            self.assertNotIn(varname, invalids)
+            self.assertTrue(varname.isalnum() and varname[0].isalpha())
+            # shortest first
+            self.assertGreaterEqual(len(varname), len(previous))
+            varnames.add(varname)
+            previous = varname
+        self.assertEqual(len(previous), 3)
 
     def test_making_varnames_with_invalids(self):
+        class InvalidsTranslator(self.translator_class):
+            def get_invalid_varnames(self):
+                return set('aklmn')
+
+        t = InvalidsTranslator([], html_escape_function='escape')
+        varnames = [t.get_varname() for _ in range(100)]
+        self.assertEqual(varnames[:10], list('cdefghijop'))
+        self.assertEqual(varnames[45:48], ['Z', 'aa', 'ab'])
+        self.assertEqual(len(set(varnames)), 100)
+
+    def test_reusing_varnames(self):
+        t = self.get_translator(['x'])
+        self.assertEqual((t.result_varname, t.arg_varnames), ('a', ['b']))
+        with t.varname_scope():
+            self.assertEqual(t.get_varname(), 'c')
+            with t.varname_scope():
+                self.assertEqual(t.get_varname(), 'd')
+                self.assertEqual(t.get_varname(scoped=False), 'e')
+            self.assertEqual(t.get_varname(), 'd')
+            self.assertEqual(t.get_varname(), 'f')
+        # unscoped names are never released ones
+        self.assertEqual(t.get_varname(scoped=False), 'g')
+        self.assertEqual([t.get_varname() for _ in range(4)], ['c', 'd', 'f', 'h'])
+
+    def test_interning_expressions(self):
         t = self.get_translator([])
-        self.assertIn(t.html_escape_function, t.get_invalid_varnames())
-        t.get_invalid_varnames = lambda: set('klmn')
-        varnames = set()
-        invalids = t.get_invalid_varnames()
-        with self.assertRaisesRegex(ValueError, "Out of variable names"):
-            while True:
-                varname = t.get_varname()
-                self.assertNotIn(varname, varnames)
-                self.assertNotIn(varname, invalids)
-                varnames.add(varname)
+        variable = t.variable('c')
+        self.assertEqual(variable, JavascriptExpression('c'))
+        self.assertIs(t.variable('c'), variable)
+        self.assertIs(t.intern(JavascriptExpression('c')), variable)
+        self.assertIsNot(t.variable('d'), variable)
+
+    def test_resolving_static_variables_once(self):
+        class Site(object):
+            lookups = 0
+
+            @property
+            def name(self):
+                self.lookups += 1
+                return 'site'
+
+        site = Site()
+        nodelist = nodelist_from_string(
+            '{% for x in xs %}{{ site.name }}{% endfor %}'
+            '{% for i in numbers %}{{ site.name }}{{ forloop.counter }}{{ i.real }}{% endfor %}'
+        )
+        t = self.get_translator(['xs'])
+        js = t.translate(Context(dict(site=site, numbers=[4, 5])), nodelist)
+        self.assertEqual(site.lookups, 1)
+        self.assertEqual(js.count('"site"'), 3)
+        for text in ['"1"', '"2"', '"4"', '"5"']:
+            self.assertIn(text, js)
+        # other values are looked up again
+        context = Context(dict(site=Site()))
+        self.assertEqual(t.resolve_variable(Variable('site.name'), context), 'site')
+        self.assertEqual(context['site'].lookups, 1)
+
+    def test_reusing_loop_varnames(self):
+        nodelist = nodelist_from_string(
+            '{% for x in xs %}{{ x }}{% endfor %}'
+            '{% for y in xs %}{{ y }}{% endfor %}'
+        )
+        t = self.get_translator(['xs'])
+        js = t.translate(Context(), nodelist)
+        self.assertEqual(js.count('for(var c=0;c<b.length;c++){'), 2)
+        self.assertEqual(js.count('var d=b[c];'), 2)
 
     def test_write_bytes(self):
         t = self.get_translator([])
@@ -422,6 +484,48 @@ class QuickTranslateTests(TranslationTestCase):
         with self.assertRaises(VariableDoesNotExist):
             t.translate(Context(dict(tpl=tpl, var=1)), nodelist)
 
+    def test_include_shared(self):
+        tpl = '{% include row %}{% for item in items %}{% include row %}{% endfor %}'
+        nodelist = nodelist_from_string(tpl)
+        row = template_from_string('<b>{{ item.name }}</b>')
+        t = self.translator_class(
+            ['item', 'items'],
+            html_escape_function=self.html_escape_function,
+            joiner='',
+            indentation='',
+            debug=True,
+            share_includes=True,
+        )
+        self.assertJsEqual(
+            t.translate(Context(dict(row=row)), nodelist),
+            'var a="";'
+            'function d(item_0){var a="";a+="<b>";a+=escape(item_0.name);a+="</b>";return a;}'
+            'a+=d(b);'
+            'for(var e=0;e<c.length;e++){var f=c[e];a+=d(f);}'
+            'return a;',
+        )
+
+    def test_include_shared_static_context(self):
+        tpl = '{% for x in static %}{% include row %}{% endfor %}{% include row with x=2 %}'
+        nodelist = nodelist_from_string(tpl)
+        row = template_from_string('{{ x }}{{ item }}')
+        t = self.translator_class(
+            ['item'],
+            html_escape_function=self.html_escape_function,
+            joiner='',
+            indentation='',
+            debug=True,
+            share_includes=True,
+        )
+        self.assertJsEqual(
+            t.translate(Context(dict(row=row, static=[1, 2])), nodelist),
+            'var a="";'
+            'function c(item_0,x_0){var a="";a+=escape(x_0);a+=escape(item_0);return a;}'
+            'function d(item_0){var a="";a+="2";a+=escape(item_0);return a;}'
+            'a+=c(b,1);a+=c(b,2);a+=d(b);'
+            'return a;',
+        )
+
     def test_tag_lorem_with_variables(self):
         tpl = '{% lorem num %}'
         nodelist = nodelist_from_string(tpl)
@@ -429,6 +533,59 @@ class QuickTranslateTests(TranslationTestCase):
         with self.assertRaises(NotImplementedError):
             t.translate(Context(), nodelist)
 
+    def test_batch(self):
+        tpl = "<li>{{ item.name }}{{ sep }}</li>"
+        nodelist = nodelist_from_string(tpl)
+        t = self.translator_class(
+            ['item', 'sep'],
+            html_escape_function=self.html_escape_function,
+            joiner='',
+            indentation='',
+            debug=True,
+            batch=True,
+        )
+        self.assertJsEqual(
+            t.translate(Context(), nodelist),
+            'var a="";'
+            'for(var d=0;d<b.length;d++){'
+            'var e=b[d];'
+            'a+="<li>";a+=escape(e.name);a+=escape(c);a+="</li>";'
+            '}'
+            'return a;',
+        )
+
+    def test_constants(self):
+        class SmallConstantsTranslator(self.translator_class):
+            constant_size = 10
+
+        nodelist = nodelist_from_string(
+            '{% if x in choices %}a{% endif %}'
+            '{% if x in other_choices %}b{% endif %}'
+            '{% if x in small %}c{% endif %}'
+            '{% if x in once %}d{% endif %}'
+        )
+        t = SmallConstantsTranslator(['x'], joiner='', indentation='', debug=True)
+        context = Context(dict(
+            choices=['abc', 'def'], other_choices=['abc', 'def'], small=[1],
+            once=['ghi', 'jkl']))
+        self.assertJsEqual(
+            t.translate(context, nodelist),
+            'var a="";'
+            'var c=["abc","def"];'
+            'if((c).indexOf(b)!=-1){a+="a";}'
+            'if((c).indexOf(b)!=-1){a+="b";}'
+            'if(([1]).indexOf(b)!=-1){a+="c";}'
+            'if((["ghi","jkl"]).indexOf(b)!=-1){a+="d";}'
+            'return a;',
+        )
+        self.assertEqual(t.constant(context['small']), JavascriptExpression('[1]'))
+
+    def test_batch_without_arguments(self):
+        nodelist = nodelist_from_string('hello')
+        t = self.translator_class([], batch=True)
+        with self.assertRaises(ValueError):
+            t.translate(Context(), nodelist)
+
     def test_not_implemented_tag(self):
         # make a 'tag type' that's not implemented
         class ThirdPartyNode(Node):
@@ -442,13 +599,87 @@ class QuickTranslateTests(TranslationTestCase):
         # but has a render_javascript method to be compatible
         class CompatibleNode(Node):
             def render_javascript(self, translator, context):
-                yield (translator, context)
-        context = Context()
+                yield translator.write(context['x'])
+        context = Context(dict(x='y'))
         translator = self.get_translator([])
-        result = list(translator.translate_node(context, CompatibleNode()))
-        self.assertEqual(len(result), 1)
-        self.assertIs(result[0][0], translator)
-        self.assertIs(result[0][1], context)
+        self.assertEqual(translator.translate_node(context, CompatibleNode()), ['a+="y";'])
+
+    def test_compatible_emitting_tag(self):
+        class EmittingNode(Node):
+            def render_javascript(self, translator, context):
+                translator.emit(translator.write('x'))
+        translator = self.get_translator([])
+        node = EmittingNode()
+        lines = translator.translate_nodelist(Context(), [node])
+        self.assertEqual(lines, ['a+="x";'])
+        self.assertIs(lines[0].node, node)
+        self.assertEqual(translator.translate_node(Context(), node), ['a+="x";'])
+
+    def test_compatible_tag_yielding_subnodes(self):
+        class YieldingNode(Node):
+            def render_javascript(self, translator, context):
+                yield 'if(x){'
+                with translator.indented():
+                    for line in translator.translate_nodelist(context, nodelist):
+                        yield line
+                yield '}'
+        nodelist = nodelist_from_string('{{ 1 }}{% if x %}{{ 2 }}{% endif %}')
+        translator = self.translator_class(['x'], html_escape_function='escape', debug=True)
+        node = YieldingNode()
+        js = translator.translate(Context(), [node])
+        self.assertEqual(js, '\n'.join([
+            'var a="";',
+            'if(x){',
+            '  a+="1";',
+            '  if(b){',
+            '    a+="2";',
+            '  }',
+            '}',
+            'return a;',
+        ]))
+        # the lines of the subnodes keep their positions
+        self.assertEqual(translator.positions, [
+            (0, None, None, 0),
+            (17, '<unknown source>', 1, 0),
+            (52, None, None, 0),
+        ])
+
+    def test_compatible_tag_translating_subnodes(self):
+        # a tag translating its subnodes with the older API
+        class LegacyNode(Node):
+            def __init__(self, nodelist):
+                self.nodelist = nodelist
+
+            def render_javascript(self, translator, context):
+                for node in self.nodelist:
+                    for line in translator.translate_node(context, node):
+                        yield line
+
+        template = template_from_string(
+            '{{ 1 }}\n{% if x %}{{ x.y }}{% endif %}', origin=Origin('t.html'), debug=True)
+        node = LegacyNode(template.nodelist)
+        profile = Profile()
+        translator = self.translator_class(
+            ['x'], html_escape_function='escape', debug=True, profile=profile)
+        context = Context()
+        with context.bind_template(template):
+            translator.translate(context, [node])
+        # the lines of the subnodes keep their positions
+        self.assertEqual(
+            [position[1:3] for position in translator.positions],
+            [(None, None), ('t.html', 1), ('t.html', 2), (None, None)])
+        # and the subnodes are profiled
+        self.assertEqual(profile.nodes['IfNode'].count, 1)
+        # and errors are annotated with the position of the subnode
+        template = template_from_string('a\n{{ missing }}', debug=True)
+        node = LegacyNode(template.nodelist)
+        context = Context()
+        with context.bind_template(template):
+            context.render_context.template = template
+            with self.assertRaises(VariableDoesNotExist) as x:
+                self.get_translator([]).translate(context, [node])
+        self.assertEqual(x.exception.template_debug['line'], 2)
+        self.assertEqual(x.exception.template_debug['during'], '{{ missing }}')
 
     def test_compatible_tag_returning_non_text(self):
         # make a 'tag type' that's not implemented
@@ -558,12 +789,30 @@ class QuickTranslateTests(TranslationTestCase):
                 elif expr is NotImplemented:
                     with self.assertRaises(NotImplementedError):
                         t.translate(Context(dict(someday=now())), nodelist)
+                elif expr.count('%(x)s') == 1:
+                    self.assertJsEqual(
+                        t.translate(Context(), nodelist),
+                        'var a="";a+=(%s);return a;' % (expr % dict(x='new Date(b)')),
+                    )
                 else:
+                    # the date is referred to by the parameter of a function
                     self.assertJsEqual(
                         t.translate(Context(), nodelist),
-                        'var a="";a+=(%s);return a;' % (expr % dict(x='b')),
+                        'var a="";a+=(function(x){return (%s)})(new Date(b));return a;' % (
+                            expr % dict(x='x')),
                     )
 
+    def test_filter_date_with_multiple_characters(self):
+        tpl = '{{ someday|date:"Y<j" }}'
+        nodelist = nodelist_from_string(tpl)
+        t = self.get_translator(['someday'])
+        self.assertJsEqual(
+            t.translate(Context(), nodelist),
+            'var a="";'
+            'a+=(function(x){return (x.getFullYear())+"&lt;"+(x.getDate())})(new Date(b));'
+            'return a;',
+        )
+
     def test_filter_date_escaped_char(self):
         tpl = '{{ someday|date:"\\Y" }}'
         nodelist = nodelist_from_string(tpl)
@@ -651,6 +900,13 @@ class TranslateTests(JavascriptTranslationTestCase):
             {},
         )
 
+    def test_text_non_ascii(self):
+        self.assertTranslation(
+            "gr\xfc\xdfe \u65e5\u672c\u2028</script>",
+            {},
+            {},
+        )
+
     def test_variable(self):
         self.assertTranslation(
             "hello {{ name }}",
@@ -742,3 +998,29 @@ class TranslateTests(JavascriptTranslationTestCase):
             dict(spam=list(range(3))),
             "yyn"
         )
+
+    def test_batch(self):
+        tpl = "<li>{{ item.name }}{% if item.new %} (new){% endif %}{{ sep }}</li>"
+        template = template_from_string(tpl)
+        items = [
+            dict(name='abc', new=True),
+            dict(name='<def>', new=False),
+        ]
+        translator = self.translator_class(
+            ['item', 'sep'],
+            html_escape_function=self.html_escape_function,
+            batch=True,
+        )
+        translated = translator.translate(Context(), template.nodelist)
+        script = '(function(%s){%s})(%s,%s)' % (
+            ','.join(translator.arg_varnames),
+            translated,
+            express(items),
+            express('!'),
+        )
+        result = self.execute_javascript(script)
+        expected_result = ''.join(
+            template.render(Context(dict(item=item, sep='!')))
+            for item in items
+        )
+        self.assertTranslationResultEqual(result, expected_result, script)
@@ -1,6 +1,9 @@
 from __future__ import unicode_literals
 import operator
+import re
 from contextlib import contextmanager
+from copy import copy
+from timeit import default_timer
 import six
 from django.conf import settings
 from django.template import defaulttags
@@ -9,42 +12,89 @@ from django.template.smartif import TokenBase, Literal
 from django.utils.safestring import SafeText
 from .functions import (
     is_lazy_text, resolve_lazy_text, as_javascript, express, escape, mark_safe,
-    concatenate, make_jsexpr, is_jsexpr, is_escaped,
+    concatenate, make_jsexpr, is_jsexpr, is_escaped, ArgumentJavascriptExpression,
 )
-from .tags import tag_translators
+from .tags import tag_translators, loop_value
+from .sourcemaps import source_name
+from .concurrency import count_nodes, completed, run_in_executor
+from . import cache
+from .varnames import VarnameAllocator, reserved_varnames
+from . import minify
 from .filters import filter_translators
 
 
-def get_next_varname(v, recurse=False):
-    "Get the next unique Javascript variable name in order, given the previous."
-    if len(v) == 1:
-        if v == 'z':
-            return 'A'
-        elif v == 'Z':
-            if recurse:
-                return '0'
-            else:
-                return 'aa'
-        elif v == '9':
-            assert recurse
-            return 'aa'
-        else:
-            return six.unichr(ord(v) + 1)
+def contains_jsexpr(value):
+    "Returns True if the value is a dict containing (dicts with) Javascript expressions."
+    if isinstance(value, dict):
+        return any(is_jsexpr(v) or contains_jsexpr(v) for v in value.values())
     else:
-        pre, last = v[:-1], v[-1]
-        next = get_next_varname(last, recurse=True)
-        if len(next) == 1:
-            return pre + next
-        else:
-            # We can improve this and allow for arbitrary many variables
-            # but this should be plenty for most reasonable uses.
-            raise ValueError('Out of variable names')
+        return False
+
+
+string_literal = re.compile(r'"(?:[^"\\]|\\.)*"')
+
+
+def used_variable(varname, js):
+    "Returns True if the variable (might be) used in the Javascript."
+    js = string_literal.sub('""', js)
+    return re.search(r'(?<![\w$.])%s(?![\w$])' % re.escape(varname), js) is not None
+
+
+# Marks the uses of large constants in the translated lines until the end of
+# the translation, when it is known which are used more than once.
+# Emitted Javascript never contains NUL characters otherwise,
+# as string literals escape them and template variables can't contain them.
+constant_placeholder = '\x00%d\x00'
+constant_placeholders = re.compile(r'\x00(\d+)\x00')
+
+
+def parameter_name(name, index):
+    """Returns the name of a parameter of a helper function, for a reference
+    of the expression of a context name.
+
+    Unlike other variable names, which never contain an underscore,
+    these are the same whichever other parameters the helper has.
+    """
+    name = re.sub(r'[^A-Za-z0-9_]', lambda m: '$%x' % ord(m.group()), name)
+    if name[:1].isdigit():
+        name = '$' + name
+    return '%s_%d' % (name, index)
+
+
+class Line(six.text_type):
+    "An emitted (and indented) line of Javascript, with the innermost node it is part of."
+
+    def __new__(cls, line, node):
+        self = six.text_type.__new__(cls, line)
+        self.node = node
+        return self
+
+
+class Sink(object):
+    "Collects the lines of Javascript emitted by translation."
+
+    def __init__(self):
+        self.lines = []
+        # the innermost node every line is part of
+        self.nodes = []
+
+    def get_lines(self):
+        "Returns the lines as `Line` objects."
+        return [Line(line, node) for line, node in zip(self.lines, self.nodes)]
 
 
 class Translator(object):
     "Translates Django template nodelists into Javascript function bodies."
 
     html_escape_function = getattr(settings, 'JSRENDER_ESCAPE_FUNCTION', 'html_escape')
+    share_includes = getattr(settings, 'JSRENDER_SHARE_INCLUDES', False)
+    cache_includes = getattr(settings, 'JSRENDER_CACHE_INCLUDES', True)
+    async_threshold = getattr(settings, 'JSRENDER_ASYNC_THRESHOLD', 100)
+    minify = getattr(settings, 'JSRENDER_MINIFY', False)
+    target = getattr(settings, 'JSRENDER_TARGET', 'es5')
+    constant_size = getattr(settings, 'JSRENDER_CONSTANT_SIZE', 256)
+
+    targets = ('es5', 'es2015')
 
     comparison_operator_functions = {
         '==': operator.__eq__,
@@ -69,7 +119,8 @@ class Translator(object):
     def __init__(
             self,
             arguments,
-            html_escape_function=None, joiner=None, indentation=None, debug=None):
+            html_escape_function=None, joiner=None, indentation=None, debug=None,
+            batch=False, share_includes=None, profile=None, minify=None, target=None):
         """Create a new translator.
 
         Translation is based on the Javascript template arguments,
@@ -84,13 +135,66 @@ class Translator(object):
         resulting Javascript function body to be more readable.
         With debug set to False, instead, the resulting Javascript code
         will be as compact as possible.
+
+        With batch set to True, the first argument of the resulting
+        Javascript function is an array instead, and the function body
+        renders the template for each of its items into a single result.
+
+        With share_includes set to True (or the JSRENDER_SHARE_INCLUDES setting),
+        included templates are translated into helper functions,
+        which are declared once for every distinct translation.
+
+        The optional profile (a `profiling.Profile`) records the time spent
+        translating and the Javascript produced per node, line and filter.
+
+        With minify set to True (or the JSRENDER_MINIFY setting),
+        the function body is minified further than debug set to False does,
+        see `minify.minify`. Minified bodies have no source positions.
+
+        The target (or the JSRENDER_TARGET setting) is the version of
+        Javascript to output, 'es5' or 'es2015'. For 'es2015',
+        temporary variables are declared with let and const within blocks.
         """
         self.arguments = arguments
-        self.current_varname = 'a'
-        self.result_varname = self.get_varname()
-        self.arg_varnames = [self.get_varname() for _ in self.arguments]
+        self.batch = batch
+        self.profile = profile
+        self.sink = None
+        self.current_node = None
+        self.emitted_bytes = 0
+        self.positions = None
+        self.expressions = {}
+        self.resolved_variables = {}
+        self.constants = {}
+        # the Javascript of the large constants, by their placeholder number
+        self.large_constants = []
+        self.constant_placeholders = {}
+        self.constant_declarations = []
+        # the nodes the large constants are first used by
+        self.constant_nodes = []
+        self.argument_paths = dict((arg, set()) for arg in self.arguments)
         if html_escape_function is not None:
             self.html_escape_function = html_escape_function
+        self.varnames = VarnameAllocator(self.get_invalid_varnames())
+        self.result_varname = self.get_varname()
+        self.arg_varnames = [self.get_varname() for _ in self.arguments]
+        if share_includes is not None:
+            self.share_includes = share_includes
+        if minify is not None:
+            self.minify = minify
+        if target is not None:
+            self.target = target
+        if self.target not in self.targets:
+            raise ValueError("Unknown Javascript target %r" % (self.target,))
+        self.helpers = []
+        # the (include) nodes the helper functions are (first) used by
+        self.helper_nodes = []
+        # the positions of the helper functions, from their start
+        self.helper_positions = []
+        # the template origins of the positions, by their source name
+        self.origins = {}
+        self.helper_names = {}
+        # the context names of the values of the static loops being translated
+        self.loop_names = []
         self.indentation_text = indentation
         self.joiner = joiner
         self.debug = debug
@@ -102,19 +206,113 @@ class Translator(object):
             self.joiner = '\n' if self.debug else ''
         self.indentation_level = 0
 
+    @property
+    def projection(self):
+        """Returns the paths (tuples of lookups) used of each argument.
+
+        An empty path means the argument is used in full,
+        the items of arrays are looked up by `functions.ITEMS`.
+        This is only complete once the translation is done.
+        """
+        return dict(
+            (arg, frozenset(paths))
+            for arg, paths in self.argument_paths.items()
+        )
+
     def get_invalid_varnames(self):
         "Returns a set of varnames to skip."
-        return set(['if', 'else', 'while', 'for', 'var', 'function', self.html_escape_function])
-
-    def get_varname(self):
-        "Obtain a new unique variable name."
-        invalids = self.get_invalid_varnames()
-        varname = self.current_varname
-        while varname in invalids:
-            varname = get_next_varname(varname)
-        # set current varname to the next one for the following invocation
-        self.current_varname = get_next_varname(varname)
-        return varname
+        return reserved_varnames | set([self.html_escape_function])
+
+    def get_varname(self, scoped=True):
+        """Obtain a new unique variable name.
+
+        Unless scoped is False, the name can be used again
+        after the end of the current `varname_scope`.
+        Otherwise, it is one that was never used before,
+        for names declared at the start of the function.
+        """
+        return self.varnames.allocate(scoped)
+
+    def varname_scope(self):
+        """A context manager within which variable names are used,
+        after which they may be obtained again.
+        """
+        return self.varnames.scope()
+
+    def temporary_varname(self):
+        """A context manager that obtains a new unique variable name,
+        which may be obtained again after it.
+        """
+        return self.varnames.temporary()
+
+    def intern(self, expression):
+        """Returns the expression equal to the given one
+        that was interned before in this translation, or the given one.
+
+        Sharing equal expressions, like those of variables that are
+        stored in the context, avoids keeping many copies of them.
+        """
+        return self.expressions.setdefault(expression, expression)
+
+    def variable(self, varname):
+        "Returns the (interned) Javascript expression of a variable name."
+        return self.intern(make_jsexpr(varname))
+
+    def constant(self, value):
+        """Returns the Javascript expression of a static value,
+        or Javascript expressions as is.
+
+        Values are expressed once per translation (by identity).
+        Those expressed in at least `constant_size` characters
+        that are used more than once (by their Javascript) are declared once
+        in a variable at the start of the function body, which is used instead
+        wherever they are, see `resolve_constants`. Until then,
+        their expression is a placeholder.
+        """
+        if is_jsexpr(value):
+            return value
+        try:
+            return self.constants[id(value)][1]
+        except KeyError:
+            pass
+        expression = make_jsexpr(express(value))
+        js = expression.expression
+        if self.constant_size is not None and len(js) >= self.constant_size:
+            try:
+                expression = self.constant_placeholders[js]
+            except KeyError:
+                expression = self.constant_placeholders[js] = make_jsexpr(
+                    constant_placeholder % len(self.large_constants))
+                self.large_constants.append(js)
+                self.constant_nodes.append(self.current_node)
+        # (the value is kept, so that its identity isn't reused)
+        self.constants[id(value)] = (value, expression)
+        return expression
+
+    def resolve_constants(self, lines):
+        """Returns the lines with the placeholders of large constants
+        replaced by the constants, or by variables for those used more than once,
+        and the nodes those are first used by.
+        Their declarations are added to `constant_declarations`.
+        """
+        if not self.large_constants:
+            return lines, []
+        uses = [0] * len(self.large_constants)
+        for line in lines:
+            for match in constant_placeholders.finditer(line):
+                uses[int(match.group(1))] += 1
+        replacements = []
+        nodes = []
+        for js, count, node in zip(self.large_constants, uses, self.constant_nodes):
+            if count > 1:
+                varname = self.get_varname(scoped=False)
+                self.constant_declarations.append(self.assign(varname, make_jsexpr(js)))
+                nodes.append(node)
+                replacements.append(varname)
+            else:
+                replacements.append(js)
+        replace = lambda match: replacements[int(match.group(1))]
+        return [constant_placeholders.sub(replace, line) for line in lines], nodes
 
     @contextmanager
     def redirect_writing(self, varname):
@@ -188,11 +386,50 @@ class Translator(object):
             raise TypeError(x)
         else:
             w = '"%s"' % self.escape(as_javascript(x))
-        return '%s+=%s;' % (self.result_varname, w)
+        return self.write_literal(w)
+
+    def write_literal(self, literal):
+        "Make the Javascript function output the Javascript (like a string literal) as is."
+        return '%s+=%s;' % (self.result_varname, literal)
+
+    def declaration(self, block_scoped=False, constant=False):
+        """Returns the keyword to declare a variable with.
+
+        Block scoped variables are declared with let
+        (or const if they are constant) for the 'es2015' target,
+        all others with var.
+        """
+        if block_scoped and self.target == 'es2015':
+            return 'const' if constant else 'let'
+        return 'var'
 
-    def assign(self, varname, x):
+    def assign(self, varname, x, block_scoped=False, constant=False):
         "Assign a variable a value in the Javascript function body."
-        return 'var %s=%s;' % (varname, express(x))
+        return '%s %s=%s;' % (self.declaration(block_scoped, constant), varname, express(x))
+
+    def resolve_variable(self, variable, context):
+        """Resolves a template variable into a value.
+
+        Lookups from a Python value are remembered for the translation,
+        and reused as long as the variable refers to the same value.
+        Lookups from Javascript expressions and from the 'forloop' variable
+        (which is updated during loops) are resolved every time.
+        """
+        if variable.lookups is None or variable.lookups[0] == 'forloop':
+            return variable.resolve(context)
+        try:
+            root = context[variable.lookups[0]]
+        except KeyError:
+            return variable.resolve(context)
+        if is_jsexpr(root):
+            return variable.resolve(context)
+        resolved = self.resolved_variables.get(variable.lookups)
+        if resolved is not None and resolved[0] is root:
+            return resolved[1]
+        value = variable.resolve(context)
+        if not is_jsexpr(value):
+            self.resolved_variables[variable.lookups] = (root, value)
+        return value
 
     def resolve_expression(self, expression, context):
         "Resolves an expression into a value."
@@ -201,10 +438,13 @@ class Translator(object):
         assert isinstance(expression, FilterExpression)
         if isinstance(expression.var, SafeText):
             return expression.var
-        value = expression.var.resolve(context)
+        value = self.resolve_variable(expression.var, context)
         for func, args in expression.filters:
-            args = [a.resolve(context) if l else a for l, a in args]
-            value = self.translate_filter(value, func, args)
+            args = [self.resolve_variable(a, context) if l else a for l, a in args]
+            if self.profile is None:
+                value = self.translate_filter(value, func, args)
+            else:
+                value = self.profile.profile_filter(self.translate_filter, value, func, args)
         return value
 
     def resolve_condition(self, condition, context):
@@ -222,7 +462,7 @@ class Translator(object):
             second = resolve_second()
             if is_jsexpr(first) or is_jsexpr(second):
                 js = self.comparison_operator_expressions[condition.id]
-                return make_jsexpr(js, first, second)
+                return make_jsexpr(js, self.constant(first), self.constant(second))
             else:
                 func = self.comparison_operator_functions[condition.id]
                 return func(first, second)
@@ -271,8 +511,8 @@ class Translator(object):
             if is_jsexpr(first) or is_jsexpr(second):
                 return make_jsexpr(
                     '(%%s).indexOf(%%s)%s-1' % ('!=' if condition.id == 'in' else '=='),
-                    second,
-                    first,
+                    self.constant(second),
+                    self.constant(first),
                 )
             else:
                 if condition.id == 'in':
@@ -294,72 +534,418 @@ class Translator(object):
 
         # add the template arguments to the context
         context.push()
-        for arg, varname in zip(self.arguments, self.arg_varnames):
-            context[arg] = make_jsexpr(varname)
-
-        # declare, fill and return the Javascript variable
-        # to build the template in
-        x.append(self.indent_line('var %s="";' % self.result_varname))
-        x.extend(map(self.indent_line, self.translate_nodelist(context, nodelist)))
+        try:
+            for arg, varname in zip(self.arguments, self.arg_varnames):
+                context[arg] = self.intern(
+                    ArgumentJavascriptExpression(varname, self.argument_paths[arg]))
+
+            # declare, fill and return the Javascript variable
+            # to build the template in
+            x.append(self.indent_line(
+                self.assign(self.result_varname, '', block_scoped=True)))
+            with self.collecting() as sink:
+                if self.batch:
+                    self.emit_batch(context, nodelist)
+                else:
+                    self.emit_nodelist(context, nodelist)
+        finally:
+            # remove the template arguments from the context again
+            context.pop()
+        lines, constant_nodes = self.resolve_constants(sink.lines)
+        # declare the constants and helper functions used
+        x.extend(map(self.indent_line, self.constant_declarations))
+        helpers_start = len(x)
+        x.extend(map(self.indent_line, self.helpers))
+        nodes = [None] + constant_nodes + self.helper_nodes + sink.nodes + [None]
+        # helper functions are mapped to the lines of the templates they are of
+        line_positions = dict(
+            (helpers_start + index, [
+                (len(self.indentation) + position[0],) + tuple(position[1:])
+                for position in positions
+            ])
+            for index, positions in enumerate(self.helper_positions)
+        )
+        x.extend(lines)
         x.append(self.indent_line("return %s;" % self.result_varname))
 
-        # remove the template arguments from the context again
-        context.pop()
-
+        if self.minify:
+            # minifying moves the code away from its positions
+            self.positions = None
+            return minify.minify(self.joiner.join(x))
+        self.positions = self.get_positions(x, nodes, line_positions)
         return self.joiner.join(x)
 
-    def translate_nodelist(self, context, nodelist):
-        """Returns an iterable of lines of the translation of the list of nodes.
+    def node_position(self, node):
+        """Returns the source name, line number and column of a node for source maps,
+        see `sourcemaps.source_name`. The source name and line number are None
+        for no node, the column is always 0, as tokens don't know theirs.
+        """
+        origin = getattr(node, 'origin', None)
+        token = getattr(node, 'token', None)
+        name = source_name(origin)
+        if name is not None:
+            self.origins.setdefault(name, origin)
+        return (name, getattr(token, 'lineno', None), 0)
+
+    def get_positions(self, lines, nodes, line_positions=None):
+        """Returns the positions of the translated lines in the template source,
+        as (offset, source name, line number, column) tuples for source maps,
+        see `node_position`. Lines spanning several lines of text
+        are mapped at the start of each.
+
+        The positions of some lines, from their start, can be given
+        by their index instead, like those of helper functions.
+        """
+        positions = []
+        offset = 0
+        previous = None
+        for index, (line, node) in enumerate(zip(lines, nodes)):
+            if line_positions and index in line_positions:
+                for position in line_positions[index]:
+                    positions.append((offset + position[0],) + tuple(position[1:]))
+                    previous = tuple(position[1:])
+                offset += len(line) + len(self.joiner)
+                continue
+            position = self.node_position(node)
+            if position != previous:
+                positions.append((offset,) + position)
+                previous = position
+            if node is not None and '\n' in line:
+                positions.extend(
+                    (offset + match.end(),) + position
+                    for match in re.finditer('\n', line))
+            offset += len(line) + len(self.joiner)
+        return positions
+
+    def atranslate(self, context, nodelist, executor=None):
+        """Like `translate`, but returns an asyncio future of the translation,
+        to use in async views without blocking the event loop.
+
+        Nodelists of at least `async_threshold` nodes in total
+        (the JSRENDER_ASYNC_THRESHOLD setting) are translated
+        in the executor, or the event loop's default executor if not given,
+        using a copy of the context. Smaller ones are translated right away.
+        The executor must run in the same process, like a thread pool executor,
+        as nodelists and contexts generally can't be pickled.
+        """
+        if count_nodes(nodelist) < self.async_threshold:
+            return completed(self.translate, context, nodelist)
+        return run_in_executor(executor, self.translate, copy(context), nodelist)
+
+    def emit_batch(self, context, nodelist):
+        """Emit the translation of the list of nodes,
+        for every item of the array that is the first argument.
+        """
+        if not self.arguments:
+            raise ValueError("Batch translation requires an argument")
+        argument = list(self.arguments)[0]
+        items = context[argument]
+        loop_varname = self.get_varname()
+        item_varname = self.get_varname()
+        self.emit('for(%(d)s %(n)s=0;%(n)s<%(len)s;%(n)s++){' % dict(
+            d=self.declaration(block_scoped=True),
+            n=loop_varname,
+            len=express(items.length()),
+        ))
+        with self.indented():
+            item = items.item(self.variable(loop_varname))
+            self.emit(self.assign(
+                item_varname, make_jsexpr(item.reference()), block_scoped=True, constant=True))
+            with context.push():
+                context[argument] = self.intern(item.renamed(item_varname))
+                self.emit_nodelist(context, nodelist)
+        self.emit('}')
+
+    def emit_shared(self, context, nodelist, template=None):
+        """Emit a call of a helper function with the translation of the list of nodes.
+
+        The Javascript expressions in the context that are used
+        are passed to the helper function, so that identical translations
+        share the same function. This is used to translate included templates.
+        So are the values of the static loops being translated (see `loop_values`),
+        so that all their iterations share the same function,
+        unless the nodes can't be translated without their static values.
+
+        When the template of the nodelist is given, its translation is cached
+        (with the cache_includes option or the JSRENDER_CACHE_INCLUDES setting)
+        for the static context values it uses, see the `cache` module.
+        """
+        loop_values = self.loop_values(context)
+        if loop_values:
+            with context.push(loop_values):
+                try:
+                    translation = self.translate_shared(context, nodelist, template)
+                except NotImplementedError:
+                    translation = None
+                if translation is not None:
+                    self.emit_helper_call(context, translation)
+                    return
+        translation = self.translate_shared(context, nodelist, template)
+        if translation is None:
+            self.emit_nodelist(context, nodelist)
+        else:
+            self.emit_helper_call(context, translation)
+
+    def loop_values(self, context):
+        """Returns the Javascript expressions of the values in the context
+        of the static loops being translated, by their context names,
+        see `tags.loop_value`.
+        """
+        values = {}
+        for names in self.loop_names:
+            for name in names:
+                if name in context and not is_jsexpr(context[name]):
+                    value = loop_value(context[name])
+                    if value is not None:
+                        values[name] = value
+        return values
+
+    @contextmanager
+    def static_loop(self, names):
+        """A context manager within which the context names hold
+        the values of an iteration of a static loop, see `emit_shared`.
+        """
+        self.loop_names.append(names)
+        try:
+            yield
+        finally:
+            self.loop_names.pop()
+
+    def translate_shared(self, context, nodelist, template=None):
+        """Returns the (cached) translation of a list of nodes into a helper function,
+        see `emit_shared`, or None if the context has values that can't be passed to it.
+        """
+        names = []
+        for name, value in sorted(context.flatten().items()):
+            if is_jsexpr(value):
+                names.append(name)
+            elif contains_jsexpr(value):
+                return None
+        key = None
+        if template is not None and self.cache_includes:
+            key = cache.translation_key(self, context, template)
+        translation = None
+        if key is not None:
+            translation = cache.get_translation(template, key)
+        if translation is None:
+            parameters, paths, body, positions, origins = self.translate_helper(
+                context, nodelist, names)
+            # the parameters of unused expressions are left out, their names
+            # don't depend on the other parameters so the body is the same without them
+            used_names = [
+                name for name in names
+                if any(used_variable(p, body) for p in parameters[name])
+            ]
+            translation = (used_names, parameters, paths, body, positions, origins)
+            if key is not None:
+                cache.set_translation(template, key, translation)
+        return translation
+
+    def emit_helper_call(self, context, translation):
+        "Emit a call of the helper function of a translation, see `translate_shared`."
+        used_names, parameters, paths, body, positions, origins = translation
+        references = []
+        for name in used_names:
+            # record the parts used by the helper of the arguments passed to it
+            for reference, used in zip(context[name].references(), paths[name]):
+                for path in used or ():
+                    reference.record(path)
+                references.append(reference)
+        signature = ','.join(p for name in used_names for p in parameters[name])
+        key = (signature, body)
+        if key not in self.helper_names:
+            helper_name = self.get_varname(scoped=False)
+            self.helper_names[key] = helper_name
+            start = 'function %s(%s){' % (helper_name, signature)
+            self.helpers.append('%s%s}' % (start, body))
+            self.helper_nodes.append(self.current_node)
+            # the function body is mapped to the included template,
+            # the rest to the include tag
+            self.helper_positions.append([(0,) + self.node_position(self.current_node)] + [
+                (len(start) + position[0],) + tuple(position[1:])
+                for position in positions
+            ])
+            self.origins.update(origins)
+        self.emit(self.write(mark_safe(make_jsexpr('%s(%s)' % (
+            self.helper_names[key],
+            ','.join(reference.reference() for reference in references),
+        )))))
+
+    def translate_helper(self, context, nodelist, names):
+        """Translate a list of nodes into the body of a helper function,
+        taking the expressions of the given context names as parameters.
+
+        Returns the parameters per name, the paths used of every parameter
+        per name (or None for parameters that are not part of a template argument),
+        the function body, and its positions and their origins (see `get_positions`).
+        The parameters are named after the context names,
+        see `parameter_name`, unlike other variables of the helper function.
+        """
+        translator = type(self)(
+            [],
+            html_escape_function=self.html_escape_function,
+            joiner=self.joiner,
+            indentation=self.indentation_text,
+            debug=self.debug,
+            share_includes=True,
+            profile=self.profile,
+            minify=False,
+            target=self.target,
+        )
+        parameters = {}
+        paths = {}
+        with context.push():
+            for name in names:
+                value = context[name]
+                references = []
+                parameters[name] = []
+                paths[name] = []
+                for index, reference in enumerate(value.references()):
+                    parameter = parameter_name(name, index)
+                    parameters[name].append(parameter)
+                    if isinstance(reference, ArgumentJavascriptExpression):
+                        used = set()
+                        references.append(ArgumentJavascriptExpression(parameter, used))
+                    else:
+                        used = None
+                        references.append(reference.renamed(parameter))
+                    paths[name].append(used)
+                context[name] = value.rebuild(references)
+            body = translator.translate(context, nodelist)
+        return parameters, paths, body, translator.positions, translator.origins
+
+    def emit(self, line):
+        """Add a line of Javascript to the translation,
+        like one returned by `write` or `assign`. Empty lines are skipped.
+        """
+        if isinstance(line, Line):
+            # collected before, and indented already
+            self.sink.lines.append(line)
+            self.sink.nodes.append(line.node)
+            return
+        if not isinstance(line, six.text_type):
+            raise TypeError("Non text %r from %r" % (line, self.current_node))
+        if line == '':
+            return
+        if self.profile is not None and self.current_node is not None:
+            self.profile.record_part(self.current_node, line)
+            self.emitted_bytes += len(line.encode('utf-8'))
+        if self.indentation_level:
+            line = self.indentation + line
+        self.sink.lines.append(line)
+        self.sink.nodes.append(self.current_node)
+
+    @contextmanager
+    def collecting(self):
+        "A context manager that collects the lines emitted within it in a new `Sink`."
+        sink = self.sink
+        self.sink = Sink()
+        try:
+            yield self.sink
+        finally:
+            self.sink = sink
+
+    @contextmanager
+    def block(self):
+        """A context manager that emits a block statement around the lines
+        emitted within it for the 'es2015' target, to scope the block scoped
+        variables declared to it.
+        """
+        if self.target != 'es2015':
+            yield
+            return
+        self.emit('{')
+        with self.indented():
+            yield
+        self.emit('}')
+
+    def emit_nodelist(self, context, nodelist):
+        """Emit the translation of the list of nodes.
 
         This can be used in tag translation implementations to translate subnodes.
         """
         for node in nodelist:
-            pre_level = self.indentation_level
-            try:
-                for part in self.translate_node(context, node):
-                    if not isinstance(part, six.text_type):
-                        raise TypeError("Non text %r from %r" % (part, node))
-                    if part != '':
-                        yield part
-            except Exception as e:
-                if (context.template is not None and
-                        context.template.engine.debug and
-                        getattr(context.render_context, 'template', None) and
-                        not hasattr(e, 'template_debug')):
-                    # Preserve source location from token onto the exception
-                    # for debugging purposes, like Django does this.
-                    template = context.render_context.template
-                    info = template.get_exception_info(e, node.token)
-                    e.template_debug = info
-                raise
-            post_level = self.indentation_level
-            if pre_level != post_level:
-                raise AssertionError(
-                    "Indentation level not restored by %r, going from %s to %s"
-                    % (node, pre_level, post_level)
-                )
+            self.emit_node(context, node)
 
-    def translate_node(self, context, node):
-        """Returns an iterable of lines of the translation of the node.
+    def emit_node(self, context, node):
+        """Emit the translation of the node.
 
         This can be used in tag translation implementations to translate a subnode.
+        While it is translated, `current_node` is the node.
+        """
+        parent = self.current_node
+        pre_level = self.indentation_level
+        self.current_node = node
+        if self.profile is not None:
+            start, size = default_timer(), self.emitted_bytes
+        try:
+            lines = self.get_node_translation(context, node)
+            if lines is not None:
+                for line in lines:
+                    self.emit(line)
+        except Exception as e:
+            if (context.template is not None and
+                    context.template.engine.debug and
+                    getattr(context.render_context, 'template', None) and
+                    not hasattr(e, 'template_debug')):
+                # Preserve source location from token onto the exception
+                # for debugging purposes, like Django does this.
+                template = context.render_context.template
+                info = template.get_exception_info(e, node.token)
+                e.template_debug = info
+            raise
+        finally:
+            self.current_node = parent
+            if self.profile is not None:
+                self.profile.record_node(
+                    node, default_timer() - start, self.emitted_bytes - size)
+        post_level = self.indentation_level
+        if pre_level != post_level:
+            raise AssertionError(
+                "Indentation level not restored by %r, going from %s to %s"
+                % (node, pre_level, post_level)
+            )
+
+    def get_node_translation(self, context, node):
+        """Translate the node by its tag translation implementation.
+
+        Implementations either emit their lines and return None,
+        or return an iterable of their lines (to be emitted by the caller).
         """
         if type(node) in self.tag_translators:
             translator = self.tag_translators[type(node)]
-            for part in translator(self, context, node):
-                yield part
+            return translator(self, context, node)
         elif hasattr(node, 'render_javascript'):
             # third-party template nodes can be made compatible
             # by implementing a method 'render_javascript'
             # that builds itself rendered into a Javascript expression
-            for part in node.render_javascript(self, context):
-                yield part
+            return node.render_javascript(self, context)
         else:
             raise NotImplementedError(
                 "Javascript translation is not implemented for "
                 "%r nodes." % node.__class__
             )
 
+    def translate_nodelist(self, context, nodelist):
+        """Returns a list of lines of the translation of the list of nodes.
+
+        Tag translation implementations can yield these lines,
+        but emitting the nodes with `emit_nodelist` is faster.
+        """
+        with self.collecting() as sink:
+            self.emit_nodelist(context, nodelist)
+        return sink.get_lines()
+
+    def translate_node(self, context, node):
+        """Returns a list of lines of the translation of the node.
+
+        Tag translation implementations can yield these lines,
+        but emitting the node with `emit_node` is faster.
+        """
+        with self.collecting() as sink:
+            self.emit_node(context, node)
+        return sink.get_lines()
+
     def translate_filter(self, value, func, args):
         "Translate a filter into Javascript."
         # if the arguments are not expressions,
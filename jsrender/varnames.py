@@ -0,0 +1,107 @@
+from __future__ import unicode_literals
+import heapq
+import string
+from contextlib import contextmanager
+
+
+first_characters = string.ascii_lowercase + string.ascii_uppercase
+characters = first_characters + string.digits
+
+# keywords and reserved words, also those of strict mode
+reserved_words = frozenset('''
+    await break case catch class const continue debugger default delete do
+    else enum export extends false finally for function if implements import
+    in instanceof interface let new null package private protected public
+    return static super switch this throw true try typeof var void while
+    with yield arguments eval
+'''.split())
+
+# global objects that generated Javascript or its environment may use
+global_names = frozenset('''
+    Array ArrayBuffer Boolean DataView Date Error EvalError Float32Array
+    Float64Array Function Infinity Int16Array Int32Array Int8Array Intl JSON
+    Map Math NaN Number Object Promise Proxy RangeError ReferenceError Reflect
+    RegExp Set String Symbol SyntaxError TypeError URIError Uint16Array
+    Uint32Array Uint8Array Uint8ClampedArray WeakMap WeakSet
+    console decodeURI decodeURIComponent document encodeURI encodeURIComponent
+    escape globalThis isFinite isNaN navigator parseFloat parseInt self
+    undefined unescape window
+'''.split())
+
+reserved_varnames = reserved_words | global_names
+
+
+def get_varname(index):
+    """Returns the Javascript variable name with the given index,
+    in order of length and then alphabetically
+    (lowercase before uppercase before digits).
+    """
+    length = 1
+    count = len(first_characters)
+    while index >= count:
+        index -= count
+        length += 1
+        count *= len(characters)
+    first, index = divmod(index, count // len(first_characters))
+    rest = []
+    for _ in range(length - 1):
+        index, character = divmod(index, len(characters))
+        rest.append(characters[character])
+    return first_characters[first] + ''.join(reversed(rest))
+
+
+class VarnameAllocator(object):
+    """Allocates unique Javascript variable names, shortest first.
+
+    Names allocated within a scope, and temporary names,
+    are released at their end, to be allocated again (shortest first) afterwards.
+    Unscoped names are never released, nor one that was released before,
+    as they may be declared before the scope they were released from.
+    """
+
+    def __init__(self, invalid=reserved_varnames):
+        self.invalid = frozenset(invalid)
+        self.next_index = 0
+        self.released = []
+        self.scopes = []
+
+    def allocate_index(self, reuse=True):
+        if reuse and self.released:
+            return heapq.heappop(self.released)
+        index = self.next_index
+        while get_varname(index) in self.invalid:
+            index += 1
+        self.next_index = index + 1
+        return index
+
+    def allocate(self, scoped=True):
+        """Returns a new variable name, that is released at the end
+        of the current scope if scoped is True,
+        or one that was never allocated before otherwise.
+        """
+        index = self.allocate_index(reuse=scoped)
+        if scoped and self.scopes:
+            self.scopes[-1].append(index)
+        return get_varname(index)
+
+    @contextmanager
+    def temporary(self):
+        """A context manager that allocates a variable name, released at the end.
+
+        Unlike a scope, other names allocated within it are not released.
+        """
+        index = self.allocate_index()
+        try:
+            yield get_varname(index)
+        finally:
+            heapq.heappush(self.released, index)
+
+    @contextmanager
+    def scope(self):
+        "A context manager that releases the names allocated within it at the end."
+        self.scopes.append([])
+        try:
+            yield
+        finally:
+            for index in self.scopes.pop():
+                heapq.heappush(self.released, index)
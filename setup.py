@@ -11,6 +11,8 @@ setup(
     packages=[
         'jsrender',
         'jsrender.templatetags',
+        'jsrender.management',
+        'jsrender.management.commands',
         'jsrender.tests',
     ],
     package_data={'': [
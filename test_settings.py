@@ -5,6 +5,8 @@ SECRET_KEY = 'xxx'
 
 INSTALLED_APPS = (
     'jsrender',
+    # models for the tests
+    'testapp',
 )
 
 TEMPLATES = [
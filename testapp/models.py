@@ -0,0 +1,21 @@
+from __future__ import unicode_literals
+from django.db import models
+
+
+class Group(models.Model):
+    name = models.CharField(max_length=10)
+
+
+class Member(models.Model):
+    name = models.CharField(max_length=10)
+    email = models.CharField(max_length=10)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+
+    def display_name(self):
+        return self.name.title()
+
+
+class Tag(models.Model):
+    label = models.CharField(max_length=10)
+    color = models.CharField(max_length=10)
+    members = models.ManyToManyField(Member, related_name='tags')